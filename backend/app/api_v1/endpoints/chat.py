@@ -1,28 +1,107 @@
+from typing import List, Tuple
 from fastapi import APIRouter, HTTPException
-from app.models.schemas import ChatRequest, ChatResponse
+from app.models.schemas import ChatMessage, ChatRequest, ChatResponse, ChatSessionResponse
 from app.services.llm_service import llm_service
+from app.services.streaming import sse_response, stream_completion
+from app.services.conversation_store import conversation_store, SessionNotFound
+from app.services.chat_memory import ChatMemory
+from app.services.rate_limiter import set_priority, PRIORITY_INTERACTIVE
+from app.services.tracing import TracedRoute
+from app.api_v1.errors import http_error
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
-@router.post("/chat", response_model=ChatResponse)
+# Résumé glissant des sessions longues, calculé en tâche de fond après chaque réponse
+chat_memory = ChatMemory(conversation_store, llm_service.summarize_conversation)
+# Repris par l'application qui inclut le routeur : les résumés en cours sont terminés avant l'arrêt
+router.add_event_handler("shutdown", chat_memory.drain)
+
+async def _load_history(request: ChatRequest) -> Tuple[str, List[ChatMessage]]:
+    """Résumé et historique de la conversation : stockés côté serveur en mode session, sinon envoyés par le client"""
+    if request.session_id is None:
+        return "", request.historique
+    try:
+        resume, messages = await chat_memory.context(request.session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session de conversation introuvable")
+    return resume, [ChatMessage(**msg) for msg in messages]
+
+async def _save_turn(session_id: str, message: str, response_text: str):
+    await conversation_store.append_messages(session_id, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": response_text}
+    ])
+    chat_memory.schedule_update(session_id)
+
+@router.post("/chat/sessions", response_model=ChatSessionResponse)
+async def create_chat_session():
+    """Ouvre une session : les messages suivants n'ont plus à renvoyer l'historique"""
+    return ChatSessionResponse(session_id=await conversation_store.create_session())
+
+@router.get("/chat/sessions/{session_id}", response_model=ChatSessionResponse)
+async def get_chat_session(session_id: str):
+    """Retourne l'historique complet d'une session (par exemple au rechargement de la page)"""
+    try:
+        messages = await conversation_store.get_messages(session_id)
+        state = await conversation_store.get_summary(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Session de conversation introuvable")
+    return ChatSessionResponse(
+        session_id=session_id,
+        historique=messages,
+        resume=state["summary"],
+        messages_resumes=state["summarized_count"]
+    )
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    await conversation_store.delete_session(session_id)
+    return {"success": True}
+
+@router.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
 async def chat_interaction(request: ChatRequest):
     """Gère l'interaction avec le chatbot juridique"""
+    set_priority(PRIORITY_INTERACTIVE)
+    resume, historique = await _load_history(request)
     try:
         # Effectuer l'interaction de chat
-        response_text, new_history = llm_service.chat_interaction(
-            request.message, 
-            request.historique
+        response_text, new_history = await llm_service.chat_interaction(
+            request.message,
+            historique,
+            resume
         )
         
+        if request.session_id is not None:
+            await _save_turn(request.session_id, request.message, response_text)
+            # En mode session, seule la nouvelle réponse est renvoyée
+            new_history = None
+        
         return ChatResponse(
             reponse=response_text,
             historique=new_history,
+            session_id=request.session_id,
             success=True,
             message="Chat effectué avec succès"
         )
     
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de l'interaction chat: {str(e)}"
-        ) 
\ No newline at end of file
+        raise http_error(e, "Erreur lors de l'interaction chat")
+
+@router.post("/chat/stream")
+async def chat_interaction_stream(request: ChatRequest):
+    """Interaction de chat en streaming (Server-Sent Events)"""
+    set_priority(PRIORITY_INTERACTIVE)
+    resume, historique = await _load_history(request)
+    chunks = llm_service.chat_stream(request.message, historique, resume)
+
+    async def on_complete(response_text: str) -> dict:
+        if request.session_id is not None:
+            await _save_turn(request.session_id, request.message, response_text)
+            return {"session_id": request.session_id}
+        new_history = historique + [
+            ChatMessage(role="user", content=request.message),
+            ChatMessage(role="assistant", content=response_text)
+        ]
+        return {"historique": [msg.model_dump() for msg in new_history]}
+    
+    return sse_response(stream_completion(chunks, on_complete=on_complete))
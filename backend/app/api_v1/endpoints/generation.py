@@ -1,17 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import DocumentGenerationRequest, DocumentGenerationResponse
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from app.core.config import settings
+from app.models.schemas import BatchDocumentGenerationRequest, DocumentGenerationRequest, DocumentGenerationResponse
 from app.services.llm_service import llm_service
+from app.services.response_cache import is_cache_bypassed
+from app.services.streaming import sse_response, stream_completion
+from app.services.batch import run_batch, stream_batch
+from app.services.rate_limiter import set_priority, PRIORITY_BATCH
+from app.services.tracing import TracedRoute
+from app.api_v1.errors import http_error
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.post("/generate-document", response_model=DocumentGenerationResponse)
-async def generate_document(request: DocumentGenerationRequest):
+async def generate_document(
+    request: DocumentGenerationRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
     """Génère un document juridique selon le type et les paramètres fournis"""
     try:
         # Générer le document
-        document_content = llm_service.generate_document(
+        document_content = await llm_service.generate_document(
             request.type_document, 
-            request.parametres
+            request.parametres,
+            bypass_cache=is_cache_bypassed(x_cache_bypass, cache_control)
         )
         
         return DocumentGenerationResponse(
@@ -22,7 +35,31 @@ async def generate_document(request: DocumentGenerationRequest):
         )
     
     except Exception as e:
+        raise http_error(e, "Erreur lors de la génération du document")
+
+@router.post("/generate-document/stream")
+async def generate_document_stream(request: DocumentGenerationRequest):
+    """Génère un document juridique en streaming (Server-Sent Events)"""
+    chunks = llm_service.generate_document_stream(request.type_document, request.parametres)
+    return sse_response(stream_completion(chunks))
+
+@router.post("/generate-documents/batch")
+async def generate_documents_batch(
+    request: BatchDocumentGenerationRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
+    """Génère un lot de documents en parallèle ; chaque résultat est envoyé dès qu'il est prêt (SSE)"""
+    set_priority(PRIORITY_BATCH)
+    if len(request.documents) > settings.BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de la génération du document: {str(e)}"
-        ) 
\ No newline at end of file
+            status_code=413,
+            detail=f"Lot trop volumineux : {settings.BATCH_MAX_ITEMS} documents maximum"
+        )
+    bypass_cache = is_cache_bypassed(x_cache_bypass, cache_control)
+    
+    async def generate(item: dict) -> str:
+        return await llm_service.generate_document(item["type_document"], item["parametres"], bypass_cache=bypass_cache)
+    
+    items = [document.model_dump() for document in request.documents]
+    return sse_response(stream_batch(run_batch(items, generate), len(items)))
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import DocumentJobRequest, JobResponse
+from app.services.llm_service import llm_service
+from app.services.jobs import job_queue, InvalidCallbackURL, JobNotFound
+from app.services.metrics import set_endpoint
+from app.services.rate_limiter import set_priority, PRIORITY_BATCH
+from app.services.tracing import TracedRoute
+
+router = APIRouter(route_class=TracedRoute)
+
+async def _generate_document_job(payload: dict) -> str:
+    set_priority(PRIORITY_BATCH)
+    set_endpoint("job:generate_document")
+    return await llm_service.generate_document(payload["type_document"], payload["parametres"])
+
+job_queue.register("generate_document", _generate_document_job)
+
+def _job_response(job: dict) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        type_document=job["payload"].get("type_document"),
+        document_genere=job["result"],
+        erreur=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"]
+    )
+
+@router.post("/jobs/generate-document", response_model=JobResponse, response_model_exclude_none=True, status_code=202)
+async def submit_document_job(request: DocumentJobRequest):
+    """Soumet une génération longue : la réponse est immédiate, le résultat se consulte sur /jobs/{job_id}"""
+    try:
+        job = await job_queue.submit(
+            "generate_document",
+            {"type_document": request.type_document, "parametres": request.parametres},
+            callback_url=request.callback_url
+        )
+    except InvalidCallbackURL as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, response_model_exclude_none=True)
+async def get_job(job_id: str):
+    """État et résultat d'une tâche"""
+    try:
+        return _job_response(await job_queue.get(job_id))
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Tâche introuvable")
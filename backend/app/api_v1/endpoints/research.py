@@ -1,15 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from app.models.schemas import LegalSearchRequest, LegalSearchResponse
 from app.services.llm_service import llm_service
+from app.services.streaming import sse_response, stream_completion
+from app.services.tracing import TracedRoute
+from app.api_v1.errors import http_error
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.post("/legal-search", response_model=LegalSearchResponse)
 async def legal_search(request: LegalSearchRequest):
     """Effectue une recherche juridique avec RAG"""
     try:
         # Effectuer la recherche avec RAG
-        response_text, sources = llm_service.legal_search_with_rag(request.question)
+        response_text, sources = await llm_service.legal_search_with_rag(request.question)
         
         return LegalSearchResponse(
             reponse=response_text,
@@ -20,7 +23,13 @@ async def legal_search(request: LegalSearchRequest):
         )
     
     except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de la recherche juridique: {str(e)}"
-        ) 
\ No newline at end of file
+        raise http_error(e, "Erreur lors de la recherche juridique")
+
+@router.post("/legal-search/stream")
+async def legal_search_stream(request: LegalSearchRequest):
+    """Recherche juridique RAG en streaming (Server-Sent Events)"""
+    sources, chunks = await llm_service.legal_search_stream(request.question)
+    return sse_response(stream_completion(
+        chunks,
+        sources=[src.model_dump() for src in sources]
+    ))
\ No newline at end of file
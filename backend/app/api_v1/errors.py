@@ -0,0 +1,12 @@
+# app/api_v1/errors.py
+
+from fastapi import HTTPException
+from app.services.resilience import upstream_status
+
+def http_error(error: Exception, detail: str) -> HTTPException:
+    """Erreur HTTP d'un endpoint : 429/503 avec Retry-After si Gemini est indisponible, sinon 500"""
+    status = upstream_status(error)
+    if status is None:
+        return HTTPException(status_code=500, detail=f"{detail}: {error}")
+    status_code, retry_after = status
+    return HTTPException(status_code=status_code, detail=str(error), headers={"Retry-After": str(int(retry_after))})
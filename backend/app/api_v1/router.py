@@ -1,7 +1,7 @@
 # app/api_v1/router.py
 
 from fastapi import APIRouter
-from app.api_v1.endpoints import generation, research, chat
+from app.api_v1.endpoints import generation, research, chat, jobs
 
 api_router = APIRouter()
 
@@ -19,4 +19,9 @@ api_router.include_router(
 api_router.include_router(
     chat.router, 
     tags=["Chat Assistant"]
+)
+
+api_router.include_router(
+    jobs.router, 
+    tags=["Taches Asynchrones"]
 ) 
\ No newline at end of file
@@ -9,8 +9,139 @@ load_dotenv()
 class Settings:
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     
+    # Nombre maximal d'appels Gemini simultanés par worker
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+    # Point d'accès alternatif (proxy, faux serveur Gemini local) ; vide = API Google
+    GEMINI_API_ENDPOINT: str = os.getenv("GEMINI_API_ENDPOINT", "")
+    
+    # Résilience des appels Gemini : nouvelles tentatives, disjoncteur, hedging
+    GEMINI_TIMEOUT: float = float(os.getenv("GEMINI_TIMEOUT", "120"))  # secondes par tentative
+    GEMINI_RETRY_MAX_ATTEMPTS: int = int(os.getenv("GEMINI_RETRY_MAX_ATTEMPTS", "4"))
+    GEMINI_RETRY_BASE_DELAY: float = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))  # secondes
+    GEMINI_RETRY_MAX_DELAY: float = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "20"))  # secondes
+    GEMINI_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("GEMINI_BREAKER_FAILURE_THRESHOLD", "5"))
+    GEMINI_BREAKER_RESET_TIMEOUT: float = float(os.getenv("GEMINI_BREAKER_RESET_TIMEOUT", "30"))  # secondes
+    # Seconde requête si la première n'a pas répondu après ce délai (0 = désactivé)
+    GEMINI_HEDGE_DELAY: float = float(os.getenv("GEMINI_HEDGE_DELAY", "0"))
+    
+    # Routage des modèles : niveau rapide (chat, résumés), niveau fort (recherche, documents), secours
+    GEMINI_FAST_MODEL: str = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-exp")
+    GEMINI_STRONG_MODEL: str = os.getenv("GEMINI_STRONG_MODEL", "gemini-2.5-flash-preview-05-20")
+    GEMINI_FALLBACK_MODELS: str = os.getenv("GEMINI_FALLBACK_MODELS", "gemini-1.5-flash")  # liste séparée par des virgules
+    CHAT_FAST_MAX_TOKENS: int = int(os.getenv("CHAT_FAST_MAX_TOKENS", "200"))  # au-delà, le chat passe au modèle fort
+    
+    # Quota Gemini partagé par la clé API (0 = pas de limite côté client)
+    GEMINI_RPM: int = int(os.getenv("GEMINI_RPM", "0"))  # requêtes par minute
+    GEMINI_TPM: int = int(os.getenv("GEMINI_TPM", "0"))  # tokens de prompt par minute
+    # "memory" (par worker) ou "file" (partagé entre workers uvicorn via RATE_LIMIT_STATE_PATH)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_STATE_PATH: str = os.getenv("RATE_LIMIT_STATE_PATH", "rate_limit.state")
+    # Attente maximale dans la file avant rejet (429), par priorité, en secondes
+    RATE_LIMIT_INTERACTIVE_MAX_WAIT: float = float(os.getenv("RATE_LIMIT_INTERACTIVE_MAX_WAIT", "5"))
+    RATE_LIMIT_STANDARD_MAX_WAIT: float = float(os.getenv("RATE_LIMIT_STANDARD_MAX_WAIT", "15"))
+    RATE_LIMIT_BATCH_MAX_WAIT: float = float(os.getenv("RATE_LIMIT_BATCH_MAX_WAIT", "300"))
+    
+    # Embeddings : "gemini", "hashing" (local, hors ligne) ou vide pour choisir automatiquement
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "")
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+    
+    # Répertoire de l'index FAISS persisté (index, métadonnées, manifeste)
+    INDEX_DIR: str = os.getenv("INDEX_DIR", "index")
+    
+    # Découpage des documents juridiques (budget et chevauchement en tokens)
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+    
+    # Type d'index FAISS : auto (selon le nombre de vecteurs), flat, hnsw, ivf_flat, ivf_pq
+    INDEX_TYPE: str = os.getenv("INDEX_TYPE", "auto")
+    INDEX_NPROBE: int = int(os.getenv("INDEX_NPROBE", "16"))  # Listes IVF visitées par requête
+    INDEX_EF_SEARCH: int = int(os.getenv("INDEX_EF_SEARCH", "64"))  # Largeur de recherche HNSW
+    INDEX_HNSW_M: int = int(os.getenv("INDEX_HNSW_M", "32"))  # Voisins par nœud HNSW
+    
+    # Ingestion du corpus : lecture et découpage en parallèle, points de reprise, suivi de progression
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "4"))  # Processus de lecture (0 = processus courant)
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "64"))  # Fichiers lus d'avance au plus
+    INGEST_CHECKPOINT_SECONDS: float = float(os.getenv("INGEST_CHECKPOINT_SECONDS", "60"))
+    INGEST_PROGRESS_SECONDS: float = float(os.getenv("INGEST_PROGRESS_SECONDS", "10"))
+    # Textes extraits des PDF, DOCX, HTML et XML, par hash du fichier source ("" = désactivé)
+    EXTRACTION_CACHE_DIR: str = os.getenv("EXTRACTION_CACHE_DIR", os.path.join(os.getenv("INDEX_DIR", "index"), "extracted"))
+    
+    # Recherche hybride : BM25 (termes exacts, références d'articles) fusionné avec FAISS par RRF
+    HYBRID_SEARCH_ENABLED: bool = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES", "20"))  # Candidats par recherche avant fusion
+    RRF_K: int = int(os.getenv("RRF_K", "60"))  # Amortissement des rangs de la fusion
+    # Poids du classement FAISS dans la fusion (BM25 : 1) ; vide = 1 avec un embedder sémantique,
+    # 0 (BM25 seul) avec l'embedder haché local, moins bon que BM25 seul sur le banc d'essai
+    HYBRID_DENSE_WEIGHT: str = os.getenv("HYBRID_DENSE_WEIGHT", "")
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    
+    # Reranking des résultats RAG : "local" (score lexical), "llm" (un appel Gemini groupé) ou "" (désactivé)
+    RERANK_BACKEND: str = os.getenv("RERANK_BACKEND", "local")
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "50"))  # Taille du premier passage
+    RERANK_TOP_N: int = int(os.getenv("RERANK_TOP_N", "3"))  # Morceaux envoyés dans le prompt
+    RERANK_MIN_RELATIVE_SCORE: float = float(os.getenv("RERANK_MIN_RELATIVE_SCORE", "0.5"))  # Part du meilleur score
+    RERANK_TIMEOUT: float = float(os.getenv("RERANK_TIMEOUT", "1.5"))  # secondes, puis ordre du premier passage
+    RERANK_PASSAGE_CHARS: int = int(os.getenv("RERANK_PASSAGE_CHARS", "600"))  # Extrait par passage (backend llm)
+    
+    # Contexte du prompt RAG : budget en tokens et distance SimHash (bits sur 64) des quasi-doublons écartés
+    RAG_CONTEXT_MAX_TOKENS: int = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", "2000"))
+    RAG_CONTEXT_DEDUP_DISTANCE: int = int(os.getenv("RAG_CONTEXT_DEDUP_DISTANCE", "3"))
+    
+    # Cache de réponses (exact + sémantique)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # secondes
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD: float = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.95"))
+    
+    # Historique des conversations côté serveur : "memory" (LRU) ou "sqlite"
+    CONVERSATION_STORE: str = os.getenv("CONVERSATION_STORE", "memory")
+    CONVERSATION_DB_PATH: str = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+    CONVERSATION_MAX_SESSIONS: int = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+    # Sessions SQLite inactives depuis plus longtemps supprimées (0 = jamais)
+    CONVERSATION_TTL: int = int(os.getenv("CONVERSATION_TTL", "604800"))  # secondes
+    
+    # Chat natif Gemini (start_chat) et cache de contexte du préfixe partagé
+    # Historique envoyé au modèle quand la mémoire résumée est désactivée (CHAT_MEMORY_TOKEN_BUDGET=0)
+    CHAT_MAX_HISTORY_MESSAGES: int = int(os.getenv("CHAT_MAX_HISTORY_MESSAGES", "20"))
+    # Désactivé par défaut : sans corpus partagé, les seules consignes sont bien en deçà du minimum du cache
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "false").lower() == "true"
+    # Taille minimale du préfixe à mettre en cache pour les modèles absents de CONTEXT_CACHE_MIN_TOKENS
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+    GEMINI_CONTEXT_CACHE_TTL: int = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))  # secondes
+    # Corpus juridique partagé avec le chat via le cache de contexte (0 = désactivé)
+    CHAT_CORPUS_CONTEXT_MAX_TOKENS: int = int(os.getenv("CHAT_CORPUS_CONTEXT_MAX_TOKENS", "0"))
+    # Budget de l'historique envoyé au modèle ; au-delà, les anciens tours sont résumés
+    # (0 = désactivé : historique tronqué à CHAT_MAX_HISTORY_MESSAGES, sans résumé)
+    CHAT_MEMORY_TOKEN_BUDGET: int = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "8000"))
+    
+    # Génération de documents par lot
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))  # Générations simultanées par lot
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+    
+    # Tâches asynchrones (génération longue) : stockage "memory" ou "sqlite"
+    JOB_STORE: str = os.getenv("JOB_STORE", "memory")
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", "jobs.db")
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))  # Workers dans le serveur (0 = processus worker.py séparés)
+    JOB_TIMEOUT: int = int(os.getenv("JOB_TIMEOUT", "600"))  # secondes
+    JOB_RESULT_TTL: int = int(os.getenv("JOB_RESULT_TTL", "86400"))  # secondes
+    JOB_CALLBACK_TIMEOUT: int = int(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))  # secondes
+    # Hôtes autorisés pour les URL de rappel, séparés par des virgules (vide = tout hôte public)
+    JOB_CALLBACK_ALLOWED_HOSTS: str = os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "")
+    # Bail d'une tâche en cours avant reprise par un autre worker (0 = JOB_TIMEOUT + marge)
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "0"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # réservations avant abandon
+    
+    # Traçage OpenTelemetry : "" (désactivé), "console" (stdout) ou "file" (JSON par ligne)
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "")
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "legal-llm-api")
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))  # part des requêtes tracées
+    
     @property
     def is_gemini_configured(self) -> bool:
         return bool(self.GEMINI_API_KEY and self.GEMINI_API_KEY != "VOTRE_CLÉ_API_ICI")
 
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
@@ -12,6 +12,23 @@ class DocumentGenerationResponse(BaseModel):
     success: bool
     message: Optional[str] = None
 
+class BatchDocumentGenerationRequest(BaseModel):
+    documents: List[DocumentGenerationRequest]  # Résultats renvoyés en SSE au fil de l'eau
+
+# Tâches asynchrones
+class DocumentJobRequest(DocumentGenerationRequest):
+    callback_url: Optional[str] = None  # Appelée en POST à la fin de la tâche
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed
+    type_document: Optional[str] = None
+    document_genere: Optional[str] = None
+    erreur: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
 # Recherche juridique (RAG)
 class LegalSearchRequest(BaseModel):
     question: str
@@ -21,6 +38,10 @@ class SourceDocument(BaseModel):
     contenu: str
     nom_fichier: str
     score: float
+    section: Optional[str] = None  # Article ou section du morceau retrouvé
+    debut: Optional[int] = None  # Position du morceau dans le fichier source
+    fin: Optional[int] = None
+    citation: Optional[int] = None  # Numéro [n] de la source dans le contexte du prompt
 
 class LegalSearchResponse(BaseModel):
     reponse: str
@@ -36,10 +57,18 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    historique: List[ChatMessage] = []
+    historique: List[ChatMessage] = []  # Mode historique complet (sans session)
+    session_id: Optional[str] = None  # Mode session : l'historique est conservé côté serveur
 
 class ChatResponse(BaseModel):
     reponse: str
-    historique: List[ChatMessage]
+    historique: Optional[List[ChatMessage]] = None  # Absent en mode session
+    session_id: Optional[str] = None
     success: bool
-    message: Optional[str] = None 
\ No newline at end of file
+    message: Optional[str] = None
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
+    historique: List[ChatMessage] = []
+    resume: str = ""  # Résumé glissant des anciens tours (CHAT_MEMORY_TOKEN_BUDGET)
+    messages_resumes: int = 0  # Nombre de messages couverts par le résumé
\ No newline at end of file
@@ -0,0 +1,174 @@
+# app/services/ann_index.py
+import math
+import numpy as np
+import faiss
+from typing import Optional, Tuple
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# Seuils de sélection automatique (nombre de vecteurs)
+FLAT_MAX_VECTORS = 20_000
+HNSW_MAX_VECTORS = 500_000
+IVF_FLAT_MAX_VECTORS = 2_000_000
+
+# Points d'entraînement utilisés au maximum par centroïde IVF / PQ
+TRAINING_POINTS_PER_CENTROID = 256
+
+# HNSW ne sait pas retirer de nœud : les vecteurs supprimés sont marqués et écartés
+# à la recherche, et le graphe n'est reconstruit qu'au-delà de cette proportion
+HNSW_MAX_DELETED_FRACTION = 0.1
+
+def choose_index_type(n_vectors: int) -> str:
+    """Choisit le type d'index selon la taille du corpus.
+
+    - flat : recherche exacte, suffisante jusqu'à quelques dizaines de milliers de vecteurs
+    - hnsw : graphe, très rapide mais mémoire = vecteurs + liens
+    - ivf_flat : partitionnement, vecteurs complets
+    - ivf_pq : partitionnement + quantification, ~8 fois moins de mémoire
+      (recall@10 ≈ 0,91 contre 0,61 avec des sous-vecteurs de 8 dimensions,
+      `python -m benchmarks.ann_report --synthetic 5000 --types ivf_pq`)
+    """
+    if n_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    if n_vectors <= IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+def _nlist(n_vectors: int) -> int:
+    """Nombre de listes IVF : ~4·√n, borné pour garder assez de points d'entraînement"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+def _pq_m(dimension: int) -> int:
+    """Nombre de sous-quantificateurs PQ : 2 dimensions par sous-vecteur.
+
+    Avec des codes de 8 bits, un vecteur float32 tient en d/2 octets (8 fois
+    moins) ; des sous-vecteurs plus longs compressent davantage mais plafonnent
+    le rappel quel que soit nprobe (erreur de quantification).
+    """
+    for m in (dimension // 2, dimension // 4, dimension // 8):
+        if m and dimension % m == 0:
+            return m
+    return 1
+
+def index_factory_string(index_type: str, dimension: int, n_vectors: int, hnsw_m: int = 32) -> str:
+    """Chaîne index_factory FAISS correspondant au type demandé"""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{_nlist(n_vectors)},Flat"
+    if index_type == "ivf_pq":
+        nbits = max(4, min(8, int(math.log2(max(n_vectors // 39, 16)))))
+        return f"IVF{_nlist(n_vectors)},PQ{_pq_m(dimension)}x{nbits}"
+    raise ValueError(f"Type d'index inconnu : {index_type}")
+
+def create_index(index_type: str, dimension: int, n_vectors: int, hnsw_m: int = 32):
+    """Crée un index produit scalaire acceptant des ids externes.
+
+    Les index IVF gèrent nativement les ids ; Flat et HNSW sont enveloppés
+    dans un IndexIDMap2.
+    """
+    factory = index_factory_string(index_type, dimension, n_vectors, hnsw_m)
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+    if isinstance(index, faiss.IndexIVFPQ):
+        # Entraînement polysémique activé par défaut : ~15 fois plus long, et
+        # inutile tant que la recherche polysémique (polysemous_ht) n'est pas utilisée
+        index.do_polysemous_training = False
+    if faiss.try_extract_index_ivf(index) is None:
+        index = faiss.IndexIDMap2(index)
+    return index
+
+def train_index(index, vectors: np.ndarray, seed: int = 1234):
+    """Entraîne l'index si nécessaire (IVF, PQ) sur un échantillon des vecteurs"""
+    if index.is_trained:
+        return
+    ivf = faiss.try_extract_index_ivf(index)
+    max_points = TRAINING_POINTS_PER_CENTROID * max(ivf.nlist if ivf else 1, 256)
+    if len(vectors) > max_points:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), max_points, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype='float32'))
+
+def configure_search(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Applique les réglages de recherche (nprobe pour IVF, efSearch pour HNSW)"""
+    if index is None:
+        return
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if isinstance(inner, faiss.IndexHNSW) and ef_search:
+        inner.hnsw.efSearch = ef_search
+
+def supports_removal(index_type: str) -> bool:
+    """Flat et IVF retirent des ids en place ; HNSW doit être reconstruit"""
+    return index_type != "hnsw"
+
+def exclusion_params(index, excluded_ids) -> Optional[faiss.SearchParameters]:
+    """Paramètres de recherche HNSW écartant des ids marqués supprimés, None s'il n'y en a pas.
+
+    À construire après configure_search : efSearch est repris de l'index.
+    """
+    if index is None or not len(excluded_ids):
+        return None
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+    if not isinstance(inner, faiss.IndexHNSW):
+        return None
+    params = faiss.SearchParametersHNSW()
+    params.efSearch = inner.hnsw.efSearch
+    params.sel = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.asarray(excluded_ids, dtype='int64')))
+    return params
+
+def index_ids(index) -> np.ndarray:
+    """Ids présents dans un index, sans reconstruire les vecteurs"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return faiss.vector_to_array(index.id_map).astype('int64')
+    invlists = ivf.invlists
+    ids = [
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist)
+        if invlists.list_size(list_no)
+    ]
+    return np.concatenate(ids) if ids else np.zeros(0, dtype='int64')
+
+def export_vectors(index) -> Tuple[np.ndarray, np.ndarray]:
+    """Retourne (ids, vecteurs) d'un index, pour le reconstruire sous un autre type.
+
+    La reconstruction est exacte pour Flat, HNSW et IVF-Flat, approchée pour IVF-PQ.
+    """
+    ids = index_ids(index)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        vectors = index.reconstruct_batch(ids) if len(ids) else np.zeros((0, index.d), dtype='float32')
+        return ids, vectors
+
+    vectors = index.index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype='float32')
+    return ids, vectors
+
+def rebuild_index(index_type: str, dimension: int, ids: np.ndarray, vectors: np.ndarray, hnsw_m: int = 32):
+    """Construit, entraîne et remplit un nouvel index à partir de vecteurs existants"""
+    index = create_index(index_type, dimension, len(vectors), hnsw_m)
+    if len(vectors):
+        train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+    return index
+
+def remove_ids(index, index_type: str, ids: np.ndarray, hnsw_m: int = 32):
+    """Supprime des ids ; HNSW ne le permettant pas, l'index est alors reconstruit sans eux.
+
+    La reconstruction coûte autant qu'une construction complète : pour HNSW,
+    IndexStore marque d'abord les ids supprimés (voir exclusion_params) et ne
+    reconstruit qu'au-delà de HNSW_MAX_DELETED_FRACTION.
+    """
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        kept_ids, vectors = export_vectors(index)
+        mask = ~np.isin(kept_ids, ids)
+        return rebuild_index(index_type, index.d, kept_ids[mask], vectors[mask], hnsw_m)
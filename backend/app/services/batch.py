@@ -0,0 +1,72 @@
+# app/services/batch.py
+import json
+import time
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+from app.core.config import settings
+from app.services.streaming import sse_event
+
+def params_key(type_document: str, parametres: dict) -> str:
+    """Clé de déduplication : type de document + paramètres (ordre des clés indifférent)"""
+    return json.dumps([type_document, parametres], sort_keys=True, ensure_ascii=False, default=str)
+
+async def run_batch(
+    items: List[dict],
+    generate: Callable[[dict], Awaitable[str]],
+    max_concurrency: int = None,
+) -> AsyncIterator[dict]:
+    """Génère les documents d'un lot en parallèle et les renvoie au fil de l'eau.
+
+    `items` contient des {"type_document", "parametres"}. Les demandes
+    identiques ne sont générées qu'une fois ; chaque position du lot reçoit
+    tout de même son résultat. Au plus `max_concurrency` générations tournent
+    en même temps, la durée totale reste donc proche de celle de l'élément le
+    plus lent tant que le lot tient dans la limite.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or settings.BATCH_MAX_CONCURRENCY)
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(params_key(item["type_document"], item["parametres"]), []).append(index)
+
+    async def run_one(indices: List[int]) -> dict:
+        item = items[indices[0]]
+        async with semaphore:
+            start_time = time.time()
+            try:
+                document = await generate(item)
+                outcome = {"status": "success", "document_genere": document}
+            except Exception as e:
+                outcome = {"status": "error", "erreur": str(getattr(e, "detail", e))}
+        outcome["generation_time"] = round(time.time() - start_time, 3)
+        return {"indices": indices, "type_document": item["type_document"], **outcome}
+
+    tasks = [asyncio.create_task(run_one(indices)) for indices in groups.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            indices = result.pop("indices")
+            for position, index in enumerate(indices):
+                yield {"index": index, "deduplique": position > 0, **result}
+    finally:
+        # Client déconnecté : inutile de poursuivre les générations restantes
+        for task in tasks:
+            task.cancel()
+
+async def stream_batch(results: AsyncIterator[dict], total: int) -> AsyncIterator[str]:
+    """Relaie les résultats d'un lot en SSE : un événement `result` par élément, puis `done`"""
+    start_time = time.time()
+    counts = {"success": 0, "error": 0}
+    unique_time = 0.0
+    async for result in results:
+        counts[result["status"]] += 1
+        if not result["deduplique"]:
+            unique_time += result["generation_time"]
+        yield sse_event("result", result)
+    yield sse_event("done", {
+        "total": total,
+        "succeeded": counts["success"],
+        "failed": counts["error"],
+        "total_time": round(time.time() - start_time, 3),
+        # Somme des durées individuelles : ce qu'aurait coûté un traitement séquentiel
+        "sequential_time": round(unique_time, 3),
+    })
@@ -0,0 +1,135 @@
+# app/services/chat_memory.py
+import asyncio
+from typing import Awaitable, Callable, List, Set, Tuple
+from app.core.config import settings
+from app.services.chunking import CHARS_PER_TOKEN, estimate_tokens
+from app.services.conversation_store import ConversationStore, SessionNotFound
+
+# Part du budget laissée aux derniers tours verbatim après un résumé
+RECENT_SHARE = 0.5
+
+# (résumé précédent, messages à intégrer) -> nouveau résumé
+Summarizer = Callable[[str, List[dict]], Awaitable[str]]
+
+def message_tokens(messages: List[dict]) -> int:
+    return sum(estimate_tokens(msg["content"]) for msg in messages)
+
+def recent_within_budget(messages: List[dict], budget: int) -> List[dict]:
+    """Derniers messages tenant dans `budget` tokens, en commençant par un tour utilisateur"""
+    total = 0
+    start = len(messages)
+    while start > 0 and total + estimate_tokens(messages[start - 1]["content"]) <= budget:
+        start -= 1
+        total += estimate_tokens(messages[start]["content"])
+    recent = messages[start:]
+    while recent and recent[0]["role"] != "user":
+        recent = recent[1:]
+    return recent
+
+def last_exchange(messages: List[dict]) -> List[dict]:
+    """Dernier tour utilisateur et ce qui le suit"""
+    for start in range(len(messages) - 1, -1, -1):
+        if messages[start]["role"] == "user":
+            return messages[start:]
+    return messages[-1:]
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    if estimate_tokens(text) <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    return text[:(budget - 1) * CHARS_PER_TOKEN].rstrip() + "…"
+
+def fit_to_budget(messages: List[dict], summary: str, budget: int) -> Tuple[str, List[dict]]:
+    """Résumé et derniers messages tenant ensemble dans `budget` tokens.
+
+    Le dernier échange est toujours conservé : si le résumé ne lui laisse pas
+    de place, c'est le résumé qui est tronqué.
+    """
+    recent = recent_within_budget(messages, max(0, budget - estimate_tokens(summary)))
+    if recent or not messages:
+        return summary, recent
+    recent = last_exchange(messages)
+    return truncate_to_tokens(summary, budget - message_tokens(recent)), recent
+
+def format_transcript(messages: List[dict]) -> str:
+    return "\n".join(
+        f"{'Utilisateur' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in messages
+    )
+
+class ChatMemory:
+    """Mémoire des conversations longues : derniers tours verbatim + résumé glissant.
+
+    Le contexte envoyé au modèle est le résumé de la session suivi des messages
+    qu'il ne couvre pas encore, dans la limite de `token_budget`. Quand ces
+    messages dépassent le budget, les plus anciens sont intégrés au résumé par
+    une tâche de fond lancée après la réponse : le résumé n'ajoute jamais de
+    latence au tour en cours. Un budget nul désactive la mémoire (historique
+    complet, borné par CHAT_MAX_HISTORY_MESSAGES).
+
+    Les résumés en cours sont attendus à l'arrêt du serveur (`drain`,
+    enregistré comme gestionnaire de shutdown par les applications).
+    """
+
+    def __init__(self, store: ConversationStore, summarize: Summarizer, token_budget: int = None):
+        self.store = store
+        self.summarize = summarize
+        self.token_budget = settings.CHAT_MEMORY_TOKEN_BUDGET if token_budget is None else token_budget
+        self._updating: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    def fit(self, messages: List[dict], summary: str = "") -> Tuple[str, List[dict]]:
+        """Résumé et derniers messages tenant dans le budget (voir `fit_to_budget`)"""
+        if not self.enabled:
+            return summary, messages
+        return fit_to_budget(messages, summary, self.token_budget)
+
+    async def context(self, session_id: str) -> Tuple[str, List[dict]]:
+        """Résumé et messages récents à envoyer au modèle pour une session"""
+        messages = await self.store.get_messages(session_id)
+        if not self.enabled:
+            return "", messages
+        state = await self.store.get_summary(session_id)
+        pending = messages[state["summarized_count"]:]
+        return self.fit(pending, state["summary"])
+
+    def schedule_update(self, session_id: str):
+        """Met à jour le résumé en tâche de fond (une seule à la fois par session)"""
+        if not self.enabled or session_id in self._updating:
+            return
+        self._updating.add(session_id)
+        task = asyncio.create_task(self._update(session_id))
+        # Référence conservée jusqu'à la fin, sinon la tâche peut être collectée
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, session_id: str):
+        try:
+            messages = await self.store.get_messages(session_id)
+            state = await self.store.get_summary(session_id)
+            pending = messages[state["summarized_count"]:]
+            if message_tokens(pending) + estimate_tokens(state["summary"]) <= self.token_budget:
+                return
+
+            recent = recent_within_budget(pending, int(self.token_budget * RECENT_SHARE))
+            to_fold = pending[:len(pending) - len(recent)]
+            if not to_fold:
+                return
+            summary = await self.summarize(state["summary"], to_fold)
+            await self.store.set_summary(session_id, summary, state["summarized_count"] + len(to_fold))
+        except SessionNotFound:
+            pass
+        except Exception as e:
+            # Le résumé sera retenté au prochain tour ; en attendant, le contexte est tronqué
+            print(f"Erreur lors du résumé de la conversation {session_id}: {e}")
+        finally:
+            self._updating.discard(session_id)
+
+    async def drain(self):
+        """Attend la fin des résumés en cours (arrêt du serveur, tests)"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,185 @@
+# app/services/chat_sessions.py
+import time
+import asyncio
+import datetime
+import google.generativeai as genai
+from google.generativeai import caching
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.chunking import estimate_tokens
+from app.services.chat_memory import fit_to_budget
+from app.services.gemini_client import GeminiClient
+from app.services.model_router import ModelRouter
+
+# Délai avant de retenter la création d'un cache de contexte refusé (modèle non supporté, quota...)
+CONTEXT_CACHE_RETRY_SECONDS = 600
+# Taille minimale (tokens) d'un contenu mis en cache, par préfixe de nom de modèle ;
+# en deçà, CachedContent.create est refusé par l'API
+CONTEXT_CACHE_MIN_TOKENS = {
+    "gemini-1.5": 32768,
+    "gemini-2.0": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+
+def context_cache_min_tokens(model_name: str) -> int:
+    for prefix, minimum in CONTEXT_CACHE_MIN_TOKENS.items():
+        if model_name.startswith(prefix):
+            return minimum
+    return settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS
+
+def to_gemini_history(messages: List[dict]) -> List[dict]:
+    """Convertit l'historique {"role": "user"|"assistant", "content"} au format Gemini"""
+    return [
+        {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+        for msg in messages
+    ]
+
+class GeminiChat:
+    """Conversations multi-tours natives Gemini.
+
+    Chaque tour passe par `GenerativeModel.start_chat` : les consignes sont
+    envoyées comme `system_instruction` et l'historique comme contenus
+    structurés, au lieu d'être ré-aplaties dans un prompt texte. Le préfixe
+    partagé (consignes + corpus éventuel) est enregistré dans le cache de
+    contexte Gemini lorsque le modèle le permet ; sinon on revient aux seules
+    consignes système.
+
+    Le cache n'est tenté que si le préfixe atteint la taille minimale du
+    modèle, et il est créé (puis renouvelé avant expiration) en tâche de fond :
+    les tours qui arrivent entre-temps utilisent le modèle de base au lieu
+    d'attendre l'appel à l'API de cache.
+    """
+
+    def __init__(self, client: GeminiClient, system_instruction: str, max_history_messages: Optional[int] = None):
+        self.client = client
+        self.system_instruction = system_instruction
+        self.max_history_messages = max_history_messages or settings.CHAT_MAX_HISTORY_MESSAGES
+        self.shared_contents: List[str] = []
+        self._base_model = genai.GenerativeModel(client.model_name, system_instruction=system_instruction)
+        self._cached_model = None
+        self._cache_expires_at = 0.0
+        self._cache_retry_at = 0.0
+        self._cache_task: Optional[asyncio.Task] = None
+        self._cacheable = self._prefix_is_cacheable()
+
+    def _prefix_is_cacheable(self) -> bool:
+        prefix_tokens = estimate_tokens(self.system_instruction) + sum(estimate_tokens(text) for text in self.shared_contents)
+        return prefix_tokens >= context_cache_min_tokens(self.client.model_name)
+
+    def set_shared_context(self, contents: List[str]):
+        """Déclare un contexte commun à toutes les conversations (ex. corpus juridique)"""
+        self.shared_contents = contents
+        self._cacheable = self._prefix_is_cacheable()
+        self._cached_model = None
+        self._cache_expires_at = 0.0
+        self._cache_retry_at = 0.0
+
+    def _create_cached_model(self):
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL
+        cached = caching.CachedContent.create(
+            model=f"models/{self.client.model_name}",
+            system_instruction=self.system_instruction,
+            contents=[{"role": "user", "parts": self.shared_contents}] if self.shared_contents else None,
+            ttl=datetime.timedelta(seconds=ttl)
+        )
+        self._cache_expires_at = time.time() + ttl
+        return genai.GenerativeModel.from_cached_content(cached)
+
+    async def _refresh_cache(self):
+        contents = self.shared_contents
+        try:
+            cached_model = await asyncio.to_thread(self._create_cached_model)
+            # Contexte partagé remplacé pendant la création : ce cache est déjà périmé
+            if self.shared_contents is contents:
+                self._cached_model = cached_model
+        except Exception as e:
+            # Modèle non compatible, quota du cache atteint...
+            print(f"Cache de contexte Gemini indisponible, consignes envoyées à chaque tour: {e}")
+            self._cached_model = None
+            self._cache_retry_at = time.time() + CONTEXT_CACHE_RETRY_SECONDS
+
+    async def _model(self) -> genai.GenerativeModel:
+        """Modèle adossé au cache de contexte s'il est disponible, modèle de base sinon"""
+        if not settings.GEMINI_CONTEXT_CACHE_ENABLED or not self._cacheable:
+            return self._base_model
+        now = time.time()
+        # Renouvellement lancé cinq minutes avant l'expiration, cache utilisé jusqu'à une minute avant
+        refreshing = self._cache_task is not None and not self._cache_task.done()
+        if not refreshing and now >= self._cache_retry_at and (
+            self._cached_model is None or now >= self._cache_expires_at - 300
+        ):
+            self._cache_task = asyncio.create_task(self._refresh_cache())
+        if self._cached_model is not None and now < self._cache_expires_at - 60:
+            return self._cached_model
+        return self._base_model
+
+    async def _start_chat(self, history: List[dict], summary: str = "") -> genai.ChatSession:
+        model = await self._model()
+        if settings.CHAT_MEMORY_TOKEN_BUDGET > 0:
+            # Borne en tokens (déjà appliquée par ChatMemory en mode session, à appliquer à l'historique client)
+            summary, recent = fit_to_budget(history, summary, settings.CHAT_MEMORY_TOKEN_BUDGET)
+        else:
+            recent = history[-self.max_history_messages:] if self.max_history_messages else history
+        # Gemini attend un historique qui commence par un tour utilisateur
+        while recent and recent[0]["role"] != "user":
+            recent = recent[1:]
+        if summary:
+            # Résumé des tours plus anciens, présenté comme un échange préalable
+            recent = [
+                {"role": "user", "content": f"Résumé de notre conversation jusqu'ici :\n{summary}"},
+                {"role": "assistant", "content": "Entendu, je tiens compte de ce résumé."}
+            ] + recent
+        return model.start_chat(history=to_gemini_history(recent))
+
+    async def send(self, message: str, history: List[dict], summary: str = "") -> str:
+        """Envoie un message dans la conversation décrite par `history` (et son résumé éventuel)"""
+        chat = await self._start_chat(history, summary)
+        return await self.client.send_chat(chat, message)
+
+    async def stream(self, message: str, history: List[dict], summary: str = "") -> AsyncIterator[str]:
+        """Version streaming de `send`"""
+        chat = await self._start_chat(history, summary)
+        async for text in self.client.stream_chat(chat, message):
+            yield text
+
+class RoutedChat:
+    """Conversations dont le modèle est choisi par le routeur (tâche "chat") à chaque tour"""
+
+    def __init__(self, router: ModelRouter, system_instruction: str, task: str = "chat"):
+        self.router = router
+        self.system_instruction = system_instruction
+        self.task = task
+        self.shared_contents: List[str] = []
+        self.chats: Dict[str, GeminiChat] = {}
+
+    def _chat(self, client: GeminiClient) -> GeminiChat:
+        if client.model_name not in self.chats:
+            chat = GeminiChat(client, self.system_instruction)
+            if self.shared_contents:
+                chat.set_shared_context(self.shared_contents)
+            self.chats[client.model_name] = chat
+        return self.chats[client.model_name]
+
+    def set_shared_context(self, contents: List[str]):
+        self.shared_contents = contents
+        for chat in self.chats.values():
+            chat.set_shared_context(contents)
+
+    async def send(self, message: str, history: List[dict], summary: str = "") -> str:
+        response, _ = await self.send_with_model(message, history, summary)
+        return response
+
+    async def send_with_model(self, message: str, history: List[dict], summary: str = "") -> Tuple[str, str]:
+        """Réponse et modèle qui l'a produite"""
+        return await self.router.run_with_model(
+            self.task, message,
+            lambda client: self._chat(client).send(message, history, summary),
+            lambda text: estimate_tokens(text)
+        )
+
+    def stream(self, message: str, history: List[dict], summary: str = "") -> AsyncIterator[str]:
+        return self.router.stream_with(
+            self.task, message,
+            lambda client: self._chat(client).stream(message, history, summary)
+        )
@@ -0,0 +1,373 @@
+# app/services/chunk_store.py
+import os
+import re
+import mmap
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
+
+# Colonnes de la table des morceaux (int64) ; les ids sont dans un fichier à part, trié
+OFFSET, LENGTH, FILENAME_OFFSET, FILENAME_LENGTH, SECTION_OFFSET, SECTION_LENGTH, START, END = range(8)
+N_COLUMNS = 8
+ROW_BYTES = N_COLUMNS * 8
+# Valeur des colonnes absentes (section, début et fin non renseignés)
+MISSING = -1
+# Morceaux lus par bloc lors d'un parcours complet
+ITER_BLOCK = 65536
+# Le texte est réécrit dans un nouveau fichier quand plus de la moitié est inutilisée
+COMPACT_MIN_BYTES = 1 << 20
+CHUNK_FILE_PATTERN = re.compile(r"chunks-\d+\.(?:npy|bin|ids|rows|del)$")
+
+def _file_names(generation: int) -> Tuple[str, str, str]:
+    """Fichiers des ids, des lignes et des retraits d'une génération"""
+    return f"chunks-{generation}.ids", f"chunks-{generation}.rows", f"chunks-{generation}.del"
+
+def open_append(path: str, size: int):
+    """Ouvre un fichier en ajout après `size` octets : ce qu'une écriture interrompue a laissé au-delà est effacé"""
+    f = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+    f.truncate(size)
+    f.seek(size)
+    return f
+
+def _map_array(path: str, shape: tuple) -> np.ndarray:
+    if not shape[0]:
+        return np.empty(shape, dtype='int64')
+    return np.memmap(path, dtype='int64', mode='r', shape=shape)
+
+class ChunkRecord:
+    """Métadonnées d'un morceau, lues à la demande dans la table et le fichier de texte.
+
+    S'utilise comme le dictionnaire d'un morceau (`record['content']`,
+    `record.get('section')`) ; le texte n'est décodé qu'à l'accès.
+    """
+
+    __slots__ = ("_blob", "_row")
+
+    def __init__(self, blob, row: Tuple[int, ...]):
+        self._blob = blob
+        self._row = row
+
+    def _text(self, offset: int, length: int) -> Optional[str]:
+        if offset == MISSING:
+            return None
+        return self._blob[offset:offset + length].decode('utf-8')
+
+    def __getitem__(self, key: str):
+        row = self._row
+        if key == 'content':
+            return self._text(row[OFFSET], row[LENGTH])
+        if key == 'filename':
+            return self._text(row[FILENAME_OFFSET], row[FILENAME_LENGTH])
+        if key == 'section':
+            return self._text(row[SECTION_OFFSET], row[SECTION_LENGTH])
+        if key in ('start', 'end'):
+            value = row[START if key == 'start' else END]
+            return None if value == MISSING else value
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def to_dict(self) -> dict:
+        return {key: self[key] for key in ('content', 'filename', 'section', 'start', 'end')}
+
+class ChunkStore(MutableMapping):
+    """Métadonnées des morceaux en colonnes, indexées par les ids FAISS.
+
+    Les textes (contenu, nom de fichier, section) sont concaténés dans un
+    fichier UTF-8 mappé en mémoire ; une table numpy (positions et longueurs
+    dans ce fichier, début, fin), accompagnée du fichier trié des ids, et
+    elle aussi mappée, remplace la liste de dictionnaires : seules les pages
+    lues pour les résultats d'une recherche sont chargées. Les noms de fichier
+    et sections répétés ne sont écrits qu'une fois par session d'écriture.
+
+    Le texte d'un morceau ajouté est écrit immédiatement en fin de fichier ;
+    seule sa ligne (quelques entiers) reste en mémoire jusqu'à `save`. Les
+    ids étant attribués en ordre croissant, `save` se contente d'ajouter ces
+    lignes et les retraits (marqués dans un fichier de retraits) en fin des
+    fichiers de la génération courante : le coût d'un point de reprise est
+    proportionnel aux changements, pas au corpus. Une nouvelle génération
+    n'est écrite que pour compacter (retraits ou texte inutilisé
+    majoritaires) ou pour des ids réinsérés dans le désordre. Le manifeste de
+    l'index enregistre le nombre de lignes, de retraits et d'octets valides :
+    ce qu'une écriture interrompue a ajouté au-delà est ignoré puis effacé.
+    """
+
+    def __init__(self, index_dir: str, generation: int = 0):
+        """`generation` : dernière génération déjà présente dans `index_dir`, dont les fichiers ne doivent pas être réutilisés"""
+        self.index_dir = index_dir
+        self._ids = np.empty(0, dtype='int64')
+        self._table = np.empty((0, N_COLUMNS), dtype='int64')
+        self._blob = b""
+        self._generation = generation
+        self._blob_name = ""
+        self._blob_size = 0
+        self._live_bytes = 0
+        # Retraits persistés (y compris ceux de la génération courante) et ajouts depuis la dernière sauvegarde
+        self._removed: Set[int] = set()
+        self._saved_removals = 0
+        self._new_removals: List[int] = []
+        self._appended: Dict[int, Tuple[int, ...]] = {}
+        self._writer = None
+        self._interned: Dict[str, Tuple[int, int]] = {}
+        # Nouvelle génération à écrire à la prochaine sauvegarde (store jamais sauvegardé, ancien format)
+        self._rewrite = True
+
+    @classmethod
+    def from_documents(cls, index_dir: str, documents: Dict[int, dict]) -> "ChunkStore":
+        """Store non encore persisté, à partir de dictionnaires de morceaux (ancien documents.json)"""
+        store = cls(index_dir)
+        for doc_id in sorted(documents):
+            store[doc_id] = documents[doc_id]
+        return store
+
+    @classmethod
+    def load(cls, index_dir: str, state: dict) -> "ChunkStore":
+        """Mappe en mémoire la génération décrite par `state` (renvoyé par `save`)"""
+        store = cls(index_dir)
+        store._generation = state["generation"]
+        store._blob_name = state["blob"]
+        store._rewrite = False
+        if "table" in state:
+            # Table d'une seule pièce (id en première colonne) : convertie à la prochaine sauvegarde
+            table = np.load(os.path.join(index_dir, state["table"]), mmap_mode='r')
+            store._ids = np.ascontiguousarray(table[:, 0])
+            store._table = table[:, 1:]
+            store._live_bytes = int(store._table[:, LENGTH].sum())
+            store._rewrite = True
+        else:
+            ids_name, rows_name, removed_name = _file_names(store._generation)
+            store._ids = _map_array(os.path.join(index_dir, ids_name), (state["rows"],))
+            store._table = _map_array(os.path.join(index_dir, rows_name), (state["rows"], N_COLUMNS))
+            store._live_bytes = state["live_bytes"]
+            store._saved_removals = state["removed"]
+            if state["removed"]:
+                removed = np.fromfile(os.path.join(index_dir, removed_name), dtype='int64', count=state["removed"])
+                store._removed = set(removed.tolist())
+        store._open_blob(state.get("blob_size"))
+        return store
+
+    def _open_blob(self, size: Optional[int] = None):
+        """Mappe le fichier de texte jusqu'à `size` octets (par défaut, sa taille actuelle)"""
+        path = os.path.join(self.index_dir, self._blob_name)
+        self._blob_size = os.path.getsize(path) if size is None else size
+        if not self._blob_size:
+            self._blob = b""
+            return
+        with open(path, 'rb') as f:
+            self._blob = mmap.mmap(f.fileno(), self._blob_size, access=mmap.ACCESS_READ)
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._interned = {}
+
+    def _write_text(self, text: Optional[str], intern: bool = False) -> Tuple[int, int]:
+        """Ajoute un texte en fin de fichier ; renvoie sa position et sa longueur"""
+        if text is None:
+            return MISSING, 0
+        if intern and text in self._interned:
+            return self._interned[text]
+        if self._writer is None:
+            if not self._blob_name:
+                self._blob_name = f"chunks-{self._generation + 1}.bin"
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._writer = open_append(os.path.join(self.index_dir, self._blob_name), self._blob_size)
+        data = text.encode('utf-8')
+        span = (self._writer.tell(), len(data))
+        self._writer.write(data)
+        if intern:
+            self._interned[text] = span
+        return span
+
+    def _record(self, row: Tuple[int, ...]) -> ChunkRecord:
+        # Texte ajouté après le mappage : le fichier est remappé jusqu'à la fin écrite
+        if row[OFFSET] + row[LENGTH] > len(self._blob) or row[FILENAME_OFFSET] + row[FILENAME_LENGTH] > len(self._blob) \
+                or row[SECTION_OFFSET] + row[SECTION_LENGTH] > len(self._blob):
+            self._writer.flush()
+            self._open_blob(self._writer.tell())
+        return ChunkRecord(self._blob, row)
+
+    def _position(self, doc_id: int) -> int:
+        """Ligne d'un id persisté dans la table, ou -1"""
+        position = int(np.searchsorted(self._ids, doc_id))
+        if position < len(self._ids) and self._ids[position] == doc_id and doc_id not in self._removed:
+            return position
+        return -1
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._removed) + len(self._appended)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._appended or self._position(doc_id) != -1
+
+    def __getitem__(self, doc_id: int):
+        if doc_id in self._appended:
+            return self._record(self._appended[doc_id])
+        position = self._position(doc_id)
+        if position == -1:
+            raise KeyError(doc_id)
+        return ChunkRecord(self._blob, tuple(self._table[position].tolist()))
+
+    def __setitem__(self, doc_id: int, chunk: dict):
+        if doc_id in self:
+            del self[doc_id]
+        offset, length = self._write_text(chunk['content'])
+        filename_offset, filename_length = self._write_text(chunk.get('filename'), intern=True)
+        section_offset, section_length = self._write_text(chunk.get('section'), intern=True)
+        start, end = chunk.get('start'), chunk.get('end')
+        self._appended[doc_id] = (offset, length, filename_offset, filename_length, section_offset, section_length,
+                                  MISSING if start is None else start, MISSING if end is None else end)
+        self._live_bytes += length
+
+    def __delitem__(self, doc_id: int):
+        if doc_id in self._appended:
+            self._live_bytes -= self._appended.pop(doc_id)[LENGTH]
+            return
+        position = self._position(doc_id)
+        if position == -1:
+            raise KeyError(doc_id)
+        self._removed.add(doc_id)
+        self._new_removals.append(doc_id)
+        self._live_bytes -= int(self._table[position, LENGTH])
+
+    def _rows(self) -> Iterator[Tuple[int, Tuple[int, ...]]]:
+        """(id, ligne) des morceaux persistés encore présents, lus par blocs"""
+        for start in range(0, len(self._ids), ITER_BLOCK):
+            ids = self._ids[start:start + ITER_BLOCK].tolist()
+            for doc_id, row in zip(ids, self._table[start:start + ITER_BLOCK].tolist()):
+                if not self._removed or doc_id not in self._removed:
+                    yield doc_id, tuple(row)
+
+    def __iter__(self) -> Iterator[int]:
+        for doc_id, _ in self._rows():
+            yield doc_id
+        yield from list(self._appended)
+
+    def items(self):
+        for doc_id, row in self._rows():
+            yield doc_id, ChunkRecord(self._blob, row)
+        for doc_id in list(self._appended):
+            yield doc_id, self[doc_id]
+
+    def values(self):
+        for _, chunk in self.items():
+            yield chunk
+
+    def ids(self) -> np.ndarray:
+        """Ids présents, triés"""
+        ids = np.asarray(self._ids)
+        if self._removed:
+            ids = ids[~np.isin(ids, np.fromiter(self._removed, dtype='int64', count=len(self._removed)))]
+        appended = np.fromiter(self._appended, dtype='int64', count=len(self._appended))
+        return np.sort(np.concatenate([ids, appended]), kind='stable')
+
+    def save(self) -> dict:
+        """Persiste les ajouts et retraits depuis la dernière sauvegarde.
+
+        Renvoie l'état à enregistrer dans le manifeste pour `load`.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        if self._writer is not None:
+            self._writer.flush()
+            self._blob_size = self._writer.tell()
+        appended = np.fromiter(self._appended, dtype='int64', count=len(self._appended))
+        in_order = not len(appended) or (
+            bool(np.all(appended[1:] > appended[:-1])) and (not len(self._ids) or appended[0] > self._ids[-1])
+        )
+        compact_blob = self._blob_size > COMPACT_MIN_BYTES and 2 * self._live_bytes < self._blob_size
+        if self._rewrite or not in_order or compact_blob or 2 * len(self._removed) > len(self._ids):
+            self._save_generation(appended, compact_blob)
+        else:
+            self._append(appended)
+        return {"generation": self._generation, "blob": self._blob_name, "blob_size": self._blob_size,
+                "rows": len(self._ids), "removed": self._saved_removals, "live_bytes": self._live_bytes}
+
+    def _append(self, appended: np.ndarray):
+        """Ajoute les nouvelles lignes et les nouveaux retraits en fin des fichiers de la génération"""
+        ids_name, rows_name, removed_name = _file_names(self._generation)
+        n_rows = len(self._ids)
+        if len(appended):
+            rows = np.array(list(self._appended.values()), dtype='int64').reshape(-1, N_COLUMNS)
+            with open_append(os.path.join(self.index_dir, ids_name), n_rows * 8) as f:
+                f.write(appended.tobytes())
+            with open_append(os.path.join(self.index_dir, rows_name), n_rows * ROW_BYTES) as f:
+                f.write(rows.tobytes())
+        if self._new_removals:
+            with open_append(os.path.join(self.index_dir, removed_name), self._saved_removals * 8) as f:
+                f.write(np.array(self._new_removals, dtype='int64').tobytes())
+            self._saved_removals += len(self._new_removals)
+        self._new_removals = []
+        self._appended = {}
+        self._map_generation(n_rows + len(appended))
+
+    def _save_generation(self, appended: np.ndarray, compact_blob: bool):
+        """Nouvelle génération de la table sans les morceaux retirés, triée par id ;
+        le texte encore utilisé est recopié dans un nouveau fichier si `compact_blob`"""
+        generation = self._generation + 1
+        ids = np.asarray(self._ids)
+        table = np.asarray(self._table)
+        if self._removed:
+            kept = ~np.isin(ids, np.fromiter(self._removed, dtype='int64', count=len(self._removed)))
+            ids, table = ids[kept], table[kept]
+        rows = np.array(list(self._appended.values()), dtype='int64').reshape(-1, N_COLUMNS)
+        ids, table = np.concatenate([ids, appended]), np.concatenate([table, rows])
+
+        if compact_blob:
+            # Compactage : seuls les textes encore référencés sont recopiés
+            self._open_blob(self._blob_size)
+            source = self._blob
+            self._close_writer()
+            self._blob_name, self._blob_size = f"chunks-{generation}.bin", 0
+            compacted = np.empty_like(table)
+            for start in range(0, len(table), ITER_BLOCK):
+                for i, row in enumerate(table[start:start + ITER_BLOCK].tolist(), start=start):
+                    chunk = ChunkRecord(source, tuple(row)).to_dict()
+                    compacted[i, [OFFSET, LENGTH]] = self._write_text(chunk['content'])
+                    compacted[i, [FILENAME_OFFSET, FILENAME_LENGTH]] = self._write_text(chunk['filename'], intern=True)
+                    compacted[i, [SECTION_OFFSET, SECTION_LENGTH]] = self._write_text(chunk['section'], intern=True)
+                    compacted[i, [START, END]] = row[START], row[END]
+            table = compacted
+            self._writer.flush()
+            self._blob_size = self._writer.tell()
+            self._close_writer()
+
+        elif not self._blob_name:
+            self._blob_name = f"chunks-{generation}.bin"
+            open(os.path.join(self.index_dir, self._blob_name), 'wb').close()
+
+        order = np.argsort(ids, kind='stable')
+        ids_name, rows_name, removed_name = _file_names(generation)
+        with open(os.path.join(self.index_dir, ids_name), 'wb') as f:
+            f.write(np.ascontiguousarray(ids[order]).tobytes())
+        with open(os.path.join(self.index_dir, rows_name), 'wb') as f:
+            f.write(np.ascontiguousarray(table[order]).tobytes())
+        open(os.path.join(self.index_dir, removed_name), 'wb').close()
+
+        self._generation = generation
+        self._removed = set()
+        self._saved_removals = 0
+        self._new_removals = []
+        self._appended = {}
+        self._live_bytes = int(table[:, LENGTH].sum()) if len(table) else 0
+        self._rewrite = False
+        self._map_generation(len(ids))
+
+    def _map_generation(self, n_rows: int):
+        ids_name, rows_name, _ = _file_names(self._generation)
+        self._ids = _map_array(os.path.join(self.index_dir, ids_name), (n_rows,))
+        self._table = _map_array(os.path.join(self.index_dir, rows_name), (n_rows, N_COLUMNS))
+        self._open_blob(self._blob_size)
+
+    @staticmethod
+    def cleanup(index_dir: str, state: dict):
+        """Supprime les générations qui ne sont plus référencées par `state`"""
+        keep = {state["blob"], *_file_names(state["generation"])}
+        for name in os.listdir(index_dir):
+            if CHUNK_FILE_PATTERN.match(name) and name not in keep:
+                os.remove(os.path.join(index_dir, name))
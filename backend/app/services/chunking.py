@@ -0,0 +1,122 @@
+# app/services/chunking.py
+import re
+from bisect import bisect_right
+from typing import List, Tuple
+
+# Environ 4 caractères par token pour Gemini (estimation sans appel API)
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Estime le nombre de tokens d'un texte"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+# Débuts de structure juridique : articles, sections, clauses numérotées, titres en majuscules
+HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:Article|ARTICLE|Art\.)\s+(?:[LRD]\.?\s?)?\d[\w.\-]*"
+    r"|(?:Livre|LIVRE|Partie|PARTIE|Titre|TITRE|Chapitre|CHAPITRE|Section|SECTION|Sous-section)\b"
+    r"|\d+(?:\.\d+)*[.)]\s"
+    r"|[A-ZÀ-ÖØ-Þ][A-ZÀ-ÖØ-Þ0-9 '’(),&/\-]{3,}$"
+    r")",
+    re.MULTILINE
+)
+
+class LegalChunker:
+    """Découpe un texte juridique selon sa structure (articles, sections, clauses).
+
+    Les segments structurels sont regroupés jusqu'au budget de tokens ; un
+    segment trop long est coupé sur des limites de phrase ou d'espace. Chaque
+    morceau reprend la fin du précédent (chevauchement en tokens) et conserve
+    ses positions dans le fichier source.
+    """
+
+    def __init__(self, max_tokens: int = 400, overlap_tokens: int = 50):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.max_chars = max_tokens * CHARS_PER_TOKEN
+        self.overlap_chars = self.overlap_tokens * CHARS_PER_TOKEN
+        # Les segments redécoupés laissent la place du chevauchement dans le budget
+        self.piece_chars = self.max_chars - self.overlap_chars
+
+    @property
+    def name(self) -> str:
+        return f"legal-{self.max_tokens}-{self.overlap_tokens}"
+
+    def _headings(self, text: str) -> List[Tuple[int, str]]:
+        """Positions et libellés des titres juridiques du texte"""
+        headings = []
+        for match in HEADING_PATTERN.finditer(text):
+            line_end = text.find("\n", match.start())
+            title = text[match.start():line_end if line_end != -1 else len(text)]
+            headings.append((match.start(), title.strip()[:120]))
+        return headings
+
+    def _segments(self, text: str, headings: List[Tuple[int, str]]) -> List[Tuple[int, int]]:
+        """Positions (début, fin) des segments délimités par les titres juridiques"""
+        starts = sorted({0} | {pos for pos, _ in headings})
+        bounds = zip(starts, starts[1:] + [len(text)])
+        return [(start, end) for start, end in bounds if text[start:end].strip()]
+
+    def _cut_point(self, text: str, start: int, limit: int) -> int:
+        """Meilleure coupure avant `limit` : fin de paragraphe, de phrase, puis espace"""
+        window = text[start:limit]
+        for separator in ("\n\n", ". ", "\n", " "):
+            pos = window.rfind(separator)
+            if pos > len(window) // 2:
+                return start + pos + len(separator)
+        return limit
+
+    def _pieces(self, text: str, headings: List[Tuple[int, str]]) -> List[Tuple[int, int]]:
+        """Segments structurels, les trop longs étant redécoupés"""
+        pieces = []
+        for start, end in self._segments(text, headings):
+            while end - start > self.piece_chars:
+                cut = self._cut_point(text, start, start + self.piece_chars)
+                pieces.append((start, cut))
+                start = cut
+            pieces.append((start, end))
+        return pieces
+
+    def _overlap_start(self, text: str, start: int, floor: int) -> int:
+        """Recule le début d'un morceau pour reprendre la fin du précédent"""
+        if not self.overlap_chars:
+            return start
+        target = max(floor, start - self.overlap_chars)
+        space = text.find(" ", target, start)
+        return space + 1 if space != -1 else target
+
+    def _section(self, headings: List[Tuple[int, str]], positions: List[int], start: int) -> str:
+        """Dernier titre juridique rencontré avant la position donnée"""
+        i = bisect_right(positions, start)
+        return headings[i - 1][1] if i else ""
+
+    def split(self, text: str) -> List[dict]:
+        """Retourne les morceaux : contenu, positions dans la source et section"""
+        headings = self._headings(text)
+        positions = [pos for pos, _ in headings]
+        chunks = []
+        chunk_start = chunk_end = anchor = None
+        for start, end in self._pieces(text, headings):
+            if chunk_start is not None and end - chunk_start <= self.max_chars:
+                chunk_end = end
+                continue
+            if chunk_start is not None:
+                chunks.append((chunk_start, chunk_end, anchor))
+                chunk_start = self._overlap_start(text, start, chunk_start)
+            else:
+                chunk_start = start
+            chunk_end = end
+            anchor = start
+        if chunk_start is not None:
+            chunks.append((chunk_start, chunk_end, anchor))
+
+        # La section est celle du premier segment propre au morceau (hors chevauchement)
+        return [
+            {
+                'content': text[start:end].strip(),
+                'start': start,
+                'end': end,
+                'section': self._section(headings, positions, anchor)
+            }
+            for start, end, anchor in chunks
+        ]
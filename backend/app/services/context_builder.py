@@ -0,0 +1,114 @@
+# app/services/context_builder.py
+import hashlib
+from typing import Callable, List, Tuple
+import numpy as np
+from app.models.schemas import SourceDocument
+from app.services.chunking import estimate_tokens
+from app.services.sparse_index import words
+
+# Longueur des séquences de mots (shingles) comparées par SimHash
+SHINGLE_SIZE = 3
+
+def simhash(text: str) -> int:
+    """Empreinte SimHash 64 bits des shingles de mots : deux textes presque identiques
+    ont des empreintes à faible distance de Hamming"""
+    tokens = words(text)
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little') for shingle in shingles],
+        dtype='<u8'
+    )
+    bits = np.unpackbits(hashes.view(np.uint8), bitorder='little').reshape(-1, 64)
+    # Chaque bit prend la majorité des shingles
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int(np.packbits(votes, bitorder='little').view('<u8')[0])
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class ContextBuilder:
+    """Assemble le contexte du prompt RAG sous un budget de tokens.
+
+    Les sources sont prises par score décroissant ; les quasi-doublons
+    (SimHash) sont écartés et une source qui ne tient plus dans le budget est
+    sautée. Les morceaux contigus d'un même fichier sont ensuite fusionnés
+    (sans répéter leur chevauchement) et chaque passage reçoit un numéro de
+    citation [n], repris dans les sources renvoyées au client.
+    """
+
+    def __init__(self, max_tokens: int, dedup_distance: int = 3,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.max_tokens = max_tokens
+        self.dedup_distance = dedup_distance
+        self.count_tokens = count_tokens
+
+    def _header(self, number: int, source: SourceDocument) -> str:
+        section = f" — {source.section}" if source.section else ""
+        return f"[{number}] {source.nom_fichier}{section}"
+
+    def _select(self, sources: List[SourceDocument]) -> List[SourceDocument]:
+        """Sources retenues par score décroissant, sans quasi-doublons et dans le budget"""
+        selected, fingerprints, used = [], [], 0
+        for source in sorted(sources, key=lambda src: -src.score):
+            fingerprint = simhash(source.contenu)
+            if any(hamming_distance(fingerprint, kept) <= self.dedup_distance for kept in fingerprints):
+                continue
+            # Le numéro de citation n'est pas encore connu : on compte l'en-tête au plus large
+            cost = self.count_tokens(self._header(len(sources), source)) + self.count_tokens(source.contenu) + 1
+            if used + cost > self.max_tokens:
+                if selected:
+                    continue
+                # Même la meilleure source dépasse le budget : elle est tronquée plutôt qu'omise
+                room = max(0, self.max_tokens - cost + self.count_tokens(source.contenu))
+                source = source.model_copy(update={"contenu": self._truncate(source.contenu, room)})
+                cost = self.max_tokens
+            selected.append(source)
+            fingerprints.append(fingerprint)
+            used += cost
+        return selected
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Coupe un texte au dernier espace avant `max_tokens` tokens"""
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text.rfind(" ", 0, low) if low < len(text) else low
+        return text[:cut if cut > 0 else low]
+
+    def _join(self, first: SourceDocument, second: SourceDocument) -> str:
+        """Texte de deux morceaux consécutifs, sans répéter leur chevauchement"""
+        overlap = max(0, (first.fin or 0) - (second.debut or 0))
+        # Sonde plus courte que le chevauchement, sinon elle déborde de la fin du premier morceau
+        probe = second.contenu[:min(40, overlap)]
+        position = first.contenu.find(probe, max(0, len(first.contenu) - overlap - 16)) if probe else -1
+        if position != -1 and second.contenu.startswith(first.contenu[position:]):
+            return first.contenu[:position] + second.contenu
+        return f"{first.contenu}\n{second.contenu}"
+
+    def _merge(self, sources: List[SourceDocument]) -> List[SourceDocument]:
+        """Fusionne les morceaux contigus ou chevauchants d'un même fichier"""
+        by_position = sorted(sources, key=lambda src: (src.nom_fichier, src.debut is None, src.debut or 0))
+        merged: List[SourceDocument] = []
+        for source in by_position:
+            previous = merged[-1] if merged else None
+            if (previous is not None and previous.nom_fichier == source.nom_fichier
+                    and previous.fin is not None and source.debut is not None and source.debut <= previous.fin):
+                merged[-1] = previous.model_copy(update={
+                    "contenu": self._join(previous, source),
+                    "fin": max(previous.fin, source.fin or previous.fin),
+                    "score": max(previous.score, source.score),
+                })
+            else:
+                merged.append(source)
+        return merged
+
+    def build(self, sources: List[SourceDocument]) -> Tuple[str, List[SourceDocument]]:
+        """Contexte à insérer dans le prompt et sources citées, numérotées dans l'ordre du contexte"""
+        passages = sorted(self._merge(self._select(sources)), key=lambda src: -src.score)
+        cited = [passage.model_copy(update={"citation": number}) for number, passage in enumerate(passages, start=1)]
+        context = "\n\n".join(f"{self._header(source.citation, source)}\n{source.contenu}" for source in cited)
+        return context, cited
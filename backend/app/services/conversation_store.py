@@ -0,0 +1,230 @@
+# app/services/conversation_store.py
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List
+from app.core.config import settings
+
+class SessionNotFound(Exception):
+    """Session de conversation inconnue ou expirée"""
+
+class ConversationStore(ABC):
+    """Historique des conversations côté serveur, indexé par identifiant de session"""
+
+    @abstractmethod
+    async def create_session(self) -> str:
+        """Crée une session vide et retourne son identifiant"""
+
+    @abstractmethod
+    async def get_messages(self, session_id: str) -> List[dict]:
+        """Messages de la session ({"role", "content"}), du plus ancien au plus récent"""
+
+    @abstractmethod
+    async def append_messages(self, session_id: str, messages: List[dict]):
+        """Ajoute des messages à la fin de l'historique de la session"""
+
+    @abstractmethod
+    async def delete_session(self, session_id: str):
+        """Supprime la session et son historique"""
+
+    @abstractmethod
+    async def get_summary(self, session_id: str) -> dict:
+        """Résumé glissant : {"summary", "summarized_count"} (messages déjà repris dans le résumé)"""
+
+    @abstractmethod
+    async def set_summary(self, session_id: str, summary: str, summarized_count: int):
+        """Remplace le résumé glissant de la session"""
+
+    def _new_session_id(self) -> str:
+        return uuid.uuid4().hex
+
+class MemoryConversationStore(ConversationStore):
+    """Stockage en mémoire, limité aux sessions les plus récemment utilisées (LRU)"""
+
+    def __init__(self, max_sessions: int = 10000):
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self.summaries: Dict[str, dict] = {}
+
+    def _session(self, session_id: str) -> List[dict]:
+        if session_id not in self.sessions:
+            raise SessionNotFound(session_id)
+        self.sessions.move_to_end(session_id)
+        return self.sessions[session_id]
+
+    async def create_session(self) -> str:
+        session_id = self._new_session_id()
+        self.sessions[session_id] = []
+        while len(self.sessions) > self.max_sessions:
+            evicted_id, _ = self.sessions.popitem(last=False)
+            self.summaries.pop(evicted_id, None)
+        return session_id
+
+    async def get_messages(self, session_id: str) -> List[dict]:
+        return list(self._session(session_id))
+
+    async def append_messages(self, session_id: str, messages: List[dict]):
+        self._session(session_id).extend(messages)
+
+    async def delete_session(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        self.summaries.pop(session_id, None)
+
+    async def get_summary(self, session_id: str) -> dict:
+        self._session(session_id)
+        return dict(self.summaries.get(session_id, {"summary": "", "summarized_count": 0}))
+
+    async def set_summary(self, session_id: str, summary: str, summarized_count: int):
+        self._session(session_id)
+        self.summaries[session_id] = {"summary": summary, "summarized_count": summarized_count}
+
+class SQLiteConversationStore(ConversationStore):
+    """Stockage SQLite, partagé entre workers et conservé après redémarrage.
+
+    Les sessions inactives depuis plus de `ttl_seconds` sont supprimées, ainsi
+    que les moins récemment utilisées au-delà de `max_sessions` ; la purge a
+    lieu à la création des sessions.
+    """
+
+    def __init__(self, db_path: str, max_sessions: int = 10000, ttl_seconds: float = 0):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS summaries (
+                    session_id TEXT PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+                    summary TEXT NOT NULL,
+                    summarized_count INTEGER NOT NULL
+                );
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Une connexion par thread (les appels passent par asyncio.to_thread)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _expiry(self) -> float:
+        """Dernière activité en deçà de laquelle une session est expirée"""
+        return time.time() - self.ttl_seconds if self.ttl_seconds else float("-inf")
+
+    def _check_session(self, conn: sqlite3.Connection, session_id: str):
+        row = conn.execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND updated_at >= ?", (session_id, self._expiry())
+        ).fetchone()
+        if row is None:
+            raise SessionNotFound(session_id)
+
+    def _purge(self, conn: sqlite3.Connection):
+        """Supprime les sessions expirées et les plus anciennes au-delà de max_sessions"""
+        conn.execute("DELETE FROM sessions WHERE updated_at < ?", (self._expiry(),))
+        conn.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def _create_session(self) -> str:
+        session_id = self._new_session_id()
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("INSERT INTO sessions (id, created_at, updated_at) VALUES (?, ?, ?)", (session_id, now, now))
+            self._purge(conn)
+        return session_id
+
+    def _get_messages(self, session_id: str) -> List[dict]:
+        conn = self._connection()
+        self._check_session(conn, session_id)
+        rows = conn.execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def _append_messages(self, session_id: str, messages: List[dict]):
+        with self._connection() as conn:
+            # Verrou d'écriture dès la lecture de MAX(seq) : deux ajouts concurrents
+            # sur la même session ne peuvent pas obtenir le même numéro
+            conn.execute("BEGIN IMMEDIATE")
+            self._check_session(conn, session_id)
+            (next_seq,) = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, next_seq + i, msg["role"], msg["content"]) for i, msg in enumerate(messages)]
+            )
+            conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (time.time(), session_id))
+
+    def _delete_session(self, session_id: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _get_summary(self, session_id: str) -> dict:
+        conn = self._connection()
+        self._check_session(conn, session_id)
+        row = conn.execute(
+            "SELECT summary, summarized_count FROM summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        summary, summarized_count = row if row else ("", 0)
+        return {"summary": summary, "summarized_count": summarized_count}
+
+    def _set_summary(self, session_id: str, summary: str, summarized_count: int):
+        with self._connection() as conn:
+            self._check_session(conn, session_id)
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (session_id, summary, summarized_count) VALUES (?, ?, ?)",
+                (session_id, summary, summarized_count)
+            )
+
+    async def create_session(self) -> str:
+        return await asyncio.to_thread(self._create_session)
+
+    async def get_messages(self, session_id: str) -> List[dict]:
+        return await asyncio.to_thread(self._get_messages, session_id)
+
+    async def append_messages(self, session_id: str, messages: List[dict]):
+        await asyncio.to_thread(self._append_messages, session_id, messages)
+
+    async def delete_session(self, session_id: str):
+        await asyncio.to_thread(self._delete_session, session_id)
+
+    async def get_summary(self, session_id: str) -> dict:
+        return await asyncio.to_thread(self._get_summary, session_id)
+
+    async def set_summary(self, session_id: str, summary: str, summarized_count: int):
+        await asyncio.to_thread(self._set_summary, session_id, summary, summarized_count)
+
+def create_conversation_store() -> ConversationStore:
+    """Instancie le stockage configuré (CONVERSATION_STORE)"""
+    if settings.CONVERSATION_STORE == "sqlite":
+        return SQLiteConversationStore(
+            settings.CONVERSATION_DB_PATH, settings.CONVERSATION_MAX_SESSIONS, settings.CONVERSATION_TTL
+        )
+    if settings.CONVERSATION_STORE == "memory":
+        return MemoryConversationStore(settings.CONVERSATION_MAX_SESSIONS)
+    raise ValueError(f"Stockage de conversation inconnu : {settings.CONVERSATION_STORE}")
+
+# Instance globale du stockage des conversations
+conversation_store = create_conversation_store()
@@ -0,0 +1,142 @@
+# app/services/embeddings.py
+import re
+import zlib
+import asyncio
+import numpy as np
+import google.generativeai as genai
+from abc import ABC, abstractmethod
+from typing import List
+from app.core.config import settings
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """Normalise les vecteurs (L2) pour que le produit scalaire soit un cosinus"""
+    vectors = np.asarray(vectors, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class Embedder(ABC):
+    """Interface commune des modèles d'embedding"""
+    name: str = "base"
+    dimension: int = 0
+    # Vecteurs porteurs de sens (synonymes, paraphrases), et pas seulement des termes du texte
+    semantic: bool = True
+
+    @abstractmethod
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Retourne une matrice (len(texts), dimension) de vecteurs normalisés"""
+
+    @abstractmethod
+    def embed_query(self, text: str) -> np.ndarray:
+        """Retourne un vecteur (1, dimension) normalisé pour une requête"""
+
+    async def embed_query_async(self, text: str) -> np.ndarray:
+        """Version asynchrone de embed_query (déportée dans un thread par défaut)"""
+        return await asyncio.to_thread(self.embed_query, text)
+
+class GeminiEmbedder(Embedder):
+    """Embeddings Gemini, envoyés par lots pour limiter les allers-retours API"""
+
+    def __init__(self, model_name: str, batch_size: int, dimension: int = 768):
+        self.name = model_name
+        self.dimension = dimension
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            result = genai.embed_content(
+                model=self.name,
+                content=batch,
+                task_type="retrieval_document"
+            )
+            vectors.extend(result['embedding'])
+        if not vectors:
+            return np.zeros((0, self.dimension), dtype='float32')
+        return l2_normalize(np.array(vectors))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        result = genai.embed_content(model=self.name, content=text, task_type="retrieval_query")
+        return l2_normalize(np.array([result['embedding']]))
+
+    async def embed_query_async(self, text: str) -> np.ndarray:
+        if settings.GEMINI_API_ENDPOINT:
+            # Le client asynchrone du SDK ne fonctionne pas en transport REST
+            return await asyncio.to_thread(self.embed_query, text)
+        result = await genai.embed_content_async(model=self.name, content=text, task_type="retrieval_query")
+        return l2_normalize(np.array([result['embedding']]))
+
+# Mots vides français ignorés par l'embedder local
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "d", "l", "et", "ou", "à", "au", "aux",
+    "en", "dans", "par", "pour", "sur", "avec", "sans", "ne", "pas", "que", "qui", "quoi",
+    "est", "sont", "ce", "cette", "ces", "se", "sa", "son", "ses", "il", "elle", "ils",
+    "elles", "y", "a", "peut", "être", "quel", "quelle", "quels", "quelles",
+}
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+class HashingEmbedder(Embedder):
+    """Embedder local et déterministe (TF sublinéaire haché), sans appel réseau.
+
+    Chaque terme et bigramme est projeté par hachage (CRC32) sur une dimension
+    fixe avec un signe, ce qui rend les vecteurs indépendants du corpus et donc
+    compatibles avec une indexation incrémentale.
+    """
+
+    semantic = False
+
+    def __init__(self, dimension: int = 384):
+        self.name = f"hashing-tf-{dimension}"
+        self.dimension = dimension
+
+    def _tokenize(self, text: str) -> List[str]:
+        return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype='float32')
+        tokens = self._tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dimension] += sign * (1.0 + np.log(count))
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype='float32')
+        return l2_normalize(np.stack([self._embed(text) for text in texts]))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return l2_normalize(self._embed(text)[np.newaxis, :])
+
+    async def embed_query_async(self, text: str) -> np.ndarray:
+        return self.embed_query(text)
+
+def hybrid_dense_weight(embedder: Embedder) -> float:
+    """Poids de FAISS dans la fusion RRF avec BM25 (HYBRID_DENSE_WEIGHT).
+
+    Par défaut, l'embedder haché est écarté (poids 0) : ses vecteurs ne
+    reflètent que les termes, que BM25 classe déjà mieux, et la fusion
+    dégrade le classement de BM25 au lieu de le compléter.
+    """
+    if settings.HYBRID_DENSE_WEIGHT:
+        return float(settings.HYBRID_DENSE_WEIGHT)
+    return 1.0 if embedder.semantic else 0.0
+
+def get_embedder() -> Embedder:
+    """Instancie l'embedder configuré (EMBEDDING_BACKEND)"""
+    backend = settings.EMBEDDING_BACKEND
+    if not backend:
+        backend = "gemini" if settings.is_gemini_configured else "hashing"
+
+    if backend == "gemini":
+        return GeminiEmbedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_BATCH_SIZE)
+    if backend == "hashing":
+        return HashingEmbedder(settings.EMBEDDING_DIMENSION)
+    raise ValueError(f"Backend d'embedding inconnu : {backend}")
@@ -0,0 +1,147 @@
+# app/services/gemini_client.py
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional
+import google.generativeai as genai
+from app.core.config import settings
+from app.services.resilience import get_resilience
+from app.services.rate_limiter import rate_scheduler
+from app.services.chunking import estimate_tokens
+from app.services.tracing import start_span
+
+NO_SDK_RETRY = {"retry": None}
+
+def configure_gemini(api_key: Optional[str]):
+    """Configure le SDK ; GEMINI_API_ENDPOINT redirige les appels (proxy, faux serveur Gemini local)"""
+    if settings.GEMINI_API_ENDPOINT:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=api_key)
+
+class GeminiClient:
+    """Client Gemini asynchrone partagé, avec une limite de concurrence par worker.
+
+    Les appels passent par la politique de résilience du modèle : nouvelles
+    tentatives avec backoff sur erreur transitoire, disjoncteur, et hedging
+    pour les générations simples.
+    """
+
+    def __init__(self, model_name: str, max_concurrency: Optional[int] = None):
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.max_concurrency = max_concurrency or settings.GEMINI_MAX_CONCURRENCY
+        self.resilience = get_resilience(model_name)
+        # Le client asynchrone du SDK ne fonctionne pas en transport REST : appels synchrones dans un thread
+        self.use_threads = bool(settings.GEMINI_API_ENDPOINT)
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Retourne le sémaphore lié à la boucle d'événements courante"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _call(self, call_async: Callable, call_sync: Callable, *args, **kwargs):
+        # Les nouvelles tentatives sont gérées ici (backoff, disjoncteur), pas par le SDK
+        kwargs["request_options"] = NO_SDK_RETRY
+        if self.use_threads:
+            return await asyncio.to_thread(call_sync, *args, **kwargs)
+        return await call_async(*args, **kwargs)
+
+    async def _iterate(self, response) -> AsyncIterator:
+        if not self.use_threads:
+            async for chunk in response:
+                yield chunk
+            return
+        chunks: Iterable = iter(response)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                return
+            yield chunk
+
+    async def _admit(self, tokens: int):
+        """Attend son tour sur le quota partagé (RPM/TPM) selon la priorité de la requête"""
+        if not rate_scheduler.enabled:
+            return
+        with start_span("gemini.rate_limit", {"gemini.prompt_tokens": tokens}):
+            await rate_scheduler.acquire(tokens)
+
+    async def _admit_now(self, tokens: int) -> bool:
+        """Admission sans attente, pour les requêtes couvertes (hedging)"""
+        return await rate_scheduler.try_acquire(tokens)
+
+    def _chat_tokens(self, chat: genai.ChatSession, message: str) -> int:
+        history = sum(estimate_tokens(part.text) for content in chat.history for part in content.parts)
+        return history + estimate_tokens(message)
+
+    async def _generate_once(self, prompt: str) -> str:
+        async with self._get_semaphore():
+            response = await self._call(self.model.generate_content_async, self.model.generate_content, prompt)
+        return response.text
+
+    async def generate(self, prompt: str) -> str:
+        """Génère une réponse sans bloquer la boucle d'événements"""
+        tokens = estimate_tokens(prompt)
+        return await self.resilience.call(
+            lambda: self._generate_once(prompt), hedge=True,
+            admit=lambda: self._admit(tokens), admit_hedge=lambda: self._admit_now(tokens)
+        )
+
+    async def _stream_with_retries(self, open_stream: Callable, tokens: int) -> AsyncIterator[str]:
+        """Relaie un flux ; les nouvelles tentatives ne couvrent que l'ouverture et le premier fragment"""
+        async with self._get_semaphore():
+            async def first_chunk():
+                response = await open_stream()
+                chunks = self._iterate(response).__aiter__()
+                try:
+                    return chunks, await chunks.__anext__()
+                except StopAsyncIteration:
+                    return chunks, None
+
+            chunks, chunk = await self.resilience.call(first_chunk, admit=lambda: self._admit(tokens))
+            while chunk is not None:
+                # Le dernier fragment peut ne porter que la raison d'arrêt
+                if chunk.parts:
+                    yield chunk.text
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Transmet les fragments de texte au fur et à mesure de leur génération"""
+        async for text in self._stream_with_retries(
+            lambda: self._call(self.model.generate_content_async, self.model.generate_content, prompt, stream=True),
+            estimate_tokens(prompt)
+        ):
+            yield text
+
+    async def send_chat(self, chat: genai.ChatSession, message: str) -> str:
+        """Envoie un message dans une session de chat Gemini"""
+        async def attempt():
+            async with self._get_semaphore():
+                return await self._call(chat.send_message_async, chat.send_message, message)
+        tokens = self._chat_tokens(chat, message)
+        # Pas de hedging : deux envois concurrents modifieraient la même session
+        response = await self.resilience.call(attempt, admit=lambda: self._admit(tokens))
+        return response.text
+
+    async def stream_chat(self, chat: genai.ChatSession, message: str) -> AsyncIterator[str]:
+        """Envoie un message dans une session de chat et relaie la réponse en streaming"""
+        async for text in self._stream_with_retries(
+            lambda: self._call(chat.send_message_async, chat.send_message, message, stream=True),
+            self._chat_tokens(chat, message)
+        ):
+            yield text
+
+_clients: Dict[str, GeminiClient] = {}
+
+def get_gemini_client(model_name: str) -> GeminiClient:
+    """Retourne le client partagé pour un modèle donné"""
+    if model_name not in _clients:
+        _clients[model_name] = GeminiClient(model_name)
+    return _clients[model_name]
@@ -0,0 +1,470 @@
+# app/services/index_store.py
+import os
+import json
+import time
+import numpy as np
+import faiss
+from typing import Iterable, List, Optional, Tuple
+from app.services.embeddings import Embedder
+from app.services.chunking import LegalChunker
+from app.services.ann_index import (
+    HNSW_MAX_DELETED_FRACTION, choose_index_type, create_index, export_vectors, index_ids, rebuild_index,
+    remove_ids, supports_removal, train_index,
+)
+from app.services.chunk_store import ChunkStore, open_append
+from app.services.sparse_index import SPARSE_FILE, SparseIndex
+from app.services.ingestion import POOL_MIN_FILES, IngestProgress, bounded_map, discover_files, parse_file, pool_size
+
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+# Vecteurs ajoutés depuis la dernière écriture de l'index FAISS (journal des points de reprise)
+VECTOR_LOG_FILE = "vectors.log"
+# Formats précédents, repris au chargement puis supprimés à la sauvegarde suivante
+LEGACY_DOCUMENTS_FILE = "documents.json"
+LEGACY_SPARSE_FILE = "sparse.json"
+
+def _write_atomic(path: str, write):
+    """Écrit dans un fichier temporaire puis le renomme, pour ne jamais laisser un index à moitié écrit"""
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+class IndexStore:
+    """Index FAISS persisté sur disque, mis à jour de façon incrémentale.
+
+    Le répertoire d'index contient l'index FAISS (ids stables), les métadonnées
+    des morceaux (ChunkStore, mappées en mémoire) et un manifeste des fichiers
+    sources (taille, date de modification, hash SHA-256, ids FAISS associés,
+    génération des métadonnées). Le type d'index (flat, hnsw, ivf_flat, ivf_pq
+    ou auto selon le nombre de vecteurs) est enregistré
+    dans le manifeste ; l'index est migré quand le type visé change. L'index
+    BM25 des mêmes morceaux (mêmes ids) est tenu à jour en parallèle.
+
+    L'ingestion est en flux : lecture et découpage dans un pool de processus
+    derrière une file bornée, puis embedding et ajout par lots, avec des points
+    de reprise réguliers. Un point de reprise ne réécrit pas l'index : les
+    vecteurs ajoutés depuis la dernière écriture complète sont journalisés
+    (VECTOR_LOG_FILE), les métadonnées ajoutées en fin de fichiers, et seul le
+    manifeste est réécrit. À la reprise, le journal est rejoué sur l'index et
+    l'index BM25 complété à partir des morceaux. L'index FAISS et l'index BM25
+    ne sont écrits en entier qu'en fin de synchronisation.
+
+    Un index HNSW ne pouvant retirer de vecteur, les ids supprimés sont listés
+    dans le manifeste (deleted_ids) et écartés à la recherche ; le graphe est
+    reconstruit quand ils dépassent HNSW_MAX_DELETED_FRACTION de l'index.
+    """
+
+    def __init__(self, index_dir: str, embedder: Embedder, chunker: LegalChunker,
+                 index_type: str = "auto", hnsw_m: int = 32, bm25_k1: float = 1.2, bm25_b: float = 0.75,
+                 workers: int = 0, queue_size: int = 64, batch_size: int = 100,
+                 checkpoint_seconds: float = 60.0, progress_seconds: float = 10.0, extraction_cache_dir: str = ""):
+        self.index_dir = index_dir
+        self.embedder = embedder
+        self.chunker = chunker
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.bm25_k1 = bm25_k1
+        self.bm25_b = bm25_b
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.checkpoint_seconds = checkpoint_seconds
+        self.progress_seconds = progress_seconds
+        self.extraction_cache_dir = extraction_cache_dir
+        self.index = None
+        self.sparse = SparseIndex(bm25_k1, bm25_b)
+        self.documents = ChunkStore(index_dir)
+        self.manifest = self._empty_manifest()
+        self._manifest_dirty = False
+        self._vector_log = None
+        self._vector_log_count = 0
+        # Index FAISS présent sur disque et cohérent avec le manifeste (sinon, le journal n'a pas de base)
+        self._index_saved = False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _empty_manifest(self) -> dict:
+        return {
+            "embedder": self.embedder.name,
+            "dimension": self.embedder.dimension,
+            "chunker": self.chunker.name,
+            "index_type": None,
+            "next_id": 0,
+            "files": {}
+        }
+
+    def _target_type(self, n_vectors: int) -> str:
+        if self.index_type == "auto":
+            return choose_index_type(n_vectors)
+        return self.index_type
+
+    def _vector_count(self) -> int:
+        return sum(len(entry["ids"]) for entry in self.manifest["files"].values())
+
+    @property
+    def deleted_ids(self) -> List[int]:
+        """Ids encore présents dans l'index mais supprimés, à écarter à la recherche"""
+        return self.manifest.get("deleted_ids", [])
+
+    def _indexed_count(self) -> int:
+        return self._vector_count() + len(self.deleted_ids)
+
+    def _add_vectors(self, vectors: np.ndarray, ids: np.ndarray):
+        """Ajoute des vecteurs, en créant et entraînant l'index au premier ajout"""
+        if self.index is None:
+            index_type = self._target_type(len(vectors))
+            if index_type.startswith("ivf"):
+                # Ajout par lots : l'index IVF est entraîné à la fin, sur tout le corpus, par migration
+                index_type = "flat"
+            self.index = create_index(index_type, self.embedder.dimension, len(vectors), self.hnsw_m)
+            self.manifest["index_type"] = index_type
+        train_index(self.index, vectors)
+        self.index.add_with_ids(vectors, ids)
+        self._log_vectors(vectors, ids)
+
+    def _log_dtype(self) -> np.dtype:
+        return np.dtype([('id', '<i8'), ('vector', '<f4', (self.embedder.dimension,))])
+
+    def _log_vectors(self, vectors: np.ndarray, ids: np.ndarray):
+        """Journalise des vecteurs ajoutés ; ils ne comptent qu'une fois le manifeste écrit"""
+        if self._vector_log is None:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._vector_log = open_append(self._path(VECTOR_LOG_FILE), self._vector_log_count * self._log_dtype().itemsize)
+        records = np.empty(len(ids), dtype=self._log_dtype())
+        records['id'] = ids
+        records['vector'] = vectors
+        self._vector_log.write(records.tobytes())
+        self._vector_log_count += len(ids)
+
+    def _replay_log(self):
+        """Ajoute à l'index chargé les vecteurs journalisés depuis sa dernière écriture"""
+        self._vector_log_count = self.manifest.get("vector_log", 0)
+        if not self._vector_log_count:
+            return
+        records = np.fromfile(self._path(VECTOR_LOG_FILE), dtype=self._log_dtype(), count=self._vector_log_count)
+        # Arrêt entre l'écriture de l'index et celle du manifeste : l'index contient déjà une partie du journal
+        records = records[~np.isin(records['id'], index_ids(self.index))]
+        if len(records):
+            self.index.add_with_ids(np.ascontiguousarray(records['vector']), np.ascontiguousarray(records['id']))
+        print(f"Reprise : {len(records)} vecteur(s) rejoué(s) depuis le journal")
+
+    def _reset_log(self):
+        if self._vector_log is not None:
+            self._vector_log.close()
+            self._vector_log = None
+        self._vector_log_count = 0
+        if os.path.exists(self._path(VECTOR_LOG_FILE)):
+            os.remove(self._path(VECTOR_LOG_FILE))
+
+    def _migrate_if_needed(self):
+        """Reconstruit l'index sous le type visé (config ou taille du corpus) s'il a changé"""
+        current_type = self.manifest.get("index_type") or "flat"
+        target_type = self._target_type(self.index.ntotal - len(self.deleted_ids))
+        if target_type == current_type:
+            return
+        print(f"Migration de l'index {current_type} -> {target_type} ({self.index.ntotal} vecteurs)")
+        ids, vectors = export_vectors(self.index)
+        live = ~np.isin(ids, self.deleted_ids)
+        self.index = rebuild_index(target_type, self.embedder.dimension, ids[live], vectors[live], self.hnsw_m)
+        self.manifest["index_type"] = target_type
+        self.manifest["deleted_ids"] = []
+
+    def _load_manifest(self) -> dict:
+        """Charge le manifeste, ou un manifeste vide s'il est absent ou produit par un autre embedder"""
+        try:
+            with open(self._path(MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return self._empty_manifest()
+
+        if (manifest.get("embedder") != self.embedder.name
+                or manifest.get("dimension") != self.embedder.dimension
+                or manifest.get("chunker") != self.chunker.name
+                or not os.path.exists(self._path(INDEX_FILE))):
+            print("Index existant incompatible avec l'embedder ou le découpage courant, reconstruction complète")
+            return self._empty_manifest()
+        return manifest
+
+    def _load_index(self, read_only: bool):
+        """Charge l'index FAISS, en mémoire mappée s'il n'a pas à être modifié"""
+        path = self._path(INDEX_FILE)
+        if read_only:
+            try:
+                return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                pass
+        return faiss.read_index(path)
+
+    def _load_documents(self) -> bool:
+        """Mappe les métadonnées des morceaux ; un index à l'ancien format (documents.json)
+        est converti. Renvoie True s'il reste à sauvegarder."""
+        state = self.manifest.get("chunks")
+        if state:
+            self.documents = ChunkStore.load(self.index_dir, state)
+            return False
+        with open(self._path(LEGACY_DOCUMENTS_FILE), 'r', encoding='utf-8') as f:
+            documents = {int(doc_id): doc for doc_id, doc in json.load(f).items()}
+        self.documents = ChunkStore.from_documents(self.index_dir, documents)
+        print("Métadonnées des morceaux converties au format colonnes")
+        return True
+
+    def _load_sparse(self) -> bool:
+        """Charge l'index BM25 ; s'il manque ou date d'une autre version, il est reconstruit
+        à partir des morceaux (sans appel d'embedding). S'il précède les derniers points de
+        reprise, seuls les morceaux ajoutés ou retirés depuis sont repris. Renvoie True s'il
+        a été modifié."""
+        try:
+            self.sparse = SparseIndex.load(self._path(SPARSE_FILE), self.bm25_k1, self.bm25_b)
+        except (OSError, ValueError, KeyError):
+            print("Index BM25 absent ou incompatible, reconstruction à partir des morceaux")
+            self.sparse = SparseIndex(self.bm25_k1, self.bm25_b)
+            self.sparse.add_documents(self.documents)
+            return True
+        doc_ids, sparse_ids = self.documents.ids(), self.sparse.doc_ids()
+        missing, extra = np.setdiff1d(doc_ids, sparse_ids), np.setdiff1d(sparse_ids, doc_ids)
+        if not len(missing) and not len(extra):
+            return False
+        print(f"Index BM25 complété : {len(missing)} morceau(x) ajouté(s), {len(extra)} retiré(s)")
+        self.sparse.remove_ids(extra.tolist())
+        for doc_id in missing.tolist():
+            self.sparse.add(doc_id, self.documents[doc_id]['content'])
+        return True
+
+    def _scan(self, data_folder: str, paths: Iterable[str]) -> Tuple[List[tuple], List[str]]:
+        """Compare les fichiers présents au manifeste par taille et date de modification.
+
+        Renvoie les fichiers à relire (nouveaux ou modifiés, vérifiés ensuite par
+        hash) et les clés des fichiers supprimés. Seuls les chemins sont gardés
+        en mémoire, pas les contenus.
+        """
+        known = self.manifest["files"]
+        seen = set()
+        to_parse = []
+        for path in paths:
+            key = os.path.relpath(path, data_folder)
+            seen.add(key)
+            stat = os.stat(path)
+            entry = known.get(key)
+            # Taille et date identiques : on évite de relire le fichier
+            if not (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns):
+                to_parse.append((key, path, stat))
+        removed = [key for key in known if key not in seen]
+        return to_parse, removed
+
+    def _remove_stale(self, stale_ids: List[int]):
+        """Retire des morceaux de l'index FAISS, des métadonnées et de l'index BM25, en un seul passage"""
+        if not stale_ids or self.index is None:
+            return
+        current_type = self.manifest.get("index_type") or "flat"
+        if supports_removal(current_type):
+            self.index = remove_ids(self.index, current_type, np.array(stale_ids, dtype='int64'), self.hnsw_m)
+        else:
+            deleted = np.union1d(self.deleted_ids, stale_ids).astype('int64')
+            if len(deleted) > HNSW_MAX_DELETED_FRACTION * self.index.ntotal:
+                print(f"Reconstruction de l'index {current_type} sans {len(deleted)} vecteur(s) supprimé(s)")
+                self.index = remove_ids(self.index, current_type, deleted, self.hnsw_m)
+                deleted = deleted[:0]
+            self.manifest["deleted_ids"] = deleted.tolist()
+        for doc_id in stale_ids:
+            self.documents.pop(doc_id, None)
+        self.sparse.remove_ids(stale_ids)
+
+    def _repair(self):
+        """Retire les vecteurs ajoutés après le dernier point de reprise d'une ingestion interrompue.
+
+        Le manifeste est écrit en dernier : des ids présents dans l'index FAISS
+        mais absents du manifeste proviennent d'un arrêt pendant la sauvegarde.
+        """
+        if self.index.ntotal == self._indexed_count():
+            return
+        ids = index_ids(self.index)
+        known = np.array([doc_id for entry in self.manifest["files"].values() for doc_id in entry["ids"]]
+                         + self.deleted_ids, dtype='int64')
+        orphans = ids[~np.isin(ids, known)]
+        if len(ids):
+            self.manifest["next_id"] = max(self.manifest["next_id"], int(ids.max()) + 1)
+        if len(orphans):
+            print(f"Reprise : {len(orphans)} vecteur(s) d'une ingestion interrompue retiré(s)")
+            self._remove_stale([int(doc_id) for doc_id in orphans])
+
+    def _ingest(self, to_parse: List[tuple], progress: IngestProgress) -> int:
+        """Lecture et découpage en parallèle, puis embedding et ajout à l'index par lots.
+
+        Un fichier n'entre au manifeste qu'une fois tous ses morceaux indexés ;
+        l'état est sauvegardé périodiquement, si bien qu'une ingestion
+        interrompue reprend au dernier point de reprise. Renvoie le nombre de
+        fichiers (ré)indexés.
+        """
+        stat_by_key = {key: stat for key, _, stat in to_parse}
+        pending_docs, pending_files, stale_ids = [], [], []
+        last_checkpoint = time.perf_counter()
+        indexed = 0
+
+        def flush():
+            nonlocal last_checkpoint, indexed
+            self._remove_stale(stale_ids)
+            if pending_docs:
+                vectors = self.embedder.embed_documents([entry['content'] for _, entry in pending_docs])
+                self._add_vectors(vectors, np.array([doc_id for doc_id, _ in pending_docs], dtype='int64'))
+                for doc_id, entry in pending_docs:
+                    self.documents[doc_id] = entry
+                    self.sparse.add(doc_id, entry['content'])
+            for key, entry in pending_files:
+                self.manifest["files"][key] = entry
+            indexed += len(pending_files)
+            progress.add(files=len(pending_files), chunks=len(pending_docs))
+            pending_docs.clear()
+            pending_files.clear()
+            stale_ids.clear()
+            if time.perf_counter() - last_checkpoint >= self.checkpoint_seconds:
+                self._checkpoint()
+                last_checkpoint = time.perf_counter()
+
+        items = ((path, key, self.chunker, self.extraction_cache_dir) for key, path, _ in to_parse)
+        workers = pool_size(self.workers, len(to_parse))
+        for result in bounded_map(parse_file, items, workers, self.queue_size):
+            key = result["key"]
+            stat = stat_by_key.pop(key)
+            if "error" in result:
+                print(f"Erreur lors de la lecture de {key}: {result['error']}")
+                progress.add(errors=1)
+                continue
+
+            entry = self.manifest["files"].get(key)
+            if entry and entry["sha256"] == result["sha256"]:
+                # Fichier touché mais inchangé : rien à ré-embedder
+                entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                self._manifest_dirty = True
+                progress.add(files=1)
+                continue
+
+            if entry:
+                stale_ids.extend(entry["ids"])
+            ids = []
+            for chunk in result["chunks"]:
+                doc_id = self.manifest["next_id"]
+                self.manifest["next_id"] += 1
+                ids.append(doc_id)
+                pending_docs.append((doc_id, chunk))
+            pending_files.append((key, {
+                "sha256": result["sha256"],
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "ids": ids
+            }))
+            if len(pending_docs) >= self.batch_size:
+                flush()
+        flush()
+        return indexed
+
+    def sync(self, data_folder: str, paths: Optional[Iterable[str]] = None) -> dict:
+        """Met l'index à jour par rapport aux fichiers sources et le persiste.
+
+        Seuls les fichiers ajoutés, modifiés ou supprimés sont ré-embeddés ;
+        si rien n'a changé, l'index est simplement mappé en mémoire. Par
+        défaut, les fichiers sont découverts dans `data_folder` et ses
+        sous-dossiers.
+        """
+        self.manifest = self._load_manifest()
+        if paths is None:
+            paths = discover_files(data_folder)
+        to_parse, removed = self._scan(data_folder, paths)
+
+        current_type = self.manifest.get("index_type") or "flat"
+        unchanged = (not to_parse and not removed and not self.manifest.get("vector_log")
+                     and self._target_type(self._vector_count()) == current_type)
+        if self.manifest["files"] and unchanged:
+            self.index = self._load_index(read_only=True)
+            if self.index.ntotal == self._indexed_count():
+                if self._load_documents():
+                    self._save_documents()
+                if self._load_sparse():
+                    self._save_sparse()
+                if self._manifest_dirty:
+                    self._save_manifest()
+                    self._cleanup()
+                return {"added_or_changed": 0, "removed": 0}
+
+        if self.manifest["files"]:
+            self.index = self._load_index(read_only=False)
+            self._index_saved = True
+            self._replay_log()
+            self._load_documents()
+            self._load_sparse()
+            self._repair()
+        else:
+            self.index = None
+            self.manifest["deleted_ids"] = []
+            self._index_saved = False
+            self._vector_log_count = 0
+            self.documents = ChunkStore(self.index_dir, self.manifest.get("chunks", {}).get("generation", 0))
+            self.sparse = SparseIndex(self.bm25_k1, self.bm25_b)
+
+        # Retirer les entrées des fichiers supprimés
+        stale_ids = []
+        for key in removed:
+            stale_ids.extend(self.manifest["files"].pop(key)["ids"])
+        self._remove_stale(stale_ids)
+
+        progress = IngestProgress(len(to_parse), self.progress_seconds)
+        indexed = self._ingest(to_parse, progress)
+        if len(to_parse) >= POOL_MIN_FILES:
+            progress.report()
+
+        if self.index is None:
+            self.index = create_index("flat", self.embedder.dimension, 0)
+            self.manifest["index_type"] = "flat"
+        else:
+            self._migrate_if_needed()
+
+        self.save()
+        return {"added_or_changed": indexed, "removed": len(removed), **progress.summary()}
+
+    def _save_manifest(self):
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f)
+        _write_atomic(self._path(MANIFEST_FILE), write)
+        self._manifest_dirty = False
+
+    def _save_sparse(self):
+        _write_atomic(self._path(SPARSE_FILE), self.sparse.save)
+
+    def _save_documents(self):
+        """Nouvelle génération des métadonnées ; elle n'est visible qu'une fois le manifeste écrit"""
+        self.manifest["chunks"] = self.documents.save()
+        self._manifest_dirty = True
+
+    def _cleanup(self):
+        """Supprime les générations de métadonnées et fichiers d'anciens formats devenus inutiles"""
+        if self.manifest.get("chunks"):
+            ChunkStore.cleanup(self.index_dir, self.manifest["chunks"])
+        for name in (LEGACY_DOCUMENTS_FILE, LEGACY_SPARSE_FILE):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def _checkpoint(self):
+        """Point de reprise en cours d'ingestion, en temps proportionnel aux ajouts depuis le précédent"""
+        if not self._index_saved:
+            # Pas encore d'index de base sur lequel rejouer le journal
+            self.save()
+            return
+        if self._vector_log is not None:
+            self._vector_log.flush()
+        self._save_documents()
+        self.manifest["vector_log"] = self._vector_log_count
+        self._save_manifest()
+        self._cleanup()
+
+    def save(self):
+        """Persiste l'index, les métadonnées, l'index BM25 puis le manifeste (écrit en dernier)"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        _write_atomic(self._path(INDEX_FILE), lambda path: faiss.write_index(self.index, path))
+        self._save_documents()
+        self._save_sparse()
+        self.manifest["vector_log"] = 0
+        self._save_manifest()
+        self._reset_log()
+        self._index_saved = True
+        self._cleanup()
@@ -0,0 +1,112 @@
+# app/services/ingestion.py
+import os
+import re
+import time
+import hashlib
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+from app.services.chunking import LegalChunker
+from app.services.loaders import ExtractionCache, extract_text, supported_extensions
+
+# En dessous, le démarrage du pool de processus coûte plus qu'il ne rapporte
+POOL_MIN_FILES = 16
+
+# Caractères de contrôle hors tabulation et fins de ligne
+CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0e-\x1f\x7f]")
+
+def discover_files(data_folder: str, extensions: Optional[Tuple[str, ...]] = None) -> Iterator[str]:
+    """Fichiers sources du dossier et de ses sous-dossiers (formats ayant un loader),
+    dans un ordre stable, sans lister le corpus d'un coup"""
+    extensions = extensions or supported_extensions()
+    for root, dirs, files in os.walk(data_folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.lower().endswith(extensions) and not name.startswith("."):
+                yield os.path.join(root, name)
+
+def normalize_text(text: str) -> str:
+    """Fins de ligne Unix, Unicode composé (NFC), sans BOM ni caractères de contrôle ; sauts de page -> paragraphes"""
+    text = text.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n").replace("\x0c", "\n\n")
+    return CONTROL_CHARS.sub("", unicodedata.normalize("NFC", text))
+
+def parse_file(path: str, key: str, chunker: LegalChunker, cache_dir: str = "") -> dict:
+    """Lecture, hash, extraction du texte, normalisation et découpage d'un fichier
+    (exécuté dans un processus du pool)"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        sha256 = hashlib.sha256(raw).hexdigest()
+        text = extract_text(path, raw, sha256, ExtractionCache(cache_dir) if cache_dir else None)
+        chunks = chunker.split(normalize_text(text))
+        for chunk in chunks:
+            chunk['filename'] = key
+        return {"key": key, "sha256": sha256, "chunks": chunks}
+    except Exception as e:
+        return {"key": key, "error": f"{type(e).__name__}: {e}"}
+
+def bounded_map(func: Callable, items: Iterable[tuple], workers: int, window: int) -> Iterator:
+    """Applique `func(*item)` dans un pool de processus, avec au plus `window` tâches en vol.
+
+    La file bornée entre lecture et embedding garde la mémoire constante quelle
+    que soit la taille du corpus ; les résultats sont rendus dans l'ordre des
+    entrées. Avec `workers` à 0, tout s'exécute dans le processus courant.
+    """
+    if workers <= 0:
+        for item in items:
+            yield func(*item)
+        return
+
+    executor = None
+    pending = deque()
+    try:
+        for item in items:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers)
+            pending.append(executor.submit(func, *item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        if executor is not None:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+class IngestProgress:
+    """Compteurs d'ingestion, affichés périodiquement avec le débit"""
+
+    def __init__(self, total_files: int, interval: float):
+        self.total_files = total_files
+        self.interval = interval
+        self.start = self.last_report = time.perf_counter()
+        self.counts = {"files": 0, "chunks": 0, "errors": 0}
+
+    def add(self, files: int = 0, chunks: int = 0, errors: int = 0):
+        self.counts["files"] += files
+        self.counts["chunks"] += chunks
+        self.counts["errors"] += errors
+        now = time.perf_counter()
+        if self.interval and now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        return {
+            **self.counts,
+            "seconds": round(elapsed, 2),
+            "files_per_s": round(self.counts["files"] / elapsed, 1) if elapsed else 0.0,
+            "chunks_per_s": round(self.counts["chunks"] / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def report(self):
+        stats = self.summary()
+        print(f"Ingestion : {stats['files']}/{self.total_files} fichier(s), {stats['chunks']} morceau(x), "
+              f"{stats['errors']} erreur(s) — {stats['files_per_s']} fichiers/s, {stats['chunks_per_s']} morceaux/s")
+
+def pool_size(workers: int, n_files: int) -> int:
+    """Processus à utiliser : aucun pour quelques fichiers (0 = lecture dans le processus courant)"""
+    return workers if n_files >= POOL_MIN_FILES else 0
@@ -0,0 +1,442 @@
+# app/services/jobs.py
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import ipaddress
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from app.core.config import settings
+from app.services.tracing import set_attributes, start_span
+
+# États d'une tâche : queued -> running -> succeeded | failed
+FINISHED_STATUSES = ("succeeded", "failed")
+
+JobHandler = Callable[[dict], Awaitable[str]]
+
+class JobNotFound(Exception):
+    """Tâche inconnue ou expirée"""
+
+class InvalidCallbackURL(ValueError):
+    """URL de rappel refusée (schéma, hôte interne ou hors liste autorisée)"""
+
+def _allowed_hosts() -> List[str]:
+    return [host.strip().lower() for host in settings.JOB_CALLBACK_ALLOWED_HOSTS.split(",") if host.strip()]
+
+def validate_callback_url(url: str) -> str:
+    """Vérifie une URL de rappel fournie par le client, contre les requêtes vers le réseau interne (SSRF).
+
+    Seuls http et https sont acceptés. Si JOB_CALLBACK_ALLOWED_HOSTS est
+    renseigné, l'hôte doit y figurer (ou en être un sous-domaine) ; sinon,
+    toutes ses adresses doivent être publiques (ni loopback, ni privées, ni
+    lien local). Vérifiée à la soumission puis de nouveau avant l'envoi.
+    """
+    _validated_address(url)
+    return url
+
+def _validated_address(url: str) -> Optional[str]:
+    """Adresse IP vérifiée à laquelle envoyer le rappel, ou None pour un hôte de la liste autorisée.
+
+    L'envoi se connecte à cette adresse sans nouvelle résolution : un hôte
+    dont le DNS change entre-temps (DNS rebinding) ne peut pas rediriger le
+    rappel vers une adresse interne.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https"):
+        raise InvalidCallbackURL("L'URL de rappel doit être en http ou https")
+    host = (parsed.hostname or "").lower()
+    if not host:
+        raise InvalidCallbackURL("L'URL de rappel n'a pas d'hôte")
+
+    allowed = _allowed_hosts()
+    if allowed:
+        if not any(host == entry or host.endswith("." + entry) for entry in allowed):
+            raise InvalidCallbackURL(f"Hôte de rappel non autorisé : {host}")
+        return None
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise InvalidCallbackURL(f"Hôte de rappel introuvable : {host}")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+            raise InvalidCallbackURL(f"Hôte de rappel interne refusé : {host}")
+    return sorted(addresses)[0]
+
+def _new_job(kind: str, payload: dict, callback_url: Optional[str]) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": "queued",
+        "payload": payload,
+        "result": None,
+        "error": None,
+        "callback_url": callback_url,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "attempts": 0,
+    }
+
+# Erreur des tâches abandonnées trop de fois par des workers arrêtés en cours d'exécution
+ABANDONED_ERROR = "Tâche abandonnée par des workers interrompus"
+
+class JobStore(ABC):
+    """Tâches de génération et leurs résultats"""
+
+    @abstractmethod
+    async def create_job(self, kind: str, payload: dict, callback_url: Optional[str] = None) -> dict:
+        """Enregistre une tâche en attente et la retourne"""
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> dict:
+        """Tâche et son résultat ; JobNotFound si elle est inconnue ou expirée"""
+
+    @abstractmethod
+    async def claim_next(self, kinds: List[str]) -> Optional[dict]:
+        """Passe la plus ancienne tâche en attente à l'état running et la retourne.
+
+        Une tâche running depuis plus que le bail (`lease`) est considérée
+        comme abandonnée par un worker arrêté et peut être reprise ; au-delà
+        de `max_attempts` réservations, elle passe en échec.
+        """
+
+    @abstractmethod
+    async def finish_job(self, job_id: str, result: Optional[str] = None, error: Optional[str] = None):
+        """Enregistre le résultat (ou l'erreur) d'une tâche et la passe à l'état final"""
+
+class MemoryJobStore(JobStore):
+    """Stockage en mémoire : les workers doivent tourner dans le processus du serveur"""
+
+    def __init__(self, max_jobs: int = 10000, result_ttl: float = 86400, lease: float = 660, max_attempts: int = 3):
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()
+
+    def _purge(self):
+        expired_before = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job["finished_at"] and job["finished_at"] < expired_before]:
+            del self.jobs[job_id]
+        # Au-delà de la limite, on oublie d'abord les tâches terminées les plus anciennes
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    async def create_job(self, kind: str, payload: dict, callback_url: Optional[str] = None) -> dict:
+        self._purge()
+        job = _new_job(kind, payload, callback_url)
+        self.jobs[job["id"]] = job
+        return dict(job)
+
+    async def get_job(self, job_id: str) -> dict:
+        if job_id not in self.jobs:
+            raise JobNotFound(job_id)
+        return dict(self.jobs[job_id])
+
+    async def claim_next(self, kinds: List[str]) -> Optional[dict]:
+        now = time.time()
+        for job in self.jobs.values():
+            if job["kind"] not in kinds:
+                continue
+            expired = job["status"] == "running" and job["started_at"] < now - self.lease
+            if expired and job["attempts"] >= self.max_attempts:
+                job.update(status="failed", error=ABANDONED_ERROR, finished_at=now)
+            elif job["status"] == "queued" or expired:
+                job.update(status="running", started_at=now, attempts=job["attempts"] + 1)
+                return dict(job)
+        return None
+
+    async def finish_job(self, job_id: str, result: Optional[str] = None, error: Optional[str] = None):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.update(
+                status="failed" if error is not None else "succeeded",
+                result=result, error=error, finished_at=time.time()
+            )
+
+class SQLiteJobStore(JobStore):
+    """Stockage SQLite, partagé entre le serveur et des processus workers séparés"""
+
+    COLUMNS = ("id", "kind", "status", "payload", "result", "error", "callback_url",
+               "created_at", "started_at", "finished_at", "attempts")
+
+    def __init__(self, db_path: str, result_ttl: float = 86400, lease: float = 660, max_attempts: int = 3):
+        self.db_path = db_path
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    callback_url TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at);
+            """)
+            # Base créée avant l'ajout du compteur de réservations
+            if "attempts" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Une connexion par thread (les appels passent par asyncio.to_thread)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(zip(self.COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _create_job(self, kind: str, payload: dict, callback_url: Optional[str]) -> dict:
+        job = _new_job(kind, payload, callback_url)
+        conn = self._connection()
+        conn.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - self.result_ttl,))
+        conn.execute(
+            f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+            tuple(json.dumps(job[col], ensure_ascii=False) if col == "payload" else job[col] for col in self.COLUMNS)
+        )
+        return job
+
+    def _get_job(self, job_id: str) -> dict:
+        row = self._connection().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            raise JobNotFound(job_id)
+        return self._row_to_job(row)
+
+    def _claim_next(self, kinds: List[str]) -> Optional[dict]:
+        conn = self._connection()
+        # BEGIN IMMEDIATE : un seul processus à la fois peut réserver une tâche
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            kind_filter = f"kind IN ({', '.join('?' * len(kinds))})"
+            # Bail expiré : le worker qui tenait la tâche s'est arrêté sans la terminer
+            conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE status = 'running' "
+                f"AND started_at < ? AND attempts >= ? AND {kind_filter}",
+                (ABANDONED_ERROR, now, now - self.lease, self.max_attempts, *kinds)
+            )
+            row = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE (status = 'queued' "
+                f"OR (status = 'running' AND started_at < ?)) AND {kind_filter} ORDER BY created_at LIMIT 1",
+                (now - self.lease, *kinds)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job = self._row_to_job(row)
+            job.update(status="running", started_at=now, attempts=job["attempts"] + 1)
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ?, attempts = ? WHERE id = ?",
+                         (now, job["attempts"], job["id"]))
+            conn.execute("COMMIT")
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _finish_job(self, job_id: str, result: Optional[str], error: Optional[str]):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            ("failed" if error is not None else "succeeded", result, error, time.time(), job_id)
+        )
+
+    async def create_job(self, kind: str, payload: dict, callback_url: Optional[str] = None) -> dict:
+        return await asyncio.to_thread(self._create_job, kind, payload, callback_url)
+
+    async def get_job(self, job_id: str) -> dict:
+        return await asyncio.to_thread(self._get_job, job_id)
+
+    async def claim_next(self, kinds: List[str]) -> Optional[dict]:
+        return await asyncio.to_thread(self._claim_next, kinds)
+
+    async def finish_job(self, job_id: str, result: Optional[str] = None, error: Optional[str] = None):
+        await asyncio.to_thread(self._finish_job, job_id, result, error)
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Une redirection pourrait mener le rappel vers un hôte interne : elle est traitée comme une erreur"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def _pinned(connection_class, address: Optional[str]):
+    """Connexions HTTP(S) vers `address` ; l'en-tête Host et le SNI / certificat TLS gardent le nom d'hôte"""
+    def connect(host: str, **kwargs):
+        connection = connection_class(host, **kwargs)
+        if address is not None:
+            connection._create_connection = lambda target, *args: socket.create_connection((address, target[1]), *args)
+        return connection
+    return connect
+
+class _PinnedHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, address: Optional[str]):
+        super().__init__()
+        self.address = address
+
+    def http_open(self, req):
+        return self.do_open(_pinned(http.client.HTTPConnection, self.address), req)
+
+class _PinnedHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, address: Optional[str]):
+        super().__init__()
+        self.address = address
+
+    def https_open(self, req):
+        return self.do_open(_pinned(http.client.HTTPSConnection, self.address), req, context=self._context)
+
+def _callback_opener(address: Optional[str]) -> urllib.request.OpenerDirector:
+    """Uniquement http et https, sans redirection (urlopen accepterait aussi file:// et ftp://)"""
+    opener = urllib.request.OpenerDirector()
+    for handler in (_PinnedHTTPHandler(address), _PinnedHTTPSHandler(address), _NoRedirect(),
+                    urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+        opener.add_handler(handler)
+    return opener
+
+def _post_callback(url: str, body: dict, timeout: float):
+    # Nouvelle vérification : la résolution DNS a pu changer depuis la soumission
+    address = _validated_address(url)
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body, ensure_ascii=False).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with _callback_opener(address).open(request, timeout=timeout) as response:
+        response.read()
+
+class JobQueue:
+    """File de tâches longues : la requête HTTP rend la main dès la soumission.
+
+    Les workers réservent les tâches dans le stockage, exécutent le handler
+    enregistré pour leur type, enregistrent le résultat puis appellent
+    l'éventuelle URL de rappel. Ils tournent soit dans le serveur (démarrés à
+    la première soumission), soit dans des processus séparés (`worker.py`,
+    stockage SQLite obligatoire) lorsque JOB_WORKERS vaut 0.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 4, poll_interval: float = 0.5, timeout: float = 600):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, kind: str, handler: JobHandler):
+        self.handlers[kind] = handler
+
+    async def submit(self, kind: str, payload: dict, callback_url: Optional[str] = None) -> dict:
+        """Enregistre une tâche ; lève InvalidCallbackURL si l'URL de rappel est refusée"""
+        if kind not in self.handlers:
+            raise ValueError(f"Type de tâche inconnu : {kind}")
+        if callback_url:
+            await asyncio.to_thread(validate_callback_url, callback_url)
+        job = await self.store.create_job(kind, payload, callback_url)
+        if self.workers:
+            self.start()
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> dict:
+        return await self.store.get_job(job_id)
+
+    def start(self, workers: Optional[int] = None):
+        """Démarre les workers dans la boucle courante (sans effet s'ils tournent déjà)"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        for _ in range(workers or self.workers):
+            task = asyncio.create_task(self._worker())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.store.claim_next(list(self.handlers))
+            except Exception as e:
+                print(f"Erreur lors de la lecture de la file de tâches: {e}")
+                job = None
+            if job is None:
+                # Réveil immédiat sur soumission locale, sinon scrutation (workers d'autres processus)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        result, error = None, None
+        # Trace propre à la tâche : le worker a pu être lancé pendant une requête sans rapport
+        with start_span(f"job {job['kind']}", {"job.id": job["id"]}, new_trace=True):
+            try:
+                result = await asyncio.wait_for(self.handlers[job["kind"]](job["payload"]), self.timeout)
+            except asyncio.TimeoutError:
+                error = f"Délai dépassé ({self.timeout}s)"
+            except Exception as e:
+                error = str(getattr(e, "detail", e))
+            set_attributes({"job.status": "failed" if error is not None else "succeeded"})
+        await self.store.finish_job(job["id"], result, error)
+
+        if job["callback_url"]:
+            body = {"job_id": job["id"], "status": "failed" if error is not None else "succeeded",
+                    "result": result, "error": error}
+            try:
+                await asyncio.to_thread(_post_callback, job["callback_url"], body, settings.JOB_CALLBACK_TIMEOUT)
+            except Exception as e:
+                print(f"Échec du rappel {job['callback_url']} pour la tâche {job['id']}: {e}")
+
+def job_lease() -> float:
+    """Bail d'une tâche réservée : au-delà, elle est reprise par un autre worker.
+    Par défaut, une minute de plus que le délai maximal d'exécution (JOB_TIMEOUT)."""
+    return settings.JOB_LEASE_SECONDS or settings.JOB_TIMEOUT + 60
+
+def create_job_store() -> JobStore:
+    """Instancie le stockage configuré (JOB_STORE)"""
+    if settings.JOB_STORE == "sqlite":
+        return SQLiteJobStore(settings.JOB_DB_PATH, settings.JOB_RESULT_TTL, job_lease(), settings.JOB_MAX_ATTEMPTS)
+    if settings.JOB_STORE == "memory":
+        if settings.JOB_WORKERS <= 0:
+            # Aucun worker ne verrait les tâches : elles resteraient en attente pour toujours
+            raise ValueError("JOB_STORE=memory nécessite JOB_WORKERS > 0 (workers séparés : JOB_STORE=sqlite)")
+        return MemoryJobStore(result_ttl=settings.JOB_RESULT_TTL, lease=job_lease(), max_attempts=settings.JOB_MAX_ATTEMPTS)
+    raise ValueError(f"Stockage de tâches inconnu : {settings.JOB_STORE}")
+
+def create_job_queue() -> JobQueue:
+    return JobQueue(create_job_store(), settings.JOB_WORKERS, timeout=settings.JOB_TIMEOUT)
+
+# Instance globale de la file (les handlers sont enregistrés par les modules d'API)
+job_queue = create_job_queue()
@@ -1,73 +1,119 @@
 # app/services/llm_service.py
-import os
-import glob
-import numpy as np
+import asyncio
 import faiss
-import google.generativeai as genai
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, Callable, List, Dict, Tuple
 from app.core.config import settings
 from app.models.schemas import ChatMessage, SourceDocument
+from app.services.gemini_client import configure_gemini
+from app.services.model_router import model_router
+from app.services.embeddings import Embedder, get_embedder, hybrid_dense_weight
+from app.services.metrics import span, timed
+from app.services.index_store import IndexStore
+from app.services.ingestion import discover_files
+from app.services.sparse_index import SparseIndex, reciprocal_rank_fusion
+from app.services.reranker import create_reranker
+from app.services.context_builder import ContextBuilder
+from app.services.tracing import set_attributes
+from app.services.chunking import LegalChunker
+from app.services.ann_index import configure_search, exclusion_params
+from app.services.response_cache import response_cache
+from app.services.chat_sessions import RoutedChat
+from app.services.chunking import estimate_tokens
+from app.services.chat_memory import format_transcript
+from app.services.rate_limiter import set_priority, PRIORITY_BATCH
+
+# Consignes système du chat (envoyées en system_instruction, hors historique)
+CHAT_SYSTEM_INSTRUCTION = """Tu es un assistant juridique virtuel expert en droit français. Réponds de manière 
+professionnelle et précise aux questions juridiques. Si tu n'es pas sûr d'une réponse, 
+indique-le clairement et recommande de consulter un avocat."""
+
+def create_index_store(embedder: Embedder, chunker: LegalChunker) -> IndexStore:
+    """Index persisté configuré (INDEX_*, BM25_*, INGEST_*)"""
+    return IndexStore(
+        settings.INDEX_DIR, embedder, chunker,
+        index_type=settings.INDEX_TYPE, hnsw_m=settings.INDEX_HNSW_M,
+        bm25_k1=settings.BM25_K1, bm25_b=settings.BM25_B,
+        workers=settings.INGEST_WORKERS, queue_size=settings.INGEST_QUEUE_SIZE,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        checkpoint_seconds=settings.INGEST_CHECKPOINT_SECONDS,
+        progress_seconds=settings.INGEST_PROGRESS_SECONDS,
+        extraction_cache_dir=settings.EXTRACTION_CACHE_DIR
+    )
 
 class LLMService:
     def __init__(self):
         self.genai_client = None
-        self.embedding_model = None
+        self.embedder = None
         self.chat_model = None
+        self.chat_session = None
         self.generation_model = None
+        self.search_model = None
         self.faiss_index = None
-        self.documents = []
+        self.search_params = None
+        self.index_store = None
+        self.sparse_index = None
+        self.documents = {}
         self.document_embeddings = []
         
         # Initialiser si la clé API est configurée
         if settings.is_gemini_configured:
             self._initialize_gemini()
+        
+        self.embedder = get_embedder()
+        self.reranker = create_reranker()
+        self.context_builder = ContextBuilder(settings.RAG_CONTEXT_MAX_TOKENS, settings.RAG_CONTEXT_DEDUP_DISTANCE)
+        self.chunker = LegalChunker(settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS)
     
     def _initialize_gemini(self):
         """Initialise le client Gemini et les modèles"""
         try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.generation_model = genai.GenerativeModel('gemini-1.5-flash')
-            self.chat_model = genai.GenerativeModel('gemini-1.5-flash')
+            configure_gemini(settings.GEMINI_API_KEY)
+            # Modèles choisis par tâche par le routeur, avec bascule en cas d'échec
+            self.generation_model = model_router.for_task("document")
+            self.search_model = model_router.for_task("search")
+            self.chat_model = model_router.for_task("summary")
+            self.chat_session = RoutedChat(model_router, CHAT_SYSTEM_INSTRUCTION)
         except Exception as e:
             print(f"Erreur lors de l'initialisation de Gemini: {e}")
     
     def load_documents_and_build_index(self, data_folder: str = "data"):
         """Charge les documents et construit l'index FAISS"""
         try:
-            if not settings.is_gemini_configured:
-                print("Clé API Gemini non configurée, utilisation des documents factices")
+            if next(discover_files(data_folder), None) is None:
                 self._create_mock_data()
                 return
             
-            # Charger les documents
-            doc_files = glob.glob(os.path.join(data_folder, "*.txt"))
-            self.documents = []
-            
-            for doc_file in doc_files:
-                try:
-                    with open(doc_file, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        self.documents.append({
-                            'content': content,
-                            'filename': os.path.basename(doc_file)
-                        })
-                except Exception as e:
-                    print(f"Erreur lors de la lecture de {doc_file}: {e}")
-            
-            if not self.documents:
-                self._create_mock_data()
-                return
+            # Index persisté : seuls les fichiers ajoutés, modifiés ou supprimés sont ré-embeddés
+            self.index_store = create_index_store(self.embedder, self.chunker)
+            stats = self.index_store.sync(data_folder)
+            print(f"Index chargé : {stats['added_or_changed']} fichier(s) (ré)indexé(s), {stats['removed']} supprimé(s)")
             
-            # Générer les embeddings (simulation pour la démo)
-            self._generate_embeddings_mock()
+            self.faiss_index = self.index_store.index
+            self.documents = self.index_store.documents
+            self.sparse_index = self.index_store.sparse
+            configure_search(self.faiss_index, settings.INDEX_NPROBE, settings.INDEX_EF_SEARCH)
+            # Vecteurs HNSW supprimés mais encore dans le graphe
+            self.search_params = exclusion_params(self.faiss_index, self.index_store.deleted_ids)
+            self._share_corpus_with_chat()
             
         except Exception as e:
             print(f"Erreur lors du chargement des documents: {e}")
             self._create_mock_data()
     
+    def _share_corpus_with_chat(self):
+        """Enregistre le corpus dans le cache de contexte du chat s'il tient dans le budget configuré"""
+        budget = settings.CHAT_CORPUS_CONTEXT_MAX_TOKENS
+        if not budget or self.chat_session is None:
+            return
+        contents = [f"Source: {doc['filename']}\n{doc['content']}" for doc in self.documents.values()]
+        if sum(estimate_tokens(text) for text in contents) <= budget:
+            self.chat_session.set_shared_context(contents)
+        else:
+            print("Corpus trop volumineux pour le contexte partagé du chat")
+    
     def _create_mock_data(self):
-        """Crée des données factices pour la démo"""
-        self.documents = [
+        """Crée des données factices pour la démo (non persistées)"""
+        mock_documents = [
             {
                 'content': "Le contrat de travail doit respecter les dispositions du Code du travail. La période d'essai ne peut excéder 2 mois pour les employés et 4 mois pour les cadres.",
                 'filename': 'droit_travail.txt'
@@ -81,61 +127,141 @@ class LLMService:
                 'filename': 'droit_penal.txt'
             }
         ]
-        self._generate_embeddings_mock()
+        chunks = []
+        for doc in mock_documents:
+            for chunk in self.chunker.split(doc['content']):
+                chunk['filename'] = doc['filename']
+                chunks.append(chunk)
+        self.documents = dict(enumerate(chunks))
+        self._build_index()
     
-    def _generate_embeddings_mock(self):
-        """Génère des embeddings factices et construit l'index FAISS"""
-        # Pour la démo, on utilise des embeddings aléatoires
-        dimension = 384  # Dimension typique pour les embeddings
-        self.document_embeddings = np.random.random((len(self.documents), dimension)).astype('float32')
+    def _build_index(self):
+        """Calcule les embeddings des morceaux (par lots) et construit l'index FAISS"""
+        texts = [doc['content'] for doc in self.documents.values()]
+        self.document_embeddings = self.embedder.embed_documents(texts)
         
-        # Construire l'index FAISS
-        self.faiss_index = faiss.IndexFlatIP(dimension)  # Index par produit scalaire
+        # Vecteurs normalisés : le produit scalaire correspond au cosinus
+        self.faiss_index = faiss.IndexFlatIP(self.embedder.dimension)
         self.faiss_index.add(self.document_embeddings)
+        self.search_params = None
+        
+        self.sparse_index = SparseIndex(settings.BM25_K1, settings.BM25_B)
+        self.sparse_index.add_documents(self.documents)
+    
+    async def _dense_search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Recherche FAISS : [(id, cosinus)]"""
+        # La requête est projetée avec le même modèle que les documents
+        with span("embedding"):
+            query_embedding = await self.embedder.embed_query_async(query)
+        # Recherche FAISS dans un thread : elle ne bloque pas la boucle d'événements
+        with span("faiss"):
+            scores, indices = await asyncio.to_thread(
+                self.faiss_index.search, query_embedding, top_k, params=self.search_params
+            )
+        return [(int(idx), float(score)) for score, idx in zip(scores[0], indices[0]) if int(idx) in self.documents]
     
-    def search_documents(self, query: str, top_k: int = 3) -> List[SourceDocument]:
-        """Recherche sémantique dans les documents"""
+    async def _sparse_search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Recherche BM25 dans un thread, pour chevaucher l'embedding de la requête"""
+        with span("bm25"):
+            return await asyncio.to_thread(self.sparse_index.search, query, top_k)
+    
+    def _to_sources(self, hits: List[Tuple[int, float]]) -> List[SourceDocument]:
+        results = []
+        for doc_id, score in hits:
+            doc = self.documents.get(doc_id)
+            if doc is not None:
+                results.append(SourceDocument(
+                    contenu=doc['content'],  # Le morceau retrouvé, borné par le découpage
+                    nom_fichier=doc['filename'],
+                    section=doc.get('section') or None,
+                    debut=doc.get('start'),
+                    fin=doc.get('end'),
+                    score=float(score)
+                ))
+        return results
+    
+    @timed("retrieval")
+    async def search_documents(self, query: str, top_k: int = 3) -> List[SourceDocument]:
+        """Recherche hybride dans les documents : BM25 et FAISS en parallèle, fusionnés par RRF.
+
+        Avec un poids FAISS nul (embedder haché par défaut), BM25 seul ; FAISS
+        ne sert alors que si BM25 ne trouve aucun terme de la requête.
+        """
         try:
             if self.faiss_index is None:
                 return []
             
-            # Pour la démo, génère un embedding aléatoire pour la requête
-            query_embedding = np.random.random((1, 384)).astype('float32')
-            
-            # Recherche dans FAISS
-            scores, indices = self.faiss_index.search(query_embedding, top_k)
+            if not settings.HYBRID_SEARCH_ENABLED or self.sparse_index is None:
+                set_attributes({"retrieval.mode": "dense"})
+                return self._to_sources(await self._dense_search(query, top_k))
             
-            results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx < len(self.documents):
-                    doc = self.documents[idx]
-                    results.append(SourceDocument(
-                        contenu=doc['content'][:200] + "...",  # Limite la longueur
-                        nom_fichier=doc['filename'],
-                        score=float(score)
-                    ))
+            # Requête réduite à des références d'articles : réponse directe, sans appel d'embedding
+            hits = self.sparse_index.citation_search(query, top_k)
+            if hits:
+                set_attributes({"retrieval.mode": "citation"})
+                best = hits[0][1]
+                return self._to_sources([(doc_id, score / best) for doc_id, score in hits])
             
-            return results
+            dense_weight = hybrid_dense_weight(self.embedder)
+            if dense_weight <= 0:
+                hits = await self._sparse_search(query, top_k)
+                if hits:
+                    set_attributes({"retrieval.mode": "bm25"})
+                    best = hits[0][1]
+                    return self._to_sources([(doc_id, score / best) for doc_id, score in hits])
+                set_attributes({"retrieval.mode": "dense"})
+                return self._to_sources(await self._dense_search(query, top_k))
+
+            set_attributes({"retrieval.mode": "hybrid"})
+            candidates = max(top_k, settings.HYBRID_CANDIDATES)
+            dense_hits, sparse_hits = await asyncio.gather(
+                self._dense_search(query, candidates), self._sparse_search(query, candidates)
+            )
+            weighted = [([doc_id for doc_id, _ in hits], weight)
+                        for hits, weight in ((dense_hits, dense_weight), (sparse_hits, 1.0)) if hits]
+            fused = reciprocal_rank_fusion([ranking for ranking, _ in weighted], settings.RRF_K,
+                                           [weight for _, weight in weighted])
+            return self._to_sources(fused[:top_k])
         
         except Exception as e:
             print(f"Erreur lors de la recherche: {e}")
             return []
     
-    def generate_document(self, type_document: str, parametres: dict) -> str:
-        """Génère un document juridique"""
-        try:
-            if not settings.is_gemini_configured:
-                return self._generate_mock_document(type_document, parametres)
-            
-            # Construire le prompt selon le type de document
-            prompt = self._build_generation_prompt(type_document, parametres)
-            
-            response = self.generation_model.generate_content(prompt)
-            return response.text
-        
-        except Exception as e:
-            print(f"Erreur lors de la génération: {e}")
+    async def retrieve_sources(self, question: str) -> List[SourceDocument]:
+        """Sources du prompt RAG : large premier passage, puis reranking vers quelques morceaux"""
+        if self.reranker is None:
+            return await self.search_documents(question, top_k=settings.RERANK_TOP_N)
+        candidates = await self.search_documents(question, top_k=settings.RERANK_CANDIDATES)
+        return await self.reranker.rerank(
+            question, candidates, settings.RERANK_TOP_N, settings.RERANK_MIN_RELATIVE_SCORE
+        )
+    
+    async def generate_document(self, type_document: str, parametres: dict, bypass_cache: bool = False) -> str:
+        """Génère un document juridique (réponses identiques servies par le cache exact).
+
+        Le document factice n'est servi que si Gemini n'est pas configuré ; les
+        erreurs d'accès à Gemini (quota, disjoncteur, tentatives épuisées)
+        remontent à l'appelant.
+        """
+        if not settings.is_gemini_configured:
             return self._generate_mock_document(type_document, parametres)
+        
+        # Construire le prompt selon le type de document
+        prompt = self._build_generation_prompt(type_document, parametres)
+        model_name = self.generation_model.model_name
+        
+        if bypass_cache:
+            response_cache.record_bypass()
+        else:
+            cached = await response_cache.get(prompt, model_name)
+            if cached is not None:
+                return cached
+        
+        document, served_model = await self.generation_model.generate_with_model(prompt)
+        # Réponse d'un modèle de secours : pas mise en cache sous la clé du modèle principal
+        if not bypass_cache and served_model == model_name:
+            await response_cache.set(prompt, model_name, document)
+        return document
     
     def _generate_mock_document(self, type_document: str, parametres: dict) -> str:
         """Génère un document factice pour la démo"""
@@ -185,6 +311,7 @@ Signature : [SIGNATURE]
         else:
             return f"Document de type '{type_document}' généré avec les paramètres : {parametres}"
     
+    @timed("prompt_build")
     def _build_generation_prompt(self, type_document: str, parametres: dict) -> str:
         """Construit le prompt pour la génération de document"""
         base_prompt = f"Génère un {type_document} juridique professionnel en français. "
@@ -197,21 +324,26 @@ Signature : [SIGNATURE]
         base_prompt += f"Utilise les informations suivantes : {parametres}"
         return base_prompt
     
-    def legal_search_with_rag(self, question: str) -> Tuple[str, List[SourceDocument]]:
-        """Effectue une recherche juridique avec RAG"""
-        try:
-            # Rechercher les documents pertinents
-            sources = self.search_documents(question, top_k=3)
-            
-            if not settings.is_gemini_configured:
-                return self._generate_mock_legal_response(question, sources), sources
-            
-            # Construire le contexte à partir des sources
-            context = "\n\n".join([f"Source: {src.nom_fichier}\n{src.contenu}" for src in sources])
-            
-            prompt = f"""
+    async def legal_search_with_rag(self, question: str) -> Tuple[str, List[SourceDocument]]:
+        """Effectue une recherche juridique avec RAG (réponse factice seulement sans Gemini configuré)"""
+        # Rechercher les documents pertinents
+        sources = await self.retrieve_sources(question)
+        prompt, sources = self._build_rag_prompt(question, sources)
+        
+        if not settings.is_gemini_configured:
+            return self._generate_mock_legal_response(question, sources), sources
+        
+        return await self.search_model.generate(prompt), sources
+    
+    @timed("prompt_build")
+    def _build_rag_prompt(self, question: str, sources: List[SourceDocument]) -> Tuple[str, List[SourceDocument]]:
+        """Construit le prompt RAG sous le budget de contexte ; renvoie aussi les sources citées, numérotées"""
+        context, sources = self.context_builder.build(sources)
+        
+        return f"""
 En tant qu'assistant juridique expert, réponds à la question suivante en utilisant 
 les informations fournies dans le contexte. Réponds en français et de manière précise.
+Cite les passages utilisés par leur numéro entre crochets, par exemple [1].
 
 Contexte :
 {context}
@@ -219,14 +351,7 @@ Contexte :
 Question : {question}
 
 Réponse :
-"""
-            
-            response = self.generation_model.generate_content(prompt)
-            return response.text, sources
-        
-        except Exception as e:
-            print(f"Erreur lors de la recherche RAG: {e}")
-            return self._generate_mock_legal_response(question, sources), sources
+""", sources
     
     def _generate_mock_legal_response(self, question: str, sources: List[SourceDocument]) -> str:
         """Génère une réponse juridique factice"""
@@ -244,51 +369,71 @@ Cette réponse est basée sur {len(sources)} source(s) juridique(s) pertinente(s
 Note : Cette réponse est générée à des fins de démonstration uniquement et ne constitue pas un conseil juridique.
 """
     
-    def chat_interaction(self, message: str, historique: List[ChatMessage]) -> Tuple[str, List[ChatMessage]]:
-        """Gère l'interaction de chat"""
-        try:
-            if not settings.is_gemini_configured:
-                response_text = self._generate_mock_chat_response(message)
-                new_history = historique + [
-                    ChatMessage(role="user", content=message),
-                    ChatMessage(role="assistant", content=response_text)
-                ]
-                return response_text, new_history
-            else:
-                # Construire l'historique pour Gemini
-                chat_history = []
-                for msg in historique[-5:]:  # Limite l'historique
-                    chat_history.append(f"{msg.role}: {msg.content}")
-                
-                history_context = "\n".join(chat_history) if chat_history else ""
-                
-                prompt = f"""
-Tu es un assistant juridique virtuel expert en droit français. Réponds de manière 
-professionnelle et précise aux questions juridiques. Si tu n'es pas sûr d'une réponse, 
-indique-le clairement et recommande de consulter un avocat.
+    async def chat_interaction(self, message: str, historique: List[ChatMessage], resume: str = "") -> Tuple[str, List[ChatMessage]]:
+        """Gère l'interaction de chat (`resume` : résumé des tours plus anciens que `historique`)"""
+        if not settings.is_gemini_configured:
+            response_text = self._generate_mock_chat_response(message)
+        else:
+            history = [msg.model_dump() for msg in historique]
+            response_text = await self.chat_session.send(message, history, resume)
+        new_history = historique + [
+            ChatMessage(role="user", content=message),
+            ChatMessage(role="assistant", content=response_text)
+        ]
+        return response_text, new_history
+    
+    async def _stream_or_mock(self, open_stream: Callable[[], AsyncIterator[str]], mock_text: str) -> AsyncIterator[str]:
+        """Relaie le flux Gemini, ou le texte factice si Gemini n'est pas configuré.
 
-{history_context}
+        Les erreurs de Gemini remontent (événement SSE `error`) au lieu d'être
+        masquées par le texte factice.
+        """
+        if not settings.is_gemini_configured:
+            yield mock_text
+            return
+        
+        async for text in open_stream():
+            yield text
+    
+    def generate_document_stream(self, type_document: str, parametres: dict) -> AsyncIterator[str]:
+        """Génère un document juridique en streaming"""
+        prompt = self._build_generation_prompt(type_document, parametres)
+        mock_text = self._generate_mock_document(type_document, parametres)
+        return self._stream_or_mock(lambda: self.generation_model.stream(prompt), mock_text)
+    
+    async def legal_search_stream(self, question: str) -> Tuple[List[SourceDocument], AsyncIterator[str]]:
+        """Recherche RAG en streaming : retourne les sources et le flux de la réponse"""
+        sources = await self.retrieve_sources(question)
+        prompt, sources = self._build_rag_prompt(question, sources)
+        mock_text = self._generate_mock_legal_response(question, sources)
+        return sources, self._stream_or_mock(lambda: self.search_model.stream(prompt), mock_text)
+    
+    def chat_stream(self, message: str, historique: List[ChatMessage], resume: str = "") -> AsyncIterator[str]:
+        """Interaction de chat en streaming"""
+        history = [msg.model_dump() for msg in historique]
+        mock_text = self._generate_mock_chat_response(message)
+        return self._stream_or_mock(lambda: self.chat_session.stream(message, history, resume), mock_text)
+    
+    async def summarize_conversation(self, resume: str, messages: List[dict]) -> str:
+        """Intègre des tours de conversation au résumé glissant d'une session"""
+        set_priority(PRIORITY_BATCH)
+        if not settings.is_gemini_configured:
+            # Résumé extractif : questions posées, tronquées
+            questions = [msg["content"][:200] for msg in messages if msg["role"] == "user"]
+            return "\n".join(filter(None, [resume] + [f"- {question}" for question in questions]))
+        
+        prompt = f"""Tu résumes une conversation entre un utilisateur et un assistant juridique.
+Mets à jour le résumé existant avec les nouveaux échanges. Conserve les faits de l'affaire,
+les questions posées, les conseils donnés et les références juridiques citées. Sois concis.
 
-Utilisateur: {message}
+RÉSUMÉ EXISTANT :
+{resume or "(aucun)"}
 
-Réponse :
-"""
-                
-                response = self.generation_model.generate_content(prompt)
-                new_history = historique + [
-                    ChatMessage(role="user", content=message),
-                    ChatMessage(role="assistant", content=response.text)
-                ]
-                return response.text, new_history
-        
-        except Exception as e:
-            print(f"Erreur lors du chat: {e}")
-            response_text = self._generate_mock_chat_response(message)
-            new_history = historique + [
-                ChatMessage(role="user", content=message),
-                ChatMessage(role="assistant", content=response_text)
-            ]
-            return response_text, new_history
+NOUVEAUX ÉCHANGES :
+{format_transcript(messages)}
+
+RÉSUMÉ MIS À JOUR :"""
+        return await self.chat_model.generate(prompt)
     
     def _generate_mock_chat_response(self, message: str) -> str:
         """Génère une réponse factice pour le chat"""
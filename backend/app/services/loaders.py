@@ -0,0 +1,249 @@
+# app/services/loaders.py
+import io
+import os
+import re
+import gzip
+import zipfile
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+# Balises (HTML, contenu Légifrance) qui ouvrent un nouveau paragraphe ou une nouvelle ligne
+BLOCK_TAGS = {"p", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article",
+              "blockquote", "table", "ul", "ol", "dd", "dt", "pre", "title"}
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+BLANK_LINES = re.compile(r"\n[ \t]*\n(?:[ \t]*\n)+")
+SPACES = re.compile(r"[ \t]+")
+
+def decode(raw: bytes) -> str:
+    """UTF-8, ou Windows-1252 pour les exports plus anciens"""
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('cp1252', errors='replace')
+
+def tidy(text: str) -> str:
+    """Espaces multiples réduits, au plus une ligne vide entre deux paragraphes"""
+    lines = [SPACES.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+class Loader(ABC):
+    """Extraction du texte d'un format de document.
+
+    Le nom et la version identifient l'extraction dans le cache : changer la
+    version d'un loader invalide les textes qu'il avait extraits.
+    """
+
+    name = "text"
+    version = 1
+    extensions: Tuple[str, ...] = ()
+
+    @abstractmethod
+    def extract(self, raw: bytes) -> str:
+        """Texte brut du document, paragraphes séparés par une ligne vide"""
+
+class TextLoader(Loader):
+    name = "text"
+    extensions = (".txt",)
+
+    def extract(self, raw: bytes) -> str:
+        return raw.decode('utf-8')
+
+class _TextCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS or tag == "br":
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" ")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+class HTMLLoader(Loader):
+    """Pages HTML (décisions, fiches) : texte visible, paragraphes conservés"""
+
+    name = "html"
+    extensions = (".html", ".htm")
+
+    def extract(self, raw: bytes) -> str:
+        collector = _TextCollector()
+        collector.feed(decode(raw))
+        collector.close()
+        return tidy("".join(collector.parts))
+
+def _local(tag: str) -> str:
+    """Nom d'une balise XML sans son espace de noms"""
+    return tag.rsplit("}", 1)[-1]
+
+def _element_text(element: ElementTree.Element) -> str:
+    """Texte d'un élément XML dont le contenu est du HTML (paragraphes, sauts de ligne)"""
+    parts = []
+
+    def walk(node):
+        tag = _local(node.tag).lower()
+        block = tag in BLOCK_TAGS
+        if block or tag == "br":
+            parts.append("\n")
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+        if block:
+            parts.append("\n")
+
+    walk(element)
+    return tidy("".join(parts))
+
+class DocxLoader(Loader):
+    """Contrats Word (.docx) : paragraphes du corps du document, tableaux compris"""
+
+    name = "docx"
+    extensions = (".docx",)
+    NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+    def extract(self, raw: bytes) -> str:
+        with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+            root = ElementTree.fromstring(archive.read("word/document.xml"))
+        paragraphs = []
+        for paragraph in root.iter(f"{self.NS}p"):
+            parts = []
+            for node in paragraph.iter():
+                if node.tag == f"{self.NS}t":
+                    parts.append(node.text or "")
+                elif node.tag == f"{self.NS}tab":
+                    parts.append("\t")
+                elif node.tag in (f"{self.NS}br", f"{self.NS}cr"):
+                    parts.append("\n")
+            paragraphs.append("".join(parts))
+        return tidy("\n".join(paragraphs))
+
+class LegifranceXMLLoader(Loader):
+    """Exports XML Légifrance (base LEGI) : un ou plusieurs éléments ARTICLE.
+
+    Chaque article est rendu sous la forme « Article <NUM> » suivi de son
+    contenu, pour que le découpage juridique le reconnaisse ; le titre du
+    code et l'état (abrogé, modifié) sont repris. Les autres XML sont réduits
+    à leur texte.
+    """
+
+    name = "legifrance-xml"
+    extensions = (".xml",)
+
+    def _field(self, element: ElementTree.Element, name: str) -> str:
+        for node in element.iter():
+            if _local(node.tag) == name:
+                return (node.text or "").strip()
+        return ""
+
+    def extract(self, raw: bytes) -> str:
+        root = ElementTree.fromstring(raw)
+        articles = [node for node in root.iter() if _local(node.tag) == "ARTICLE"]
+        if not articles:
+            return _element_text(root)
+
+        parts = []
+        code_title = self._field(root, "TITRE_TXT")
+        if code_title:
+            parts.append(code_title.upper())
+        for article in articles:
+            number = self._field(article, "NUM")
+            state = self._field(article, "ETAT")
+            content = next((node for node in article.iter() if _local(node.tag) == "CONTENU"), None)
+            lines = [f"Article {number}" if number else "Article"]
+            if state and state != "VIGUEUR":
+                lines.append(f"(État : {state.lower()})")
+            if content is not None:
+                lines.append(_element_text(content))
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+
+class PDFLoader(Loader):
+    """Jugements et textes en PDF (pypdf) : texte page par page, séparé par des sauts de page"""
+
+    name = "pdf"
+    extensions = (".pdf",)
+
+    def extract(self, raw: bytes) -> str:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("pypdf est requis pour lire les PDF (pip install pypdf)")
+        reader = PdfReader(io.BytesIO(raw))
+        return "\x0c".join(page.extract_text() or "" for page in reader.pages)
+
+# Loaders par extension ; register_loader en ajoute ou en remplace
+LOADERS: Dict[str, Loader] = {}
+
+def register_loader(loader: Loader):
+    for extension in loader.extensions:
+        LOADERS[extension] = loader
+
+for _loader in (TextLoader(), HTMLLoader(), DocxLoader(), LegifranceXMLLoader(), PDFLoader()):
+    register_loader(_loader)
+
+def supported_extensions() -> Tuple[str, ...]:
+    return tuple(sorted(LOADERS))
+
+def loader_for(path: str) -> Optional[Loader]:
+    return LOADERS.get(os.path.splitext(path)[1].lower())
+
+class ExtractionCache:
+    """Textes extraits, indexés par hash du contenu source et par loader.
+
+    Un fichier déjà extrait n'est jamais ré-analysé, même renommé, déplacé ou
+    après une reconstruction complète de l'index (changement d'embedder ou de
+    découpage). Les entrées sont compressées et réparties en sous-dossiers ;
+    le cache est partagé entre les processus d'ingestion.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, sha256: str, loader: Loader) -> str:
+        return os.path.join(self.cache_dir, sha256[:2], f"{sha256}-{loader.name}-v{loader.version}.txt.gz")
+
+    def get(self, sha256: str, loader: Loader) -> Optional[str]:
+        try:
+            with gzip.open(self._path(sha256, loader), 'rt', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+
+    def set(self, sha256: str, loader: Loader, text: str):
+        path = self._path(sha256, loader)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=3) as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+def extract_text(path: str, raw: bytes, sha256: str, cache: Optional[ExtractionCache] = None) -> str:
+    """Texte d'un fichier source, lu dans le cache d'extraction s'il y est déjà"""
+    loader = loader_for(path)
+    if loader is None:
+        raise ValueError(f"Format non pris en charge : {os.path.splitext(path)[1] or path}")
+    # Le texte brut ne gagne rien à être mis en cache
+    if cache is None or isinstance(loader, TextLoader):
+        return loader.extract(raw)
+    text = cache.get(sha256, loader)
+    if text is None:
+        text = loader.extract(raw)
+        cache.set(sha256, loader, text)
+    return text
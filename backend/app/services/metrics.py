@@ -0,0 +1,133 @@
+# app/services/metrics.py
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from app.services.tracing import route_template, set_attributes, start_span
+
+# Latences d'API et de LLM : de quelques dizaines de ms à plusieurs minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+
+REQUEST_LATENCY = Histogram(
+    "legal_llm_request_duration_seconds", "Durée des requêtes HTTP, corps streamé compris",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "legal_llm_requests_in_flight", "Requêtes HTTP en cours", ["endpoint"], multiprocess_mode="livesum"
+)
+STAGE_LATENCY = Histogram(
+    "legal_llm_stage_duration_seconds", "Durée des étapes internes (prompt, recherche, embedding, cache, LLM)",
+    ["stage", "endpoint"], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "legal_llm_gemini_duration_seconds", "Durée des appels Gemini par modèle, nouvelles tentatives comprises",
+    ["model", "task", "endpoint", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "legal_llm_gemini_tokens", "Tokens estimés par appel Gemini (prompt ou réponse)",
+    ["model", "task", "kind"], buckets=TOKEN_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    "legal_llm_cache_lookups_total", "Consultations du cache de réponses par résultat",
+    ["endpoint", "result"]
+)
+RERANK_OUTCOMES = Counter(
+    "legal_llm_rerank_total", "Passes de reranking par résultat (reranked, timeout, error)",
+    ["backend", "outcome"]
+)
+
+# Route de la requête en cours (gabarit, ex. /api/v1/jobs/{job_id}), posée par MetricsMiddleware
+current_endpoint: "contextvars.ContextVar[str]" = contextvars.ContextVar("metrics_endpoint", default="background")
+
+def set_endpoint(endpoint: str):
+    """Étiquette les mesures du contexte courant (tâches de fond hors requête HTTP)"""
+    current_endpoint.set(endpoint)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Mesure la durée d'une étape, succès ou échec, pour la route en cours, et la trace (span OpenTelemetry)"""
+    start = time.perf_counter()
+    try:
+        with start_span(stage):
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage, current_endpoint.get()).observe(time.perf_counter() - start)
+
+def timed(stage: str) -> Callable:
+    """Décorateur équivalent à `span`, pour les fonctions synchrones comme asynchrones"""
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_llm_call(model_name: str, task: str, seconds: float, outcome: str,
+                    prompt_tokens: int = 0, response_tokens: int = 0):
+    LLM_LATENCY.labels(model_name, task, current_endpoint.get(), outcome).observe(seconds)
+    if outcome == "success":
+        LLM_TOKENS.labels(model_name, task, "prompt").observe(prompt_tokens)
+        LLM_TOKENS.labels(model_name, task, "response").observe(response_tokens)
+
+def record_cache_lookup(result: str):
+    """`result` : exact_hit, semantic_hit, miss ou bypass"""
+    CACHE_LOOKUPS.labels(current_endpoint.get(), result).inc()
+    set_attributes({"cache.result": result})
+
+def record_rerank(backend: str, outcome: str):
+    """`outcome` : reranked, ou timeout / error quand l'ordre du premier passage est conservé"""
+    RERANK_OUTCOMES.labels(backend, outcome).inc()
+    set_attributes({"rerank.backend": backend, "rerank.outcome": outcome})
+
+class MetricsMiddleware:
+    """Middleware ASGI : durée de bout en bout (jusqu'au dernier octet streamé) et requêtes en cours"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = route_template(scope)
+        token = current_endpoint.set(endpoint)
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(endpoint)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.labels(endpoint, scope["method"], str(status["code"])).observe(time.perf_counter() - start)
+            in_flight.dec()
+            current_endpoint.reset(token)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition Prometheus ; agrège les workers si PROMETHEUS_MULTIPROC_DIR est défini"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
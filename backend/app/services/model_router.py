@@ -0,0 +1,271 @@
+# app/services/model_router.py
+import re
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from google.api_core import exceptions as google_exceptions
+from app.core.config import settings
+from app.services.chunking import estimate_tokens
+from app.services.gemini_client import GeminiClient, get_gemini_client
+from app.services.metrics import record_llm_call
+from app.services.tracing import set_attributes, start_span, tracer
+from opentelemetry import trace
+from app.services.resilience import CircuitOpenError, is_retryable
+
+T = TypeVar("T")
+
+@dataclass(frozen=True)
+class ModelSpec:
+    name: str
+    tier: str  # "fast" (bon marché, faible latence) ou "strong"
+    input_cost: float  # USD par million de tokens de prompt (tarif indicatif)
+    output_cost: float  # USD par million de tokens générés (tarif indicatif)
+
+# Registre des modèles utilisables ; un modèle absent est traité comme "strong" au tarif nul
+MODEL_REGISTRY: Dict[str, ModelSpec] = {spec.name: spec for spec in (
+    ModelSpec("gemini-1.5-flash", "fast", 0.075, 0.30),
+    ModelSpec("gemini-2.0-flash-exp", "fast", 0.10, 0.40),
+    ModelSpec("gemini-2.0-flash", "fast", 0.10, 0.40),
+    ModelSpec("gemini-2.5-flash-preview-05-20", "strong", 0.15, 0.60),
+    ModelSpec("gemini-1.5-pro", "strong", 1.25, 5.00),
+)}
+
+# Niveau de modèle par tâche
+TASK_TIERS = {
+    "chat": "fast",
+    "classification": "fast",
+    "rerank": "fast",
+    "summary": "fast",
+    "search": "strong",
+    "document": "strong",
+}
+
+# Demandes de chat qui méritent le modèle fort : rédaction, analyse de clauses...
+CHAT_ESCALATION_PATTERN = re.compile(
+    r"\b(rédige|rédiger|rédaction|draft|write|contrat|contract|clause|analyse|analyze|review|compare)\w*",
+    re.IGNORECASE
+)
+
+# Erreurs qui justifient de passer au modèle suivant
+FALLBACK_ERRORS = (CircuitOpenError, asyncio.TimeoutError, google_exceptions.NotFound)
+
+def should_fall_back(error: Exception) -> bool:
+    return isinstance(error, FALLBACK_ERRORS) or is_retryable(error)
+
+def spec_for(model_name: str) -> ModelSpec:
+    return MODEL_REGISTRY.get(model_name) or ModelSpec(model_name, "strong", 0.0, 0.0)
+
+class _ModelStats:
+    """Latences et coûts estimés d'un modèle"""
+
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.latencies = deque(maxlen=1000)
+        self.counts = {"calls": 0, "errors": 0, "fallbacks": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def record(self, latency: float, input_tokens: int, output_tokens: int):
+        self.counts["calls"] += 1
+        self.counts["input_tokens"] += input_tokens
+        self.counts["output_tokens"] += output_tokens
+        self.latencies.append(latency)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        def percentile(p: float) -> Optional[float]:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+        cost = (self.counts["input_tokens"] * self.spec.input_cost + self.counts["output_tokens"] * self.spec.output_cost) / 1e6
+        return {
+            **self.counts,
+            "tier": self.spec.tier,
+            "latency_p50_s": percentile(0.50),
+            "latency_p95_s": percentile(0.95),
+            "estimated_cost_usd": round(cost, 6),
+        }
+
+class ModelRouter:
+    """Choisit le modèle Gemini par tâche et bascule sur le suivant en cas d'échec.
+
+    Chaque tâche a un niveau (TASK_TIERS) : le modèle rapide pour le chat
+    courant, la classification et les résumés, le modèle fort pour la
+    recherche et la rédaction de documents. Les messages de chat qui demandent
+    une rédaction ou une analyse, ou qui sont longs, passent au modèle fort.
+    Si le modèle choisi échoue (erreur transitoire ou délai GEMINI_TIMEOUT
+    dépassé après nouvelles tentatives, disjoncteur ouvert, modèle retiré), la
+    requête passe à l'autre niveau puis aux modèles de secours. La bascule ne
+    se décide que sur ces erreurs terminales de la couche de résilience :
+    aucun délai englobant ne vient interrompre les nouvelles tentatives, une
+    attente de quota ou une longue génération encore en cours.
+    """
+
+    def __init__(self, fast_model: str, strong_model: str, fallback_models: List[str]):
+        self.models = {"fast": fast_model, "strong": strong_model}
+        self.fallback_models = fallback_models
+        self.stats: Dict[str, _ModelStats] = {}
+
+    def _tier(self, task: str, text: str = "") -> str:
+        tier = TASK_TIERS.get(task, "strong")
+        if task == "chat" and (
+            CHAT_ESCALATION_PATTERN.search(text) or estimate_tokens(text) > settings.CHAT_FAST_MAX_TOKENS
+        ):
+            tier = "strong"
+        return tier
+
+    def candidates(self, task: str, text: str = "") -> List[str]:
+        """Modèles à essayer dans l'ordre pour une tâche"""
+        tier = self._tier(task, text)
+        other = "fast" if tier == "strong" else "strong"
+        ordered = [self.models[tier], self.models[other]] + self.fallback_models
+        return list(dict.fromkeys(name for name in ordered if name))
+
+    def primary(self, task: str, text: str = "") -> str:
+        return self.candidates(task, text)[0]
+
+    def _stats(self, model_name: str) -> _ModelStats:
+        if model_name not in self.stats:
+            self.stats[model_name] = _ModelStats(spec_for(model_name))
+        return self.stats[model_name]
+
+    def _record(self, model_name: str, task: str, latency: float, input_tokens: int, output_tokens: int):
+        self._stats(model_name).record(latency, input_tokens, output_tokens)
+        record_llm_call(model_name, task, latency, "success", input_tokens, output_tokens)
+        set_attributes({"gen_ai.usage.input_tokens": input_tokens, "gen_ai.usage.output_tokens": output_tokens})
+
+    def _span_attributes(self, model_name: str, task: str, position: int) -> dict:
+        return {"gen_ai.system": "gemini", "gen_ai.request.model": model_name, "gemini.task": task,
+                "gemini.fallback_position": position}
+
+    async def run(self, task: str, text: str, call: Callable[[GeminiClient], Awaitable[T]],
+                  output_tokens: Callable[[T], int] = lambda result: 0) -> T:
+        """Exécute `call` sur le premier modèle disponible pour la tâche"""
+        result, _ = await self.run_with_model(task, text, call, output_tokens)
+        return result
+
+    async def run_with_model(self, task: str, text: str, call: Callable[[GeminiClient], Awaitable[T]],
+                             output_tokens: Callable[[T], int] = lambda result: 0) -> Tuple[T, str]:
+        """Comme run, en indiquant le modèle qui a répondu (un modèle de secours en cas de bascule)"""
+        candidates = self.candidates(task, text)
+        input_tokens = estimate_tokens(text)
+        for position, model_name in enumerate(candidates):
+            stats = self._stats(model_name)
+            start = time.perf_counter()
+            with start_span("gemini.call", self._span_attributes(model_name, task, position)):
+                try:
+                    result = await call(get_gemini_client(model_name))
+                except Exception as e:
+                    stats.counts["errors"] += 1
+                    record_llm_call(model_name, task, time.perf_counter() - start, "error")
+                    if not should_fall_back(e) or position == len(candidates) - 1:
+                        raise
+                    stats.counts["fallbacks"] += 1
+                    print(f"Modèle {model_name} indisponible pour '{task}' ({type(e).__name__}), bascule sur {candidates[position + 1]}")
+                    continue
+                self._record(model_name, task, time.perf_counter() - start, input_tokens, output_tokens(result))
+                return result, model_name
+
+    async def generate(self, task: str, prompt: str) -> str:
+        text, _ = await self.generate_with_model(task, prompt)
+        return text
+
+    async def generate_with_model(self, task: str, prompt: str) -> Tuple[str, str]:
+        return await self.run_with_model(
+            task, prompt, lambda client: client.generate(prompt), lambda text: estimate_tokens(text)
+        )
+
+    async def stream_with(self, task: str, text: str,
+                          open_stream: Callable[[GeminiClient], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Relaie un flux ; la bascule de modèle n'est possible qu'avant le premier fragment.
+
+        Le span n'est rendu courant que le temps de chaque attente (le contexte
+        ne doit pas rester attaché à travers les `yield`).
+        """
+        candidates = self.candidates(task, text)
+        for position, model_name in enumerate(candidates):
+            stats = self._stats(model_name)
+            start = time.perf_counter()
+            call_span = tracer.start_span("gemini.stream", attributes=self._span_attributes(model_name, task, position))
+            try:
+                chunks = open_stream(get_gemini_client(model_name)).__aiter__()
+                try:
+                    with trace.use_span(call_span):
+                        first = await chunks.__anext__()
+                        call_span.add_event("first_chunk")
+                except StopAsyncIteration:
+                    with trace.use_span(call_span):
+                        self._record(model_name, task, time.perf_counter() - start, estimate_tokens(text), 0)
+                    return
+                except Exception as e:
+                    stats.counts["errors"] += 1
+                    record_llm_call(model_name, task, time.perf_counter() - start, "error")
+                    if hasattr(chunks, "aclose"):
+                        await chunks.aclose()
+                    if not should_fall_back(e) or position == len(candidates) - 1:
+                        raise
+                    stats.counts["fallbacks"] += 1
+                    print(f"Modèle {model_name} indisponible pour '{task}' ({type(e).__name__}), bascule sur {candidates[position + 1]}")
+                    continue
+
+                parts = [first]
+                yield first
+                try:
+                    while True:
+                        with trace.use_span(call_span):
+                            try:
+                                text_chunk = await chunks.__anext__()
+                            except StopAsyncIteration:
+                                break
+                        parts.append(text_chunk)
+                        yield text_chunk
+                except Exception:
+                    stats.counts["errors"] += 1
+                    record_llm_call(model_name, task, time.perf_counter() - start, "error")
+                    raise
+                with trace.use_span(call_span):
+                    self._record(model_name, task, time.perf_counter() - start, estimate_tokens(text), estimate_tokens("".join(parts)))
+                return
+            finally:
+                call_span.end()
+
+    def stream(self, task: str, prompt: str) -> AsyncIterator[str]:
+        return self.stream_with(task, prompt, lambda client: client.stream(prompt))
+
+    def for_task(self, task: str) -> "RoutedModel":
+        return RoutedModel(self, task)
+
+    def get_stats(self) -> dict:
+        return {
+            "routes": {task: self.candidates(task) for task in TASK_TIERS},
+            "models": {name: stats.summary() for name, stats in self.stats.items()},
+        }
+
+class RoutedModel:
+    """Vue d'une tâche du routeur, utilisable à la place d'un GeminiClient (generate / stream)"""
+
+    def __init__(self, router: ModelRouter, task: str):
+        self.router = router
+        self.task = task
+
+    @property
+    def model_name(self) -> str:
+        return self.router.primary(self.task)
+
+    async def generate(self, prompt: str) -> str:
+        return await self.router.generate(self.task, prompt)
+
+    async def generate_with_model(self, prompt: str) -> Tuple[str, str]:
+        """Texte généré et modèle qui l'a produit (différent de model_name après une bascule)"""
+        return await self.router.generate_with_model(self.task, prompt)
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        return self.router.stream(self.task, prompt)
+
+def _model_list(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+# Instance globale du routeur
+model_router = ModelRouter(
+    fast_model=settings.GEMINI_FAST_MODEL,
+    strong_model=settings.GEMINI_STRONG_MODEL,
+    fallback_models=_model_list(settings.GEMINI_FALLBACK_MODELS)
+)
@@ -0,0 +1,249 @@
+# app/services/rate_limiter.py
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+from app.core.config import settings
+
+# Priorités d'accès au quota Gemini (la plus petite passe en premier)
+PRIORITY_INTERACTIVE = 0  # chat
+PRIORITY_STANDARD = 1  # recherche, génération unitaire
+PRIORITY_BATCH = 2  # lots, tâches de fond
+
+# Priorité de la requête en cours, posée par les endpoints et héritée par leurs tâches
+current_priority: "contextvars.ContextVar[int]" = contextvars.ContextVar("gemini_priority", default=PRIORITY_STANDARD)
+
+def set_priority(priority: int):
+    current_priority.set(priority)
+
+class RateLimitExceeded(Exception):
+    """Quota Gemini local saturé : la requête est rejetée plutôt que mise en attente trop longtemps"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Quota Gemini saturé, réessayer dans {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+def _refill(state: dict, rpm: int, tpm: int, now: float) -> dict:
+    """Seaux de jetons requêtes/minute et tokens/minute, remplis au prorata du temps écoulé"""
+    elapsed = max(0.0, now - state["updated"])
+    return {
+        "requests": min(rpm, state["requests"] + elapsed * rpm / 60),
+        "tokens": min(tpm, state["tokens"] + elapsed * tpm / 60),
+        "updated": now,
+    }
+
+def _wait_time(state: dict, requests: float, tokens: float, rpm: int, tpm: int) -> float:
+    """Temps avant que les seaux contiennent `requests` requêtes et `tokens` tokens"""
+    wait = 0.0
+    if rpm and requests > state["requests"]:
+        wait = max(wait, (requests - state["requests"]) * 60 / rpm)
+    if tpm and tokens > state["tokens"]:
+        wait = max(wait, (tokens - state["tokens"]) * 60 / tpm)
+    return wait
+
+class BucketBackend(ABC):
+    """État des seaux de jetons (RPM/TPM)"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+
+    def _initial_state(self) -> dict:
+        return {"requests": self.rpm, "tokens": self.tpm, "updated": time.time()}
+
+    def _consume(self, state: dict, tokens: int) -> Tuple[dict, float]:
+        state = _refill(state, self.rpm, self.tpm, time.time())
+        # Une requête plus grosse que le seau entier passe quand le seau est plein
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        wait = _wait_time(state, 1, tokens, self.rpm, self.tpm)
+        if wait == 0:
+            state["requests"] -= 1 if self.rpm else 0
+            state["tokens"] -= tokens
+        return state, wait
+
+    @abstractmethod
+    async def try_acquire(self, tokens: int) -> float:
+        """Consomme une requête et `tokens` tokens ; sinon retourne l'attente nécessaire"""
+
+    @abstractmethod
+    async def available(self) -> Tuple[float, float]:
+        """Requêtes et tokens disponibles immédiatement"""
+
+class MemoryBucketBackend(BucketBackend):
+    """Seaux propres au worker (les limites sont alors à diviser par le nombre de workers)"""
+
+    def __init__(self, rpm: int, tpm: int):
+        super().__init__(rpm, tpm)
+        self.state = self._initial_state()
+
+    async def try_acquire(self, tokens: int) -> float:
+        self.state, wait = self._consume(self.state, tokens)
+        return wait
+
+    async def available(self) -> Tuple[float, float]:
+        self.state = _refill(self.state, self.rpm, self.tpm, time.time())
+        return self.state["requests"], self.state["tokens"]
+
+class FileBucketBackend(BucketBackend):
+    """Seaux partagés entre workers uvicorn via un fichier d'état verrouillé (flock)"""
+
+    def __init__(self, rpm: int, tpm: int, path: str):
+        super().__init__(rpm, tpm)
+        self.path = path
+
+    def _update(self, tokens: Optional[int]) -> Tuple[dict, float]:
+        import fcntl
+
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else self._initial_state()
+                if tokens is None:
+                    return _refill(state, self.rpm, self.tpm, time.time()), 0.0
+                state, wait = self._consume(state, tokens)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return state, wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    async def try_acquire(self, tokens: int) -> float:
+        _, wait = await asyncio.to_thread(self._update, tokens)
+        return wait
+
+    async def available(self) -> Tuple[float, float]:
+        state, _ = await asyncio.to_thread(self._update, None)
+        return state["requests"], state["tokens"]
+
+class RateScheduler:
+    """Ordonnanceur du quota Gemini partagé (requêtes/minute, tokens/minute).
+
+    Chaque appel annonce son coût estimé en tokens et attend son tour dans une
+    file à priorités : seule la requête en tête de file consomme le quota, les
+    appels interactifs doublent donc les lots. Si l'attente prévue dépasse le
+    maximum toléré pour sa priorité, l'appel est rejeté tout de suite
+    (RateLimitExceeded, exposé en 429 + Retry-After) au lieu de s'empiler.
+    """
+
+    def __init__(self, backend: BucketBackend, max_wait: List[float]):
+        self.backend = backend
+        self.max_wait = max_wait
+        self.enabled = bool(backend.rpm or backend.tpm)
+        self._queue: List[tuple] = []
+        self._counter = itertools.count()
+        self._changed: Optional[asyncio.Condition] = None
+        self._changed_loop = None
+        self.stats = {"admitted": 0, "shed": 0, "waited": 0, "wait_time_total": 0.0}
+
+    def _condition(self) -> asyncio.Condition:
+        """Retourne la condition liée à la boucle d'événements courante"""
+        loop = asyncio.get_running_loop()
+        if self._changed is None or self._changed_loop is not loop:
+            self._changed = asyncio.Condition()
+            self._changed_loop = loop
+        return self._changed
+
+    async def _expected_wait(self, tokens: int, priority: int) -> float:
+        """Attente estimée en tenant compte des requêtes de priorité égale ou supérieure déjà en file"""
+        ahead = [entry for entry in self._queue if entry[0] <= priority]
+        requests, available_tokens = await self.backend.available()
+        state = {"requests": requests, "tokens": available_tokens}
+        tpm = self.backend.tpm
+        return _wait_time(
+            state,
+            len(ahead) + 1,
+            sum(min(entry[2], tpm) for entry in ahead + [(priority, 0, tokens)]),
+            self.backend.rpm,
+            self.backend.tpm
+        )
+
+    async def acquire(self, tokens: int, priority: Optional[int] = None):
+        """Attend que le quota permette un appel de `tokens` tokens, ou lève RateLimitExceeded"""
+        if not self.enabled:
+            return
+        priority = current_priority.get() if priority is None else priority
+        max_wait = self.max_wait[min(priority, len(self.max_wait) - 1)]
+
+        expected = await self._expected_wait(tokens, priority)
+        if expected > max_wait:
+            self.stats["shed"] += 1
+            raise RateLimitExceeded(expected)
+
+        start = time.monotonic()
+        entry = (priority, next(self._counter), tokens)
+        condition = self._condition()
+        heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                if self._queue[0] is entry:
+                    wait = await self.backend.try_acquire(tokens)
+                    if wait == 0:
+                        break
+                else:
+                    wait = max_wait
+                remaining = max_wait - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.stats["shed"] += 1
+                    raise RateLimitExceeded(max(wait, 1.0))
+                async with condition:
+                    try:
+                        # Réveil quand la tête de file change, sinon quand le quota se reconstitue
+                        await asyncio.wait_for(condition.wait(), min(wait, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            async with condition:
+                condition.notify_all()
+
+        waited = time.monotonic() - start
+        self.stats["admitted"] += 1
+        if waited > 0.001:
+            self.stats["waited"] += 1
+            self.stats["wait_time_total"] += waited
+
+    async def try_acquire(self, tokens: int) -> bool:
+        """Admet un appel seulement si le quota le permet tout de suite, sans attendre ni doubler la file"""
+        if not self.enabled:
+            return True
+        if self._queue or await self.backend.try_acquire(tokens) > 0:
+            return False
+        self.stats["admitted"] += 1
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "wait_time_total": round(self.stats["wait_time_total"], 3),
+            "queued": len(self._queue),
+            "rpm": self.backend.rpm,
+            "tpm": self.backend.tpm,
+            "enabled": self.enabled,
+        }
+
+def create_rate_scheduler() -> RateScheduler:
+    """Instancie l'ordonnanceur configuré (GEMINI_RPM / GEMINI_TPM, RATE_LIMIT_BACKEND)"""
+    if settings.RATE_LIMIT_BACKEND == "file":
+        backend = FileBucketBackend(settings.GEMINI_RPM, settings.GEMINI_TPM, settings.RATE_LIMIT_STATE_PATH)
+    elif settings.RATE_LIMIT_BACKEND == "memory":
+        backend = MemoryBucketBackend(settings.GEMINI_RPM, settings.GEMINI_TPM)
+    else:
+        raise ValueError(f"Backend de limitation inconnu : {settings.RATE_LIMIT_BACKEND}")
+    max_wait = [
+        settings.RATE_LIMIT_INTERACTIVE_MAX_WAIT,
+        settings.RATE_LIMIT_STANDARD_MAX_WAIT,
+        settings.RATE_LIMIT_BATCH_MAX_WAIT,
+    ]
+    return RateScheduler(backend, max_wait)
+
+# Instance globale : un seul quota par clé API
+rate_scheduler = create_rate_scheduler()
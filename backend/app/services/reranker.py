@@ -0,0 +1,149 @@
+# app/services/reranker.py
+import re
+import json
+import math
+import asyncio
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from app.core.config import settings
+from app.models.schemas import SourceDocument
+from app.services.metrics import record_rerank, span
+from app.services.model_router import ModelRouter, model_router
+from app.services.sparse_index import extract_citations, tokenize, words
+
+JSON_OBJECT_PATTERN = re.compile(r"\{.*\}", re.DOTALL)
+
+class Reranker(ABC):
+    """Second passage de la recherche : réordonne les candidats du premier passage.
+
+    Le reranking est borné par un budget de latence ; s'il est dépassé ou
+    échoue, l'ordre du premier passage est conservé. Les candidats dont le
+    score est trop loin du meilleur sont écartés, pour n'envoyer au modèle que
+    les morceaux utiles.
+    """
+
+    name = "none"
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    @abstractmethod
+    async def score(self, query: str, candidates: List[SourceDocument]) -> List[float]:
+        """Un score de pertinence par candidat, dans l'ordre des candidats"""
+
+    async def rerank(self, query: str, candidates: List[SourceDocument], top_n: int,
+                     min_relative_score: float = 0.0) -> List[SourceDocument]:
+        if len(candidates) <= 1:
+            return candidates[:top_n]
+
+        with span("rerank"):
+            try:
+                scores = await asyncio.wait_for(self.score(query, candidates), self.timeout)
+                if len(scores) != len(candidates):
+                    raise ValueError(f"{len(scores)} scores pour {len(candidates)} candidats")
+            except asyncio.TimeoutError:
+                record_rerank(self.name, "timeout")
+                return candidates[:top_n]
+            except Exception as e:
+                print(f"Erreur lors du reranking: {e}")
+                record_rerank(self.name, "error")
+                return candidates[:top_n]
+        record_rerank(self.name, "reranked")
+
+        best = max(scores)
+        if best <= 0:
+            return candidates[:top_n]
+        # À score égal, l'ordre du premier passage départage
+        ranked = sorted(zip(scores, range(len(candidates)), candidates), key=lambda item: (-item[0], item[1]))
+        return [
+            candidate.model_copy(update={"score": round(score / best, 4)})
+            for score, _, candidate in ranked[:top_n]
+            if score >= min_relative_score * best
+        ]
+
+class LocalReranker(Reranker):
+    """Score lexical de la paire (question, passage), sans appel réseau.
+
+    Couverture des termes de la question pondérée par leur rareté parmi les
+    candidats (un terme présent partout ne départage rien), expressions de
+    deux mots reprises telles quelles, références d'articles citées, et rang
+    du premier passage comme a priori.
+    """
+
+    name = "local"
+
+    async def score(self, query: str, candidates: List[SourceDocument]) -> List[float]:
+        return await asyncio.to_thread(self._score, query, candidates)
+
+    def _score(self, query: str, candidates: List[SourceDocument]) -> List[float]:
+        query_words = words(query)
+        query_terms = set(tokenize(query))
+        query_bigrams = set(zip(query_words, query_words[1:]))
+        citations = set(extract_citations(query))
+
+        passages = []
+        for candidate in candidates:
+            passage_words = words(candidate.contenu)
+            passages.append((set(passage_words) | set(extract_citations(candidate.contenu)),
+                             set(zip(passage_words, passage_words[1:]))))
+
+        n = len(candidates)
+        idf = {}
+        for term in query_terms:
+            df = sum(1 for terms, _ in passages if term in terms)
+            idf[term] = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        total_idf = sum(idf.values()) or 1.0
+
+        scores = []
+        for rank, (terms, bigrams) in enumerate(passages):
+            coverage = sum(weight for term, weight in idf.items() if term in terms) / total_idf
+            phrases = len(query_bigrams & bigrams) / len(query_bigrams) if query_bigrams else 0.0
+            cited = 1.0 if citations & terms else 0.0
+            prior = 1.0 - rank / n
+            scores.append(coverage + 0.5 * phrases + cited + 0.3 * prior)
+        return scores
+
+class LLMReranker(Reranker):
+    """Notation de tous les candidats en un seul appel Gemini (modèle rapide)"""
+
+    name = "llm"
+
+    def __init__(self, router: ModelRouter, timeout: float, passage_chars: int):
+        super().__init__(timeout)
+        self.router = router
+        self.passage_chars = passage_chars
+
+    def _build_prompt(self, query: str, candidates: List[SourceDocument]) -> str:
+        passages = "\n\n".join(
+            f"[{i}] {candidate.contenu[:self.passage_chars]}" for i, candidate in enumerate(candidates)
+        )
+        return f"""Tu évalues la pertinence de passages juridiques pour une question.
+Note chaque passage de 0 (hors sujet) à 10 (répond directement à la question).
+Réponds uniquement par un objet JSON de la forme {{"scores": [note du passage 0, note du passage 1, ...]}}
+avec exactement {len(candidates)} notes, dans l'ordre des passages.
+
+Question : {query}
+
+Passages :
+{passages}"""
+
+    async def score(self, query: str, candidates: List[SourceDocument]) -> List[float]:
+        text = await self.router.generate("rerank", self._build_prompt(query, candidates))
+        match = JSON_OBJECT_PATTERN.search(text)
+        if match is None:
+            raise ValueError("Réponse de reranking sans JSON")
+        return [float(value) for value in json.loads(match.group(0))["scores"]]
+
+def create_reranker() -> Optional[Reranker]:
+    """Instancie le reranker configuré (RERANK_BACKEND), ou None si le reranking est désactivé"""
+    backend = settings.RERANK_BACKEND
+    if not backend:
+        return None
+    if backend == "llm":
+        if settings.is_gemini_configured:
+            return LLMReranker(model_router, settings.RERANK_TIMEOUT, settings.RERANK_PASSAGE_CHARS)
+        print("Gemini non configuré : reranking local")
+        backend = "local"
+    if backend == "local":
+        return LocalReranker(settings.RERANK_TIMEOUT)
+    raise ValueError(f"Backend de reranking inconnu : {backend}")
@@ -0,0 +1,236 @@
+# app/services/resilience.py
+import time
+import random
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from google.api_core import exceptions as google_exceptions
+from app.core.config import settings
+from app.services.rate_limiter import RateLimitExceeded
+from app.services.tracing import set_attributes, start_span
+
+T = TypeVar("T")
+
+# Erreurs transitoires : quota (429), indisponibilité (503), erreur serveur (500), délai dépassé
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    asyncio.TimeoutError,
+    ConnectionError,
+)
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans contacter Gemini : le disjoncteur du modèle est ouvert"""
+
+    def __init__(self, model_name: str, retry_after: float):
+        super().__init__(f"Gemini indisponible pour {model_name}, nouvel essai dans {retry_after:.0f}s")
+        self.model_name = model_name
+        self.retry_after = retry_after
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Délai imposé par l'API (en-tête Retry-After ou RetryInfo), s'il y en a un"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+def upstream_status(error: BaseException) -> Optional[Tuple[int, float]]:
+    """Statut HTTP et délai Retry-After d'une erreur d'accès à Gemini, ou None pour une autre erreur.
+
+    429 : quota local saturé (la requête est délestée) ; 503 : disjoncteur
+    ouvert ou erreurs transitoires persistantes après les nouvelles tentatives.
+    """
+    if isinstance(error, RateLimitExceeded):
+        return 429, max(1.0, error.retry_after)
+    if isinstance(error, CircuitOpenError):
+        return 503, max(1.0, error.retry_after)
+    if is_retryable(error):
+        return 503, retry_after_seconds(error) or settings.GEMINI_BREAKER_RESET_TIMEOUT
+    return None
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float, retry_after: Optional[float] = None) -> float:
+    """Backoff exponentiel à gigue complète, jamais plus court que le Retry-After de l'API"""
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_delay))
+    return delay
+
+class CircuitBreaker:
+    """Disjoncteur par modèle : fermé -> ouvert après N échecs consécutifs -> semi-ouvert après `reset_timeout`.
+
+    En semi-ouvert, un seul appel de test passe ; son succès referme le
+    disjoncteur, son échec le rouvre pour une nouvelle période. Un appel de
+    test annulé (délai englobant, client déconnecté) ne dit rien du modèle :
+    il libère simplement sa place pour le suivant.
+    """
+
+    def __init__(self, model_name: str, failure_threshold: int, reset_timeout: float):
+        self.model_name = model_name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+
+    def before_call(self) -> bool:
+        """Autorise l'appel ou lève CircuitOpenError ; renvoie True pour l'appel de test du semi-ouvert"""
+        if self.state == "closed":
+            return False
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        raise CircuitOpenError(self.model_name, max(remaining, 1.0))
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Appel interrompu sans résultat : l'appel de test suivant pourra passer"""
+        self._probe_in_flight = False
+
+class Resilience:
+    """Nouvelles tentatives, disjoncteur et requêtes couvertes (hedging) pour un modèle"""
+
+    def __init__(self, model_name: str, max_attempts: Optional[int] = None, base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None, timeout: Optional[float] = None, hedge_delay: Optional[float] = None):
+        self.model_name = model_name
+        self.max_attempts = max_attempts or settings.GEMINI_RETRY_MAX_ATTEMPTS
+        self.base_delay = settings.GEMINI_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = settings.GEMINI_RETRY_MAX_DELAY if max_delay is None else max_delay
+        self.timeout = timeout or settings.GEMINI_TIMEOUT
+        self.hedge_delay = settings.GEMINI_HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.breaker = CircuitBreaker(
+            model_name, settings.GEMINI_BREAKER_FAILURE_THRESHOLD, settings.GEMINI_BREAKER_RESET_TIMEOUT
+        )
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "circuit_rejections": 0,
+                      "hedges": 0, "hedge_wins": 0, "hedges_skipped": 0}
+
+    async def call(self, attempt: Callable[[], Awaitable[T]], hedge: bool = False,
+                   admit: Optional[Callable[[], Awaitable[None]]] = None,
+                   admit_hedge: Optional[Callable[[], Awaitable[bool]]] = None) -> T:
+        """Exécute `attempt` avec nouvelles tentatives sur erreur transitoire.
+
+        Avec `hedge`, une seconde requête identique part si la première n'a
+        pas répondu après `hedge_delay` ; la première réponse l'emporte.
+        À réserver aux appels sans effet de bord. `admit` est attendu avant
+        chaque tentative (quota local) ; ses erreurs ne touchent pas au disjoncteur.
+        La requête couverte passe par `admit_hedge`, qui répond sans attendre :
+        si le quota ne l'admet pas tout de suite, elle ne part pas (ni sans
+        `admit_hedge` quand `admit` est fourni, elle échapperait au quota).
+        """
+        self.stats["calls"] += 1
+        for attempt_number in range(self.max_attempts):
+            if admit is not None:
+                await admit()
+            try:
+                probe = self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats["circuit_rejections"] += 1
+                raise
+            try:
+                with start_span("gemini.attempt", {"gemini.model": self.model_name, "gemini.attempt": attempt_number + 1}):
+                    if hedge and self.hedge_delay > 0 and (admit is None or admit_hedge is not None):
+                        result = await self._hedged(attempt, admit_hedge)
+                    else:
+                        result = await asyncio.wait_for(attempt(), self.timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Erreur de la requête elle-même (400, 403...) : le modèle n'est pas en cause
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt_number == self.max_attempts - 1 or self.breaker.state == "open":
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                delay = backoff_delay(attempt_number, self.base_delay, self.max_delay, retry_after_seconds(e))
+                set_attributes({"gemini.retries": attempt_number + 1})
+                print(f"Gemini {self.model_name}: {type(e).__name__}, nouvel essai dans {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Annulation (asyncio.CancelledError) : ni succès ni échec, mais l'appel de test est libéré
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[T]],
+                      admit_hedge: Optional[Callable[[], Awaitable[bool]]] = None) -> T:
+        primary = asyncio.ensure_future(asyncio.wait_for(attempt(), self.timeout))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+        if admit_hedge is not None and not await admit_hedge():
+            # Quota local épuisé ou file d'attente non vide : la seconde requête ne part pas
+            self.stats["hedges_skipped"] += 1
+            return await primary
+
+        self.stats["hedges"] += 1
+        set_attributes({"gemini.hedged": True})
+        backup = asyncio.ensure_future(asyncio.wait_for(attempt(), self.timeout))
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            # Les deux requêtes ont échoué : on remonte l'erreur de la première
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "circuit_state": self.breaker.state,
+            "circuit_opens": self.breaker.opens,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+_resilience: Dict[str, Resilience] = {}
+
+def get_resilience(model_name: str) -> Resilience:
+    """Politique partagée par tous les clients d'un même modèle"""
+    if model_name not in _resilience:
+        _resilience[model_name] = Resilience(model_name)
+    return _resilience[model_name]
+
+def get_resilience_stats() -> Dict[str, dict]:
+    return {model_name: resilience.get_stats() for model_name, resilience in _resilience.items()}
@@ -0,0 +1,181 @@
+# app/services/response_cache.py
+import re
+import time
+import hashlib
+import numpy as np
+import faiss
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.core.config import settings
+from app.services.embeddings import Embedder, get_embedder
+from app.services.metrics import record_cache_lookup, span
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalise un prompt pour la clé exacte (casse, espaces)"""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+class _LRU:
+    """Dictionnaire LRU avec expiration (TTL)"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[object, tuple]" = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> list:
+        """Ajoute une entrée et retourne les clés évincées"""
+        self.entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self.entries.move_to_end(key)
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(self.entries.popitem(last=False)[0])
+        return evicted
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+class _SemanticTier:
+    """Questions déjà posées pour un modèle, indexées par embedding"""
+
+    def __init__(self, embedder: Embedder, max_entries: int, ttl_seconds: float):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedder.dimension))
+        self.responses = _LRU(max_entries, ttl_seconds)
+        self.next_id = 0
+
+    def search(self, vector: np.ndarray, threshold: float) -> Optional[str]:
+        if self.index.ntotal == 0:
+            return None
+        scores, ids = self.index.search(vector, 1)
+        if ids[0][0] < 0 or scores[0][0] < threshold:
+            return None
+        entry_id = int(ids[0][0])
+        response = self.responses.get(entry_id)
+        if response is None:
+            # Entrée expirée : on la retire aussi de l'index
+            self.index.remove_ids(np.array([entry_id], dtype='int64'))
+        return response
+
+    def add(self, vector: np.ndarray, response: str) -> int:
+        entry_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vector, np.array([entry_id], dtype='int64'))
+        evicted = self.responses.set(entry_id, response)
+        if evicted:
+            self.index.remove_ids(np.array(evicted, dtype='int64'))
+        return len(evicted)
+
+class ResponseCache:
+    """Cache de réponses à deux niveaux devant les appels Gemini.
+
+    - niveau exact : prompt normalisé + nom du modèle
+    - niveau sémantique : question la plus proche (cosinus) au-dessus d'un seuil
+
+    Les deux niveaux sont bornés (LRU) et expirent après `ttl_seconds`.
+    Le niveau sémantique n'est utilisé que si l'appelant fournit la question
+    (`query`), car seule la question, sans contexte, peut être comparée.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, semantic_threshold: float,
+                 embedder: Optional[Embedder] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.embedder = embedder
+        self.exact = _LRU(max_entries, ttl_seconds)
+        self.semantic: Dict[str, _SemanticTier] = {}
+        # Embeddings calculés lors d'un échec de lecture, réutilisés à l'écriture
+        self._pending_vectors = _LRU(256, 300)
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "bypassed": 0}
+
+    def _key(self, prompt: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\x00{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+
+    async def get(self, prompt: str, model_name: str, query: Optional[str] = None) -> Optional[str]:
+        """Retourne la réponse en cache, ou None"""
+        if not self.enabled:
+            return None
+
+        response = self.exact.get(self._key(prompt, model_name))
+        if response is not None:
+            self.stats["exact_hits"] += 1
+            record_cache_lookup("exact_hit")
+            return response
+
+        tier = self.semantic.get(model_name)
+        if query and self.embedder and tier is not None:
+            with span("embedding"):
+                vector = await self.embedder.embed_query_async(query)
+            self._pending_vectors.set((model_name, query), vector)
+            response = tier.search(vector, self.semantic_threshold)
+            if response is not None:
+                self.stats["semantic_hits"] += 1
+                record_cache_lookup("semantic_hit")
+                return response
+
+        self.stats["misses"] += 1
+        record_cache_lookup("miss")
+        return None
+
+    async def set(self, prompt: str, model_name: str, response: str, query: Optional[str] = None):
+        """Enregistre une réponse dans les deux niveaux"""
+        if not self.enabled:
+            return
+
+        self.stats["evictions"] += len(self.exact.set(self._key(prompt, model_name), response))
+
+        if query and self.embedder:
+            tier = self.semantic.get(model_name)
+            if tier is None:
+                tier = self.semantic[model_name] = _SemanticTier(self.embedder, self.max_entries, self.ttl_seconds)
+            vector = self._pending_vectors.get((model_name, query))
+            if vector is None:
+                with span("embedding"):
+                    vector = await self.embedder.embed_query_async(query)
+            self._pending_vectors.pop((model_name, query))
+            self.stats["evictions"] += tier.add(vector, response)
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+        record_cache_lookup("bypass")
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "exact_entries": len(self.exact.entries),
+            "semantic_entries": sum(len(tier.responses.entries) for tier in self.semantic.values()),
+            "enabled": self.enabled,
+        }
+
+def is_cache_bypassed(*header_values: Optional[str]) -> bool:
+    """Interprète les en-têtes X-Cache-Bypass et Cache-Control (no-cache, no-store)"""
+    for value in header_values:
+        if not value:
+            continue
+        directives = {directive.strip().lower() for directive in value.split(",")}
+        if directives & {"1", "true", "yes", "no-cache", "no-store"}:
+            return True
+    return False
+
+# Instance globale du cache
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL,
+    semantic_threshold=settings.RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+    embedder=get_embedder(),
+    enabled=settings.RESPONSE_CACHE_ENABLED
+)
@@ -0,0 +1,297 @@
+# app/services/sparse_index.py
+import re
+import math
+import heapq
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from app.services.embeddings import STOPWORDS
+
+SPARSE_FILE = "sparse.npz"
+# Version du format et de la tokenisation : un index d'une autre version est reconstruit
+SPARSE_VERSION = 2
+
+# Références d'articles de code : L1221-19, L. 1221-19, R.4624-10, D 3141-1, L1152-1-1
+CITATION_PATTERN = re.compile(r"\b([LRDA])\s?\.?\s?(\d{1,4}(?:-\d+)+|\d{3,4})\b", re.IGNORECASE)
+# Numéros d'articles sans préfixe (Code civil : « article 1240 », « art. 1103 »)
+ARTICLE_NUMBER_PATTERN = re.compile(r"\b(?:articles?|art\.?)\s+(\d{1,4}(?:-\d+)*)\b", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Mots qui accompagnent une référence sans changer la requête (« article L1221-19 »)
+CITATION_FILLERS = {"article", "articles", "art", "alinea", "al", "l", "r", "d", "a"}
+
+def _fold(text: str) -> str:
+    """Minuscules sans accents, pour que « salarié » et « salarie » se rejoignent"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def extract_citations(text: str) -> List[str]:
+    """Références d'articles normalisées (« L. 1221-19 » -> « l1221-19 », « article 1240 » -> « art1240 »)"""
+    citations = [f"{prefix.lower()}{number}" for prefix, number in CITATION_PATTERN.findall(text)]
+    citations.extend(f"art{number}" for number in ARTICLE_NUMBER_PATTERN.findall(text))
+    return citations
+
+def words(text: str) -> List[str]:
+    """Mots sans accents hors mots vides, dans l'ordre du texte"""
+    return [word for word in WORD_PATTERN.findall(_fold(text)) if word not in STOPWORDS]
+
+def tokenize(text: str) -> List[str]:
+    """Termes BM25 : mots, plus les références d'articles gardées entières"""
+    return words(text) + extract_citations(text)
+
+class SparseIndex:
+    """Index inversé BM25 sur les morceaux, indexés par les mêmes ids que l'index FAISS.
+
+    Les postings sont stockés en colonnes (format CSR) : pour chaque terme, une
+    tranche de tableaux numpy (ligne du document, fréquence), et une table des
+    documents (id, longueur) triée par id. Les ajouts récents vont dans des
+    dictionnaires (terme -> {id: fréquence}) et les retraits sont marqués dans
+    un masque, jusqu'au compactage (`compact`, appelé à la sauvegarde) qui
+    fusionne le tout. Les statistiques BM25 (longueur moyenne, fréquence
+    documentaire) sont dérivées au moment de la requête, ce qui rend l'ajout et
+    le retrait incrémentaux sans recalcul global.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Partie compacte : terme -> numéro, postings du terme i dans [offsets[i], offsets[i + 1])
+        self._terms: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype='int64')
+        self._rows = np.empty(0, dtype='int32')
+        self._tfs = np.empty(0, dtype='uint16')
+        self._ids = np.empty(0, dtype='int64')
+        self._lengths = np.empty(0, dtype='int32')
+        self._alive = np.empty(0, dtype=bool)
+        self._removed = 0
+        # Ajouts depuis le dernier compactage
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._ids) - self._removed + len(self.doc_lengths)
+
+    def doc_ids(self) -> np.ndarray:
+        """Ids indexés, triés"""
+        ids = self._ids[self._alive] if self._removed else self._ids
+        recent = np.fromiter(self.doc_lengths, dtype='int64', count=len(self.doc_lengths))
+        return np.sort(np.concatenate([ids, recent]))
+
+    def _base_rows(self, doc_ids: np.ndarray) -> np.ndarray:
+        """Lignes de la partie compacte des ids encore présents"""
+        positions = np.searchsorted(self._ids, doc_ids)
+        found = positions < len(self._ids)
+        found[found] = self._ids[positions[found]] == doc_ids[found]
+        rows = positions[found]
+        return rows[self._alive[rows]]
+
+    def _base_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Lignes et fréquences d'un terme dans la partie compacte, hors documents retirés"""
+        term_id = self._terms.get(term)
+        if term_id is None:
+            return self._rows[:0], self._tfs[:0]
+        start, end = self._offsets[term_id], self._offsets[term_id + 1]
+        rows, tfs = self._rows[start:end], self._tfs[start:end]
+        if self._removed:
+            alive = self._alive[rows]
+            rows, tfs = rows[alive], tfs[alive]
+        return rows, tfs
+
+    def add(self, doc_id: int, text: str):
+        self.remove(doc_id)
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+
+    def add_documents(self, documents: Mapping[int, dict]):
+        for doc_id, doc in documents.items():
+            self.add(doc_id, doc['content'])
+        self.compact()
+
+    def remove_ids(self, doc_ids: Iterable[int]):
+        """Retire des morceaux : marqués dans la partie compacte, effacés des ajouts récents"""
+        doc_ids = [int(doc_id) for doc_id in doc_ids]
+        if not doc_ids:
+            return
+        rows = self._base_rows(np.array(doc_ids, dtype='int64'))
+        if len(rows):
+            rows = np.unique(rows)
+            self._alive[rows] = False
+            self._removed += len(rows)
+            self.total_length -= int(self._lengths[rows].sum())
+
+        stale = {doc_id for doc_id in doc_ids if doc_id in self.doc_lengths}
+        if not stale:
+            return
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for doc_id in stale.intersection(docs):
+                del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+        for doc_id in stale:
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def remove(self, doc_id: int):
+        self.remove_ids([doc_id])
+
+    def _document_frequency(self, term: str) -> int:
+        return len(self._base_postings(term)[0]) + len(self.postings.get(term, ()))
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Meilleurs morceaux au sens de BM25 : [(id, score)], par score décroissant"""
+        n_docs = len(self)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        scores: Dict[int, float] = {}
+        base_rows, base_scores = [], []
+        for term in set(tokenize(query)):
+            rows, tfs = self._base_postings(term)
+            recent = self.postings.get(term, {})
+            df = len(rows) + len(recent)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            if len(rows):
+                tf = tfs.astype('float64')
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[rows] / avg_length)
+                base_rows.append(rows)
+                base_scores.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+            for doc_id, tf in recent.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        if base_rows:
+            # Somme des contributions par document, puis seuls les top_k meilleurs sont convertis
+            rows, inverse = np.unique(np.concatenate(base_rows), return_inverse=True)
+            totals = np.bincount(inverse, weights=np.concatenate(base_scores))
+            best = np.argpartition(-totals, top_k)[:top_k] if len(totals) > top_k else np.arange(len(totals))
+            for row, total in zip(self._ids[rows[best]].tolist(), totals[best].tolist()):
+                scores[row] = total
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def citation_search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Recherche directe d'une requête réduite à des références (« article L1221-19 »).
+
+        Renvoie une liste vide si la requête contient autre chose que des
+        références ou si aucune n'est présente dans le corpus : la recherche
+        hybride prend alors le relais.
+        """
+        citations = extract_citations(query)
+        if not citations:
+            return []
+        cited_words = set()
+        for citation in citations:
+            cited_words.update(WORD_PATTERN.findall(citation))
+        for word in WORD_PATTERN.findall(_fold(query)):
+            if word not in STOPWORDS and word not in CITATION_FILLERS and word not in cited_words and not word.isdigit():
+                return []
+        if not any(self._document_frequency(citation) for citation in citations):
+            return []
+        return self.search(query, top_k)
+
+    def compact(self):
+        """Fusionne les ajouts récents dans la partie compacte et purge les documents retirés"""
+        if not self.doc_lengths and not self._removed:
+            return
+        alive = self._alive
+        n_base = int(alive.sum())
+        ids = np.concatenate([self._ids[alive], np.fromiter(self.doc_lengths, dtype='int64', count=len(self.doc_lengths))])
+        lengths = np.concatenate([self._lengths[alive], np.fromiter(self.doc_lengths.values(), dtype='int32',
+                                                                    count=len(self.doc_lengths))])
+        order = np.argsort(ids, kind='stable')
+        new_row = np.empty(len(ids), dtype='int32')
+        new_row[order] = np.arange(len(ids), dtype='int32')
+
+        # Postings existants, renumérotés
+        term_ids = dict(self._terms)
+        for term in self.postings:
+            term_ids.setdefault(term, len(term_ids))
+        base_new_row = np.full(len(self._ids), -1, dtype='int32')
+        base_new_row[alive] = new_row[:n_base]
+        posting_terms = np.repeat(np.arange(len(self._offsets) - 1, dtype='int32'), np.diff(self._offsets))
+        kept = alive[self._rows]
+        term_parts, row_parts, tf_parts = [posting_terms[kept]], [base_new_row[self._rows[kept]]], [self._tfs[kept]]
+
+        # Ajouts récents
+        recent_row = dict(zip(self.doc_lengths, new_row[n_base:].tolist()))
+        for term, docs in self.postings.items():
+            term_parts.append(np.full(len(docs), term_ids[term], dtype='int32'))
+            row_parts.append(np.fromiter((recent_row[doc_id] for doc_id in docs), dtype='int32', count=len(docs)))
+            tf_parts.append(np.minimum(np.fromiter(docs.values(), dtype='int64', count=len(docs)), 65535).astype('uint16'))
+        posting_terms = np.concatenate(term_parts)
+        order_postings = np.argsort(posting_terms, kind='stable')
+
+        # Les termes sans plus aucun posting sont abandonnés
+        counts = np.bincount(posting_terms, minlength=len(term_ids))
+        used = np.flatnonzero(counts)
+        names = [""] * len(term_ids)
+        for term, term_id in term_ids.items():
+            names[term_id] = term
+        self._terms = {names[term_id]: i for i, term_id in enumerate(used.tolist())}
+        self._offsets = np.concatenate([[0], np.cumsum(counts[used])]).astype('int64')
+        self._rows = np.concatenate(row_parts)[order_postings]
+        self._tfs = np.concatenate(tf_parts)[order_postings]
+        self._ids = ids[order]
+        self._lengths = lengths[order]
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._removed = 0
+        self.postings = {}
+        self.doc_lengths = {}
+        self.total_length = int(self._lengths.sum())
+
+    @property
+    def nbytes(self) -> int:
+        """Taille des tableaux de la partie compacte (hors vocabulaire et ajouts récents)"""
+        return sum(array.nbytes for array in (self._offsets, self._rows, self._tfs, self._ids, self._lengths, self._alive))
+
+    def save(self, path: str):
+        """Compacte puis écrit les tableaux (npz non compressé)"""
+        self.compact()
+        names = sorted(self._terms, key=self._terms.get)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                version=np.array(SPARSE_VERSION),
+                terms=np.frombuffer("\n".join(names).encode('utf-8'), dtype='uint8'),
+                offsets=self._offsets, rows=self._rows, tfs=self._tfs, ids=self._ids, lengths=self._lengths,
+            )
+
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> "SparseIndex":
+        """Charge l'index persisté ; lève ValueError s'il provient d'une autre version"""
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["version"]) if "version" in data.files else None
+            if version != SPARSE_VERSION:
+                raise ValueError(f"Index BM25 en version {version}, attendu {SPARSE_VERSION}")
+            index = cls(k1, b)
+            terms = data["terms"].tobytes().decode('utf-8')
+            index._terms = {term: i for i, term in enumerate(terms.split("\n"))} if terms else {}
+            index._offsets = data["offsets"]
+            index._rows = data["rows"]
+            index._tfs = data["tfs"]
+            index._ids = data["ids"]
+            index._lengths = data["lengths"]
+        index._alive = np.ones(len(index._ids), dtype=bool)
+        index.total_length = int(index._lengths.sum())
+        return index
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[int, float]]:
+    """Fusionne des classements (listes d'ids) par Reciprocal Rank Fusion.
+
+    Chaque liste contribue poids / (k + rang) (poids 1 par défaut) ; le score
+    est ramené entre 0 et 1 (1 = premier dans tous les classements) pour
+    rester lisible côté client.
+    """
+    weights = [1.0] * len(rankings) if weights is None else weights
+    scores: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (k + rank)
+    best = sum(weights) / (k + 1.0) if rankings and sum(weights) else 1.0
+    return sorted(((doc_id, score / best) for doc_id, score in scores.items()), key=lambda item: -item[1])
@@ -0,0 +1,65 @@
+# app/services/streaming.py
+import json
+import time
+import inspect
+from typing import AsyncIterator, Callable, List, Optional
+from fastapi.responses import StreamingResponse
+from app.services.resilience import upstream_status
+
+# En-têtes pour éviter la mise en tampon par les proxys (nginx, Railway...)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+def sse_event(event: str, data) -> str:
+    """Formate un événement Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def stream_completion(
+    chunks: AsyncIterator[str],
+    sources: Optional[List[dict]] = None,
+    on_complete: Optional[Callable[[str], dict]] = None,  # peut être une coroutine
+) -> AsyncIterator[str]:
+    """Relaie les fragments du modèle en SSE.
+
+    Les sources sont envoyées avant le premier fragment (événement `sources`),
+    chaque fragment dans un événement `token`, et les temps de réponse dans
+    l'événement final `done`.
+    """
+    start_time = time.time()
+    if sources is not None:
+        yield sse_event("sources", sources)
+    
+    first_token_time = None
+    parts = []
+    try:
+        async for text in chunks:
+            if first_token_time is None:
+                first_token_time = round(time.time() - start_time, 3)
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        print(f"Erreur pendant le streaming: {e}")
+        error = {"detail": str(e)}
+        status = upstream_status(e)
+        if status is not None:
+            # Gemini indisponible : même statut et délai que les endpoints JSON (429/503 + Retry-After)
+            error.update(status=status[0], retry_after=int(status[1]))
+        yield sse_event("error", error)
+        return
+    
+    done = {
+        "first_token_time": first_token_time,
+        "total_time": round(time.time() - start_time, 3),
+    }
+    if on_complete:
+        extra = on_complete("".join(parts))
+        if inspect.isawaitable(extra):
+            extra = await extra
+        done.update(extra)
+    yield sse_event("done", done)
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Construit la réponse HTTP text/event-stream"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
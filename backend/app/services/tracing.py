@@ -0,0 +1,162 @@
+# app/services/tracing.py
+import os
+import sys
+import time
+import asyncio
+import functools
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+from fastapi.routing import APIRoute, request_response
+from opentelemetry import context as otel_context, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.routing import Match
+from app.core.config import settings
+
+# Traceur proxy : sans exportateur configuré, les spans ne coûtent presque rien
+tracer = trace.get_tracer("legal-llm")
+_enabled = False
+
+def configure_tracing() -> bool:
+    """Installe l'exportateur configuré (TRACING_EXPORTER) ; une fois par processus"""
+    global _enabled
+    if _enabled or not settings.TRACING_EXPORTER:
+        return _enabled
+
+    if settings.TRACING_EXPORTER == "console":
+        out = sys.stdout
+    elif settings.TRACING_EXPORTER == "file":
+        out = open(settings.TRACING_FILE_PATH, "a", encoding="utf-8")
+    else:
+        raise ValueError(f"Exportateur de traces inconnu : {settings.TRACING_EXPORTER}")
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME, "process.pid": os.getpid()}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO))
+    )
+    # Un span JSON par ligne, exploitable hors ligne (benchmarks/trace_report.py)
+    exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _enabled = True
+    return _enabled
+
+@contextmanager
+def start_span(name: str, attributes: Optional[dict] = None, new_trace: bool = False) -> Iterator[trace.Span]:
+    """Span enfant du span courant (ou racine d'une nouvelle trace) ; les exceptions y sont enregistrées"""
+    parent = otel_context.Context() if new_trace else None
+    with tracer.start_as_current_span(name, context=parent, attributes=attributes) as current:
+        yield current
+
+def set_attributes(attributes: dict):
+    """Ajoute des attributs au span courant (sans effet hors trace)"""
+    current = trace.get_current_span()
+    if current.is_recording():
+        current.set_attributes(attributes)
+
+def route_template(scope: dict) -> str:
+    """Gabarit de la route (cardinalité bornée), ou "unmatched" """
+    partial: Optional[str] = None
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+@dataclass
+class _Phases:
+    """Instants (ns) qui délimitent lecture de la requête, handler et sérialisation"""
+    start: int = 0
+    handler_start: Optional[int] = None
+    handler_end: Optional[int] = None
+    response_start: Optional[int] = None
+
+_phases: "contextvars.ContextVar[Optional[_Phases]]" = contextvars.ContextVar("trace_phases", default=None)
+
+def _record_phase(name: str, start: Optional[int], end: Optional[int]):
+    if start is not None and end is not None and end >= start:
+        tracer.start_span(name, start_time=start).end(end_time=end)
+
+class TracingMiddleware:
+    """Middleware ASGI : un span racine par requête HTTP.
+
+    Sous la racine, `request.parsing` couvre la lecture et la validation du
+    corps jusqu'à l'entrée dans le handler, `response.serialization` la
+    sortie du handler jusqu'à l'envoi des en-têtes (voir TracedRoute) ; le
+    streaming du corps reste compté dans la racine.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(scope)
+        phases = _Phases()
+        token = _phases.set(phases)
+        attributes = {"http.request.method": scope["method"], "http.route": route, "url.path": scope["path"]}
+        with tracer.start_as_current_span(f"{scope['method']} {route}", kind=SpanKind.SERVER, attributes=attributes) as root:
+            phases.start = time.time_ns()
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    phases.response_start = time.time_ns()
+                    root.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        root.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                _record_phase("request.parsing", phases.start, phases.handler_start or phases.response_start)
+                _record_phase("response.serialization", phases.handler_end, phases.response_start)
+                _phases.reset(token)
+
+def _traced_handler(call: Callable) -> Callable:
+    name = f"handler {getattr(call, '__name__', 'endpoint')}"
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            phases = _phases.get()
+            if phases is not None:
+                phases.handler_start = time.time_ns()
+            try:
+                with tracer.start_as_current_span(name):
+                    return await call(*args, **kwargs)
+            finally:
+                if phases is not None:
+                    phases.handler_end = time.time_ns()
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        phases = _phases.get()
+        if phases is not None:
+            phases.handler_start = time.time_ns()
+        try:
+            with tracer.start_as_current_span(name):
+                return call(*args, **kwargs)
+        finally:
+            if phases is not None:
+                phases.handler_end = time.time_ns()
+    return wrapper
+
+class TracedRoute(APIRoute):
+    """Route FastAPI dont le handler est encadré d'un span et dont les phases sont horodatées"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependant.call = _traced_handler(self.dependant.call)
+        self.app = request_response(self.get_route_handler())
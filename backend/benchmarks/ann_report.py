@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Rapport rappel / latence / mémoire des types d'index FAISS, comparés à l'index exact (flat).
+
+Usage (depuis backend/) :
+    python -m benchmarks.ann_report --index-dir index
+    python -m benchmarks.ann_report --synthetic 200000 --dimension 384 --output ann_report.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ann_index import configure_search, export_vectors, rebuild_index, index_factory_string
+from app.services.embeddings import l2_normalize
+
+# Réglages balayés pour chaque type d'index
+SWEEPS = {
+    "flat": [{}],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)],
+    "ivf_flat": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+    "ivf_pq": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+}
+
+def synthetic_vectors(n: int, dimension: int, seed: int) -> np.ndarray:
+    """Vecteurs regroupés en thèmes, plus proches d'un corpus réel qu'un bruit uniforme"""
+    rng = np.random.default_rng(seed)
+    n_topics = max(1, int(np.sqrt(n)))
+    centers = rng.standard_normal((n_topics, dimension)).astype('float32')
+    topics = rng.integers(0, n_topics, n)
+    vectors = centers[topics] + 0.5 * rng.standard_normal((n, dimension)).astype('float32')
+    return l2_normalize(vectors)
+
+def load_index_vectors(index_dir: str) -> np.ndarray:
+    index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+    _, vectors = export_vectors(index)
+    return np.ascontiguousarray(vectors, dtype='float32')
+
+def make_queries(vectors: np.ndarray, n_queries: int, seed: int) -> np.ndarray:
+    """Requêtes proches de vecteurs du corpus (perturbés), comme des questions reformulées"""
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    return l2_normalize(picks + 0.1 * rng.standard_normal(picks.shape).astype('float32'))
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def measure(index, queries: np.ndarray, k: int) -> dict:
+    """Latence requête par requête (p50/p95) et débit en lot"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[np.newaxis, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_time = time.perf_counter() - start
+    return {
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 4),
+        "batch_qps": round(len(queries) / batch_time, 1) if batch_time else None,
+        "found": found,
+    }
+
+def run_report(vectors: np.ndarray, n_queries: int, k: int, types, seed: int) -> dict:
+    n, dimension = vectors.shape
+    ids = np.arange(n, dtype='int64')
+    queries = make_queries(vectors, n_queries, seed)
+
+    exact = rebuild_index("flat", dimension, ids, vectors)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in types:
+        start = time.perf_counter()
+        index = rebuild_index(index_type, dimension, ids, vectors)
+        build_time = time.perf_counter() - start
+        memory = len(faiss.serialize_index(index))
+        for params in SWEEPS[index_type]:
+            configure_search(index, params.get("nprobe"), params.get("ef_search"))
+            stats = measure(index, queries, k)
+            results.append({
+                "index_type": index_type,
+                "factory": index_factory_string(index_type, dimension, n),
+                "params": params,
+                "build_time_s": round(build_time, 3),
+                "memory_mb": round(memory / 1e6, 2),
+                f"recall@{k}": round(recall_at_k(stats.pop("found"), truth), 4),
+                **stats,
+            })
+
+    return {"vectors": n, "dimension": dimension, "queries": len(queries), "k": k, "results": results}
+
+def print_report(report: dict):
+    k = report["k"]
+    print(f"\n{report['vectors']} vecteurs, dimension {report['dimension']}, {report['queries']} requêtes, k={k}\n")
+    print(f"{'type':<10}{'réglage':<18}{'recall@' + str(k):>10}{'p50 ms':>10}{'p95 ms':>10}{'qps lot':>12}{'Mo':>10}{'build s':>10}")
+    for row in report["results"]:
+        params = ", ".join(f"{key}={value}" for key, value in row["params"].items()) or "-"
+        print(f"{row['index_type']:<10}{params:<18}{row[f'recall@{k}']:>10}{row['latency_p50_ms']:>10}"
+              f"{row['latency_p95_ms']:>10}{row['batch_qps']:>12}{row['memory_mb']:>10}{row['build_time_s']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rappel, latence et mémoire des index FAISS")
+    parser.add_argument("--index-dir", help="Répertoire d'un index persisté à évaluer")
+    parser.add_argument("--synthetic", type=int, default=50000, help="Nombre de vecteurs synthétiques")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--types", default="flat,hnsw,ivf_flat,ivf_pq")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    if args.index_dir:
+        vectors = load_index_vectors(args.index_dir)
+    else:
+        vectors = synthetic_vectors(args.synthetic, args.dimension, args.seed)
+
+    report = run_report(vectors, args.queries, args.k, args.types.split(","), args.seed)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRésultats enregistrés dans {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Faux serveur Gemini (API REST generateContent / streamGenerateContent) pour tester
+la résilience et mesurer les performances sans quota ni réseau.
+
+Latence, débit du streaming, erreurs 503 et limitations 429 (avec Retry-After) sont
+injectables. Les embeddings (embedContent, batchEmbedContents) sont simulés par un
+sac de mots haché, pour que le cache sémantique et la recherche tournent hors ligne ;
+les demandes de reranking reçoivent des notes JSON. Pour y diriger le backend :
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8100 GEMINI_API_KEY=fake uvicorn main:app
+
+Usage (depuis backend/) :
+    python -m benchmarks.fake_gemini --port 8100 --latency 0.8 --error-rate 0.1 --rate-limit-rate 0.05
+"""
+
+import re
+import json
+import zlib
+import time
+import random
+import argparse
+import threading
+from dataclasses import dataclass
+from typing import Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Demande de notation groupée du reranker LLM (app/services/reranker.py)
+RERANK_PATTERN = re.compile(r"avec exactement (\d+) notes")
+
+WORDS = ("contrat", "article", "clause", "obligation", "partie", "code", "civil", "travail", "délai",
+         "résiliation", "préavis", "indemnité", "juridiction", "responsabilité", "conformément")
+
+@dataclass
+class FakeGeminiConfig:
+    latency: float = 0.5  # secondes avant la réponse (ou le premier fragment)
+    jitter: float = 0.1  # variation aléatoire de la latence, en secondes
+    error_rate: float = 0.0  # part des requêtes en 503
+    rate_limit_rate: float = 0.0  # part des requêtes en 429
+    retry_after: float = 1.0  # Retry-After des réponses 429, en secondes
+    response_tokens: int = 200  # longueur des réponses, en mots
+    chunks: int = 8  # fragments par réponse streamée
+    chunk_delay: float = 0.05  # secondes entre deux fragments
+    seed: int = 0
+    unavailable_models: Tuple[str, ...] = ()  # modèles toujours en 503 (test de bascule du routeur)
+    embedding_latency: float = 0.02  # secondes par appel d'embedding
+    embedding_dimension: int = 768
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: FakeGeminiConfig):
+        super().__init__(address, FakeGeminiHandler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def draw(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeGeminiServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, code: str, message: str, headers=None):
+        self._send_json(status, {"error": {"code": status, "message": message, "status": code}}, headers)
+
+    def _text(self, prompt_tokens: int) -> str:
+        rng = random.Random(prompt_tokens)
+        return " ".join(rng.choice(WORDS) for _ in range(self.server.config.response_tokens))
+
+    def _candidate(self, text: str, finish: bool, prompt_tokens: int, output_tokens: int) -> dict:
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if finish:
+            candidate["finishReason"] = "STOP"
+        return {
+            "candidates": [candidate],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+        }
+
+    def do_POST(self):
+        config = self.server.config
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+
+        embed = re.match(r"^/v1beta/models/([^/:]+):(embedContent|batchEmbedContents)", self.path)
+        if embed:
+            self._embed(embed.group(2), json.loads(body or b"{}"))
+            return
+
+        match = re.match(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)", self.path)
+        if not match:
+            # Cache de contexte, embeddings... non simulés : le backend bascule sur son repli
+            self._error(404, "NOT_FOUND", f"Méthode non simulée : {self.path}")
+            return
+
+        if match.group(1) in config.unavailable_models:
+            with self.server.lock:
+                self.server.stats["errors"] += 1
+            self._error(503, "UNAVAILABLE", f"{match.group(1)} is unavailable (fake)")
+            return
+
+        draw = self.server.draw()
+        if draw < config.rate_limit_rate:
+            with self.server.lock:
+                self.server.stats["rate_limited"] += 1
+            self._error(429, "RESOURCE_EXHAUSTED", "Quota exceeded (fake)",
+                        {"Retry-After": str(config.retry_after)})
+            return
+        if draw < config.rate_limit_rate + config.error_rate:
+            with self.server.lock:
+                self.server.stats["errors"] += 1
+            time.sleep(config.latency / 2)
+            self._error(503, "UNAVAILABLE", "The model is overloaded (fake)")
+            return
+
+        time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+        prompt_tokens = max(1, len(body) // 4)
+        rerank = RERANK_PATTERN.search(body.decode('utf-8', errors='ignore'))
+        if rerank:
+            rng = random.Random(prompt_tokens)
+            text = json.dumps({"scores": [rng.randint(0, 10) for _ in range(int(rerank.group(1)))]})
+        else:
+            text = self._text(prompt_tokens)
+        output_tokens = len(text.split())
+
+        if match.group(2) == "generateContent":
+            self._send_json(200, self._candidate(text, True, prompt_tokens, output_tokens))
+            return
+
+        # streamGenerateContent : tableau JSON transmis fragment par fragment
+        words = text.split(" ")
+        size = max(1, len(words) // max(1, config.chunks))
+        pieces = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            prefix = "[" if i == 0 else ",\r\n"
+            data = prefix + json.dumps(self._candidate(piece, last, prompt_tokens, output_tokens)) + ("]" if last else "")
+            self._write_chunk(data.encode('utf-8'))
+            if not last:
+                time.sleep(config.chunk_delay)
+        self._write_chunk(b"")
+
+    def _vector(self, content: dict) -> list:
+        """Sac de mots haché : deux textes proches donnent des vecteurs proches"""
+        dimension = self.server.config.embedding_dimension
+        vector = [0.0] * dimension
+        text = " ".join(part.get("text", "") for part in content.get("parts", []))
+        for word in re.findall(r"\w+", text.lower()):
+            h = zlib.crc32(word.encode('utf-8'))
+            vector[h % dimension] += 1.0 if h & 0x80000000 else -1.0
+        return vector
+
+    def _embed(self, method: str, body: dict):
+        time.sleep(self.server.config.embedding_latency)
+        if method == "embedContent":
+            self._send_json(200, {"embedding": {"values": self._vector(body.get("content", {}))}})
+        else:
+            embeddings = [{"values": self._vector(request.get("content", {}))} for request in body.get("requests", [])]
+            self._send_json(200, {"embeddings": embeddings})
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+def start_fake_gemini(config: FakeGeminiConfig = None, host: str = "127.0.0.1", port: int = 0) -> FakeGeminiServer:
+    """Démarre le faux serveur dans un thread (port 0 = port libre) ; `server.url` donne son adresse"""
+    server = FakeGeminiServer((host, port), config or FakeGeminiConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Gemini à latence et erreurs injectables")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--unavailable-model", action="append", default=[],
+                        help="Modèle toujours en 503 (répétable)")
+    args = parser.parse_args()
+
+    config = FakeGeminiConfig(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        response_tokens=args.response_tokens, chunks=args.chunks, chunk_delay=args.chunk_delay, seed=args.seed,
+        unavailable_models=tuple(args.unavailable_model)
+    )
+    server = FakeGeminiServer((args.host, args.port), config)
+    print(f"Faux serveur Gemini sur {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nRequêtes : {server.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Test de charge du backend contre le faux serveur Gemini (benchmarks/fake_gemini.py).
+
+Démarre le faux Gemini (latence, streaming et erreurs injectables) puis l'API
+(uvicorn main:app) pointée dessus, et sollicite chaque endpoint à concurrence
+fixe pendant une durée donnée : débit, latence p50/p95/p99, premier fragment des
+flux, réactivité de la boucle d'événements (sonde /health) et mémoire du serveur.
+Les résultats sont écrits en JSON et comparables d'un commit à l'autre.
+
+Usage (depuis backend/) :
+    python -m benchmarks.load_test --scenarios chat,search,generate --concurrency 32 --duration 20 --output load.json
+    python -m benchmarks.load_test --gemini-latency 1.5 --error-rate 0.05 --compare load.json --max-regression 0.2
+    python -m benchmarks.load_test --target http://127.0.0.1:8000 --scenarios search-stream
+
+Nécessite httpx (déjà requis par fastapi.testclient).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from typing import Callable, Dict, List, Optional
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_gemini import FakeGeminiConfig, start_fake_gemini
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = (
+    "Quel est le délai de préavis en cas de démission ?",
+    "Comment rompre une période d'essai ?",
+    "Quelles sont les conditions d'une clause de non-concurrence ?",
+    "Un employeur peut-il modifier unilatéralement le contrat de travail ?",
+    "Quelle indemnité en cas de licenciement sans cause réelle et sérieuse ?",
+    "Quels recours contre un bailleur qui refuse de restituer le dépôt de garantie ?",
+    "Quelle est la durée de la garantie des vices cachés ?",
+    "Comment mettre en demeure un débiteur ?",
+)
+
+DOCUMENT_TYPES = ("contrat", "mise_en_demeure", "attestation")
+
+def _question(rng: random.Random, counter: int, repeat_ratio: float) -> str:
+    """Question récurrente (servie par le cache) avec la probabilité `repeat_ratio`, sinon unique"""
+    question = rng.choice(QUESTIONS)
+    return question if rng.random() < repeat_ratio else f"{question} (cas n°{counter})"
+
+def chat_payload(rng: random.Random, counter: int, repeat_ratio: float) -> dict:
+    message = _question(rng, counter, repeat_ratio)
+    if rng.random() < repeat_ratio:
+        return {"message": message, "historique": []}
+    historique = [
+        {"role": "user", "content": rng.choice(QUESTIONS)},
+        {"role": "assistant", "content": "Le Code du travail prévoit plusieurs cas. " * 20},
+    ]
+    return {"message": message, "historique": historique}
+
+def search_payload(rng: random.Random, counter: int, repeat_ratio: float) -> dict:
+    return {"question": _question(rng, counter, repeat_ratio)}
+
+def generate_payload(rng: random.Random, counter: int, repeat_ratio: float) -> dict:
+    employe = "Jean Dupont" if rng.random() < repeat_ratio else f"Salarié {counter}"
+    return {
+        "type_document": rng.choice(DOCUMENT_TYPES),
+        "parametres": {"employeur": "Cabinet Martin", "employe": employe, "poste": "Juriste", "salaire": "42000"},
+    }
+
+# Scénario -> (chemin, générateur de corps, réponse streamée en SSE)
+SCENARIOS: Dict[str, tuple] = {
+    "chat": ("/api/v1/chat", chat_payload, False),
+    "search": ("/api/v1/legal-search", search_payload, False),
+    "generate": ("/api/v1/generate-document", generate_payload, False),
+    "chat-stream": ("/api/v1/chat/stream", chat_payload, True),
+    "search-stream": ("/api/v1/legal-search/stream", search_payload, True),
+    "generate-stream": ("/api/v1/generate-document/stream", generate_payload, True),
+}
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+
+def latency_summary(values: List[float]) -> dict:
+    return {
+        "p50_ms": percentile(values, 0.50),
+        "p95_ms": percentile(values, 0.95),
+        "p99_ms": percentile(values, 0.99),
+        "max_ms": round(max(values) * 1000, 1) if values else None,
+        "mean_ms": round(sum(values) / len(values) * 1000, 1) if values else None,
+    }
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """RSS du processus et de ses enfants (workers uvicorn), via /proc (Linux)"""
+    pids, total = [pid], 0
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        for current in pids:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+    except (OSError, ValueError):
+        return None
+    return round(total / 1024, 1)
+
+class Phase:
+    """Mesures d'une phase : échantillons par scénario, sonde de boucle, mémoire"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.first_chunks: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.probe: List[float] = []
+        self.rss: List[float] = []
+        self.measuring = False
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def record(self, scenario: str, status: str, latency: float, first_chunk: Optional[float]):
+        if not self.measuring:
+            return
+        statuses = self.statuses.setdefault(scenario, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "200":
+            self.latencies.setdefault(scenario, []).append(latency)
+            if first_chunk is not None:
+                self.first_chunks.setdefault(scenario, []).append(first_chunk)
+
+    def summary(self) -> dict:
+        scenarios = {}
+        for scenario, statuses in self.statuses.items():
+            total = sum(statuses.values())
+            ok = statuses.get("200", 0)
+            result = {
+                "requests": total,
+                "errors": total - ok,
+                "error_rate": round((total - ok) / total, 4) if total else 0.0,
+                "throughput_rps": round(ok / self.elapsed, 2) if self.elapsed else 0.0,
+                "statuses": statuses,
+                "latency": latency_summary(self.latencies.get(scenario, [])),
+            }
+            if scenario in self.first_chunks:
+                result["first_chunk"] = latency_summary(self.first_chunks[scenario])
+            scenarios[scenario] = result
+        return {
+            "duration_s": round(self.elapsed, 2),
+            "scenarios": scenarios,
+            # Une boucle d'événements bloquée (appel synchrone, FAISS...) fait grimper /health
+            "event_loop_probe": latency_summary(self.probe),
+            "server_rss_mb": {
+                "start": self.rss[0] if self.rss else None,
+                "peak": max(self.rss) if self.rss else None,
+                "end": self.rss[-1] if self.rss else None,
+            },
+        }
+
+async def _request(client: httpx.AsyncClient, phase: Phase, scenario: str, payload: dict):
+    path, _, streamed = SCENARIOS[scenario]
+    start = time.perf_counter()
+    first_chunk = None
+    try:
+        if streamed:
+            async with client.stream("POST", path, json=payload) as response:
+                async for _ in response.aiter_bytes():
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                status = str(response.status_code)
+        else:
+            response = await client.post(path, json=payload)
+            status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    phase.record(scenario, status, time.perf_counter() - start, first_chunk)
+
+async def _user(client: httpx.AsyncClient, phase: Phase, scenarios: List[str], deadline: float,
+                rng: random.Random, repeat_ratio: float, counter: Callable[[], int]):
+    """Utilisateur en boucle fermée : une requête à la fois, sans temps de réflexion"""
+    while time.perf_counter() < deadline:
+        scenario = rng.choice(scenarios)
+        payload = SCENARIOS[scenario][1](rng, counter(), repeat_ratio)
+        await _request(client, phase, scenario, payload)
+
+async def _probe(client: httpx.AsyncClient, phase: Phase, deadline: float, interval: float = 0.1):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            await client.get("/health")
+            if phase.measuring:
+                phase.probe.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+async def _sample_memory(phase: Phase, pid: Optional[int], deadline: float, interval: float = 0.5):
+    while pid and time.perf_counter() < deadline:
+        rss = process_rss_mb(pid)
+        if rss is not None and phase.measuring:
+            phase.rss.append(rss)
+        await asyncio.sleep(interval)
+
+async def run_phase(target: str, scenarios: List[str], concurrency: int, duration: float, warmup: float,
+                    repeat_ratio: float, seed: int, server_pid: Optional[int]) -> dict:
+    phase = Phase()
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=target, timeout=300, limits=limits) as client:
+        deadline = time.perf_counter() + warmup + duration
+        counter = iter(range(10 ** 9))
+
+        async def start_measuring():
+            await asyncio.sleep(warmup)
+            phase.measuring = True
+            phase.started = time.perf_counter()
+
+        users = [
+            _user(client, phase, scenarios, deadline, random.Random(seed + i), repeat_ratio, lambda: next(counter))
+            for i in range(concurrency)
+        ]
+        await asyncio.gather(start_measuring(), _probe(client, phase, deadline),
+                             _sample_memory(phase, server_pid, deadline), *users)
+        # Les requêtes en vol à l'échéance terminent après `deadline` : elles comptent dans la durée
+        phase.elapsed = time.perf_counter() - phase.started
+    return phase.summary()
+
+def start_server(port: int, fake_url: str, workers: int, env_overrides: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_ENDPOINT": fake_url,
+        "GEMINI_API_KEY": "fake-key",
+        "GOOGLE_API_KEY": "fake-key",
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.update(env_overrides)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+def wait_until_ready(target: str, server: Optional[subprocess.Popen], timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté (code {server.returncode})")
+        try:
+            if httpx.get(f"{target}/health", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{target} ne répond pas après {timeout}s")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: dict, current: dict, max_regression: float) -> List[str]:
+    """Régressions de p95 ou de débit au-delà de `max_regression` (fraction), phase par phase"""
+    regressions = []
+    print(f"\n{'phase / scénario':<32} {'p95 avant':>10} {'p95 après':>10} {'débit avant':>12} {'débit après':>12}")
+    for phase_name, phase in current["phases"].items():
+        base_phase = baseline.get("phases", {}).get(phase_name)
+        if base_phase is None:
+            continue
+        for scenario, result in phase["scenarios"].items():
+            base = base_phase["scenarios"].get(scenario)
+            if base is None:
+                continue
+            before_p95, after_p95 = base["latency"]["p95_ms"], result["latency"]["p95_ms"]
+            before_rps, after_rps = base["throughput_rps"], result["throughput_rps"]
+            print(f"{phase_name + ' / ' + scenario:<32} {before_p95!s:>10} {after_p95!s:>10} {before_rps:>12} {after_rps:>12}")
+            if before_p95 and after_p95 and after_p95 > before_p95 * (1 + max_regression):
+                regressions.append(f"{phase_name}/{scenario}: p95 {before_p95} -> {after_p95} ms")
+            if before_rps and after_rps < before_rps * (1 - max_regression):
+                regressions.append(f"{phase_name}/{scenario}: débit {before_rps} -> {after_rps} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'API contre un faux serveur Gemini")
+    parser.add_argument("--scenarios", default="chat,search,generate",
+                        help=f"Scénarios, une phase chacun ({', '.join(SCENARIOS)})")
+    parser.add_argument("--mixed", action="store_true", help="Ajoute une phase où tous les scénarios tournent ensemble")
+    parser.add_argument("--concurrency", type=int, default=16, help="Utilisateurs simultanés par phase")
+    parser.add_argument("--duration", type=float, default=15, help="Durée mesurée par phase (s)")
+    parser.add_argument("--warmup", type=float, default=3, help="Échauffement non mesuré par phase (s)")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="Part des requêtes répétées (cache)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", help="API déjà démarrée (sinon uvicorn main:app est lancé)")
+    parser.add_argument("--server-pid", type=int, help="PID de l'API --target, pour suivre sa mémoire")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="Workers uvicorn")
+    parser.add_argument("--env", action="append", default=[], metavar="CLÉ=VALEUR",
+                        help="Variable d'environnement du serveur (répétable)")
+    parser.add_argument("--fake-url", help="Faux Gemini déjà démarré (sinon démarré dans ce processus)")
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--response-tokens", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=8)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Dégradation tolérée (p95, débit) avant échec, en fraction")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(unknown)}")
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+
+    fake_config = FakeGeminiConfig(
+        latency=args.gemini_latency, jitter=args.gemini_jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, response_tokens=args.response_tokens,
+        chunks=args.chunks, chunk_delay=args.chunk_delay, seed=args.seed
+    )
+    fake = None
+    if args.target is None and args.fake_url is None:
+        fake = start_fake_gemini(fake_config)
+    fake_url = args.fake_url or (fake.url if fake else None)
+
+    server = None
+    target = args.target
+    server_pid = args.server_pid
+    if target is None:
+        server = start_server(args.port, fake_url, args.workers, env_overrides)
+        target = f"http://127.0.0.1:{args.port}"
+        server_pid = server.pid
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "scenarios": scenarios, "mixed": args.mixed, "concurrency": args.concurrency,
+                "duration_s": args.duration, "warmup_s": args.warmup, "repeat_ratio": args.repeat_ratio,
+                "workers": args.workers, "env": env_overrides, "target": args.target,
+                "fake_gemini": None if args.target else vars(fake_config),
+            },
+        },
+        "phases": {},
+    }
+    phases = [(name, [name]) for name in scenarios]
+    if args.mixed and len(scenarios) > 1:
+        phases.append(("mixed", scenarios))
+
+    try:
+        wait_until_ready(target, server)
+        for name, phase_scenarios in phases:
+            print(f"▶ Phase {name} : {args.concurrency} utilisateurs, {args.duration}s")
+            summary = asyncio.run(run_phase(
+                target, phase_scenarios, args.concurrency, args.duration, args.warmup,
+                args.repeat_ratio, args.seed, server_pid
+            ))
+            results["phases"][name] = summary
+            for scenario, result in summary["scenarios"].items():
+                latency = result["latency"]
+                print(f"  {scenario:<16} {result['throughput_rps']:>8} req/s  p50 {latency['p50_ms']} ms  "
+                      f"p95 {latency['p95_ms']} ms  p99 {latency['p99_ms']} ms  erreurs {result['error_rate']:.1%}")
+            print(f"  boucle d'événements p99 {summary['event_loop_probe']['p99_ms']} ms, "
+                  f"RSS max {summary['server_rss_mb']['peak']} Mo")
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if fake is not None:
+            results["meta"]["fake_gemini_requests"] = fake.stats
+            fake.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.output}")
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.max_regression)
+        if regressions:
+            print("\n❌ Régressions :\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n✅ Pas de régression au-delà du seuil")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai de la recherche documentaire : pertinence (recall@k, MRR) et coût
+(construction, mémoire, latence) par embedder et par type d'index FAISS.
+
+Un corpus juridique synthétique (articles par domaine, chacun porteur de faits
+propres : parties, montants, délais) et un jeu de questions étiquetées sont
+générés de façon déterministe à partir de la graine ; chaque question vise un
+seul passage. Tout tourne hors ligne : l'embedder "fake-gemini" passe par le
+faux serveur Gemini local (benchmarks/fake_gemini.py).
+
+Les index sont construits comme par IndexStore (ann_index.rebuild_index) et
+interrogés avec les réglages de production (INDEX_NPROBE, INDEX_EF_SEARCH),
+ou balayés avec --sweep. Avec --hybrid, l'index BM25 seul et sa fusion RRF
+avec chaque index FAISS (comme search_documents) sont mesurés en plus ; la
+fusion utilise le poids FAISS de production (HYBRID_DENSE_WEIGHT, 0 par
+défaut pour l'embedder haché : la ligne fusionnée est alors celle de BM25).
+
+Usage (depuis backend/) :
+    python -m benchmarks.retrieval_bench --sizes 1000,10000,100000 --output retrieval.json
+    python -m benchmarks.retrieval_bench --sizes 1000000 --types hnsw,ivf_pq --cache-dir .bench_cache
+    python -m benchmarks.retrieval_bench --embedders hashing-384,hashing-768,fake-gemini --sweep
+    python -m benchmarks.retrieval_bench --sizes 10000 --types flat,hnsw --hybrid
+
+Pour des résultats identiques d'une exécution à l'autre : --threads 1 (la
+construction HNSW multithread n'est pas déterministe).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import platform
+from typing import Dict, List, Tuple
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.ann_index import INDEX_TYPES, configure_search, index_factory_string, rebuild_index
+from app.services.embeddings import Embedder, GeminiEmbedder, HashingEmbedder, hybrid_dense_weight
+from app.services.sparse_index import SparseIndex, reciprocal_rank_fusion
+from benchmarks.ann_report import SWEEPS, measure
+from benchmarks.load_test import git_commit, process_rss_mb
+
+# Domaines du corpus : termes propres à chacun (les passages d'un même domaine se ressemblent)
+DOMAINS = {
+    "travail": ("salarié", "employeur", "licenciement", "préavis", "contrat de travail", "période d'essai",
+                "rupture conventionnelle", "heures supplémentaires", "congés payés", "conseil de prud'hommes"),
+    "bail": ("locataire", "bailleur", "loyer", "dépôt de garantie", "congé pour vente", "état des lieux",
+             "charges locatives", "révision du loyer", "bail commercial", "clause résolutoire"),
+    "consommation": ("consommateur", "professionnel", "droit de rétractation", "garantie légale de conformité",
+                     "clause abusive", "démarchage", "crédit à la consommation", "vente à distance",
+                     "vice caché", "remboursement"),
+    "societes": ("associé", "gérant", "assemblée générale", "capital social", "cession de parts", "dividendes",
+                 "statuts", "responsabilité du dirigeant", "dissolution", "commissaire aux comptes"),
+    "famille": ("divorce", "pension alimentaire", "autorité parentale", "résidence de l'enfant",
+                "prestation compensatoire", "régime matrimonial", "pacte civil de solidarité", "filiation",
+                "succession", "donation"),
+    "responsabilite": ("dommage", "faute", "préjudice", "lien de causalité", "réparation intégrale", "assureur",
+                       "victime", "indemnisation", "force majeure", "expertise judiciaire"),
+}
+
+CODES = {"travail": "L1", "bail": "L2", "consommation": "L3", "societes": "L4", "famille": "C5", "responsabilite": "C6"}
+
+FILLER = (
+    "conformément aux dispositions en vigueur", "sous réserve des exceptions prévues par la loi",
+    "à peine de nullité", "dans les conditions fixées par décret", "sauf stipulation contraire",
+    "le juge apprécie souverainement", "la jurisprudence retient", "il appartient à la partie qui s'en prévaut",
+)
+
+SYLLABLES = ("ba", "ro", "mi", "tek", "lu", "sar", "ven", "do", "ki", "pol", "ra", "zen", "fa", "gui", "mor",
+             "ta", "bel", "nu", "cor", "vi")
+
+QUESTION_TEMPLATES = (
+    "Que prévoit le texte concernant {term} pour {party} ?",
+    "Quelles sont les règles de {term} applicables à {party} ?",
+    "Dans l'affaire {party}, comment s'applique {term} ?",
+    "{party} : quel est le régime de {term} ?",
+)
+
+def _pseudo_word(rng: random.Random) -> str:
+    """Nom propre fictif (≈8 000 possibles) : discriminant, mais partagé entre passages à grande échelle"""
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+
+def generate_corpus(n_chunks: int, n_questions: int, seed: int) -> Tuple[List[str], List[str], np.ndarray]:
+    """Passages, questions et, pour chaque question, l'indice du seul passage pertinent"""
+    rng = random.Random(seed)
+    domains = list(DOMAINS)
+    chunks, facts = [], []
+    for i in range(n_chunks):
+        domain = domains[i % len(domains)]
+        terms = rng.sample(DOMAINS[domain], 3)
+        party = f"{_pseudo_word(rng)} {_pseudo_word(rng)}"
+        days = rng.choice((8, 10, 14, 15, 30, 45, 60, 90))
+        amount = rng.randrange(500, 50000, 50)
+        sentences = [
+            f"Article {CODES[domain]}-{i // len(domains) + 1}.",
+            f"En matière de {terms[0]}, {party} est tenu de respecter un délai de {days} jours, {rng.choice(FILLER)}.",
+            f"Le {terms[1]} ouvre droit à une somme de {amount} euros {rng.choice(FILLER)}.",
+            f"Les règles relatives à {terms[2]} s'appliquent {rng.choice(FILLER)}.",
+        ]
+        chunks.append(" ".join(sentences))
+        facts.append((terms, party))
+
+    picks = rng.sample(range(n_chunks), min(n_questions, n_chunks))
+    questions = []
+    for chunk_index in picks:
+        terms, party = facts[chunk_index]
+        # La question ne reprend qu'une partie des termes du passage, comme un utilisateur
+        named = party if rng.random() < 0.6 else party.split()[rng.randrange(2)]
+        questions.append(rng.choice(QUESTION_TEMPLATES).format(term=rng.choice(terms[:2]), party=named))
+    return chunks, questions, np.array(picks, dtype='int64')
+
+def create_embedder(name: str) -> Embedder:
+    """hashing-<dimension> (local) ou fake-gemini (GeminiEmbedder contre le faux serveur)"""
+    if name.startswith("hashing"):
+        _, _, dimension = name.partition("-")
+        return HashingEmbedder(int(dimension or settings.EMBEDDING_DIMENSION))
+    if name == "fake-gemini":
+        from benchmarks.fake_gemini import FakeGeminiConfig, start_fake_gemini
+        from app.services.gemini_client import configure_gemini
+
+        server = start_fake_gemini(FakeGeminiConfig(embedding_latency=0.0))
+        settings.GEMINI_API_ENDPOINT = server.url
+        configure_gemini("fake-key")
+        return GeminiEmbedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_BATCH_SIZE)
+    raise ValueError(f"Embedder inconnu : {name}")
+
+def embed_corpus(embedder: Embedder, name: str, chunks: List[str], seed: int, cache_dir: str) -> Tuple[np.ndarray, float]:
+    """Embeddings du corpus (mis en cache sur disque : les grands corpus coûtent cher à ré-embedder)"""
+    path = None
+    if cache_dir:
+        key = hashlib.sha256(f"{name}|{len(chunks)}|{seed}".encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"corpus-{key}.npy")
+        if os.path.exists(path):
+            return np.load(path), 0.0
+    start = time.perf_counter()
+    vectors = embedder.embed_documents(chunks)
+    elapsed = time.perf_counter() - start
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(path, vectors)
+    return np.ascontiguousarray(vectors, dtype='float32'), elapsed
+
+def relevance(found: np.ndarray, relevant: np.ndarray, ks: Tuple[int, ...]) -> dict:
+    """recall@k (le passage pertinent est-il dans les k premiers ?) et MRR"""
+    ranks = []
+    for row, target in zip(found, relevant):
+        positions = np.flatnonzero(row == target)
+        ranks.append(int(positions[0]) + 1 if len(positions) else None)
+    metrics = {f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / len(ranks), 4) for k in ks}
+    metrics["mrr"] = round(sum(1.0 / r for r in ranks if r) / len(ranks), 4)
+    return metrics
+
+def percentile_ms(values: List[float], p: float) -> float:
+    return round(float(np.percentile(values, p)) * 1000, 4)
+
+def pad_rankings(rankings: List[List[int]], k: int) -> np.ndarray:
+    """Classements de longueurs variables -> tableau (questions, k) complété par -1, comme FAISS"""
+    found = np.full((len(rankings), k), -1, dtype='int64')
+    for row, ranking in enumerate(rankings):
+        found[row, :min(k, len(ranking))] = ranking[:k]
+    return found
+
+def sparse_run(chunks: List[str], questions: List[str], candidates: int) -> dict:
+    """Construit l'index BM25 du corpus et classe chaque question"""
+    sparse = SparseIndex(settings.BM25_K1, settings.BM25_B)
+    start = time.perf_counter()
+    for doc_id, chunk in enumerate(chunks):
+        sparse.add(doc_id, chunk)
+    # Forme compacte, celle de l'index rechargé en production
+    sparse.compact()
+    build_time = time.perf_counter() - start
+    latencies, rankings = [], []
+    for question in questions:
+        start = time.perf_counter()
+        hits = sparse.search(question, candidates)
+        latencies.append(time.perf_counter() - start)
+        rankings.append([doc_id for doc_id, _ in hits])
+    return {
+        "build_time_s": round(build_time, 3),
+        "index_memory_mb": round(sparse.nbytes / 1e6, 2),
+        "latencies": latencies,
+        "rankings": rankings,
+    }
+
+def production_params(index_type: str) -> dict:
+    if index_type == "hnsw":
+        return {"ef_search": settings.INDEX_EF_SEARCH}
+    if index_type.startswith("ivf"):
+        return {"nprobe": settings.INDEX_NPROBE}
+    return {}
+
+def run_size(embedder: Embedder, embedder_name: str, n_chunks: int, args) -> dict:
+    chunks, questions, relevant = generate_corpus(n_chunks, args.questions, args.seed)
+    vectors, embed_time = embed_corpus(embedder, embedder_name, chunks, args.seed, args.cache_dir)
+    k = max(args.k)
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    dense_weight = hybrid_dense_weight(embedder)
+    sparse = sparse_run(chunks, questions, candidates) if args.hybrid else None
+    del chunks
+
+    # Embedding des questions une à une, comme search_documents
+    query_times, query_vectors = [], []
+    for question in questions:
+        start = time.perf_counter()
+        query_vectors.append(embedder.embed_query(question))
+        query_times.append(time.perf_counter() - start)
+    queries = np.ascontiguousarray(np.vstack(query_vectors), dtype='float32')
+
+    ids = np.arange(len(vectors), dtype='int64')
+    results = []
+    if sparse:
+        results.append({
+            "index_type": "bm25",
+            "factory": f"BM25(k1={settings.BM25_K1}, b={settings.BM25_B})",
+            "params": {},
+            "build_time_s": sparse["build_time_s"],
+            "index_memory_mb": sparse["index_memory_mb"],
+            **relevance(pad_rankings(sparse["rankings"], k), relevant, tuple(args.k)),
+            "latency_p50_ms": percentile_ms(sparse["latencies"], 50),
+            "latency_p95_ms": percentile_ms(sparse["latencies"], 95),
+            "batch_qps": None,
+            # Pas d'embedding de la question
+            "end_to_end_p50_ms": percentile_ms(sparse["latencies"], 50),
+        })
+    for index_type in args.types:
+        rss_before = process_rss_mb(os.getpid())
+        start = time.perf_counter()
+        index = rebuild_index(index_type, embedder.dimension, ids, vectors, settings.INDEX_HNSW_M)
+        build_time = time.perf_counter() - start
+        rss_after = process_rss_mb(os.getpid())
+        sweeps = SWEEPS[index_type] if args.sweep else [production_params(index_type)]
+        for params in sweeps:
+            configure_search(index, params.get("nprobe"), params.get("ef_search"))
+            stats = measure(index, queries, k)
+            found = stats.pop("found")
+            results.append({
+                "index_type": index_type,
+                "factory": index_factory_string(index_type, embedder.dimension, len(vectors), settings.INDEX_HNSW_M),
+                "params": params,
+                "build_time_s": round(build_time, 3),
+                "index_memory_mb": round(len(faiss.serialize_index(index)) / 1e6, 2),
+                "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+                **relevance(found, relevant, tuple(args.k)),
+                **stats,
+                # Requête complète côté service : embedding de la question + recherche
+                "end_to_end_p50_ms": round(percentile_ms(query_times, 50) + stats["latency_p50_ms"], 4),
+            })
+            if sparse:
+                # Fusion RRF des deux classements ; BM25 tourne pendant l'embedding de la question
+                _, dense_found = index.search(queries, candidates)
+                fused, fusion_times = [], []
+                for dense_row, sparse_ranking in zip(dense_found, sparse["rankings"]):
+                    start = time.perf_counter()
+                    weighted = [(ranking, weight) for ranking, weight in (
+                        ([int(i) for i in dense_row if i >= 0], dense_weight), (sparse_ranking, 1.0)) if ranking and weight > 0]
+                    fused.append([doc_id for doc_id, _ in reciprocal_rank_fusion(
+                        [ranking for ranking, _ in weighted], settings.RRF_K, [weight for _, weight in weighted])[:k]])
+                    fusion_times.append(time.perf_counter() - start)
+                dense_row_stats = results[-1]
+                results.append({
+                    **dense_row_stats,
+                    "index_type": f"{index_type}+bm25",
+                    "params": {**dense_row_stats["params"], "dense_weight": dense_weight},
+                    **relevance(pad_rankings(fused, k), relevant, tuple(args.k)),
+                    "end_to_end_p50_ms": round(
+                        max(percentile_ms(query_times, 50), percentile_ms(sparse["latencies"], 50))
+                        + dense_row_stats["latency_p50_ms"] + percentile_ms(fusion_times, 50), 4),
+                })
+        del index
+
+    return {
+        "embedder": embedder_name,
+        "chunks": len(vectors),
+        "dimension": embedder.dimension,
+        "questions": len(questions),
+        "embedding_time_s": round(embed_time, 3) if embed_time else None,
+        "embedding_chunks_per_s": round(len(vectors) / embed_time, 1) if embed_time else None,
+        "vectors_memory_mb": round(vectors.nbytes / 1e6, 2),
+        "query_embedding_p50_ms": percentile_ms(query_times, 50),
+        "query_embedding_p95_ms": percentile_ms(query_times, 95),
+        "results": results,
+    }
+
+def print_run(run: dict, ks: List[int]):
+    print(f"\n{run['embedder']} — {run['chunks']} passages, dimension {run['dimension']}, {run['questions']} questions "
+          f"(embedding {run['embedding_chunks_per_s'] or 'cache'} passages/s, requête p50 {run['query_embedding_p50_ms']} ms)")
+    recall_columns = "".join(f"{'R@' + str(k):>8}" for k in ks)
+    print(f"{'type':<16}{'réglage':<16}{recall_columns}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}{'qps lot':>10}{'Mo':>9}{'build s':>9}")
+    for row in run["results"]:
+        params = ", ".join(f"{key}={value}" for key, value in row["params"].items()) or "-"
+        recalls = "".join(f"{row[f'recall@{k}']:>8}" for k in ks)
+        print(f"{row['index_type']:<16}{params:<16}{recalls}{row['mrr']:>8}{row['latency_p50_ms']:>10}"
+              f"{row['latency_p95_ms']:>10}{row['batch_qps']!s:>10}{row['index_memory_mb']:>9}{row['build_time_s']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Pertinence et coût de la recherche par embedder et type d'index")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Tailles de corpus (passages), jusqu'à 1000000")
+    parser.add_argument("--embedders", default="hashing-384", help="hashing-<dimension>, fake-gemini")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("-k", default="1,5,10", help="Valeurs de k pour recall@k")
+    parser.add_argument("--sweep", action="store_true", help="Balaye nprobe / efSearch au lieu des réglages de production")
+    parser.add_argument("--hybrid", action="store_true", help="Mesure aussi BM25 seul et la fusion RRF avec chaque index")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, help="Threads FAISS (1 = résultats reproductibles)")
+    parser.add_argument("--cache-dir", default="", help="Cache disque des embeddings du corpus")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    args.types = [name for name in args.types.split(",") if name]
+    args.k = sorted(int(k) for k in args.k.split(","))
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "faiss": faiss.__version__,
+            "threads": args.threads or faiss.omp_get_max_threads(),
+            "settings": {"nprobe": settings.INDEX_NPROBE, "ef_search": settings.INDEX_EF_SEARCH, "hnsw_m": settings.INDEX_HNSW_M,
+                         "hybrid_candidates": settings.HYBRID_CANDIDATES, "rrf_k": settings.RRF_K},
+        },
+        "runs": [],
+    }
+    embedders: Dict[str, Embedder] = {}
+    for embedder_name in args.embedders.split(","):
+        embedders[embedder_name] = embedders.get(embedder_name) or create_embedder(embedder_name)
+        for size in (int(size) for size in args.sizes.split(",")):
+            run = run_size(embedders[embedder_name], embedder_name, size, args)
+            report["runs"].append(run)
+            print_run(run, args.k)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats enregistrés dans {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Analyse hors ligne des traces OpenTelemetry écrites par le backend (TRACING_EXPORTER=file).
+
+Pour chaque route : latence p50/p95 des requêtes, puis temps passé dans chaque
+étape (lecture de la requête, recherche, embedding, prompt, appels Gemini et
+leurs tentatives, sérialisation) en part du temps total, et arbre des requêtes
+les plus lentes.
+
+Usage (depuis backend/) :
+    TRACING_EXPORTER=file TRACING_FILE_PATH=traces.jsonl uvicorn main:app
+    python -m benchmarks.trace_report traces.jsonl --route "POST /api/v1/legal-search" --slowest 3
+"""
+
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+def _timestamp(value: str) -> float:
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()
+
+def load_spans(path: str) -> List[dict]:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            raw = json.loads(line)
+            start, end = _timestamp(raw["start_time"]), _timestamp(raw["end_time"])
+            spans.append({
+                "name": raw["name"],
+                "trace_id": raw["context"]["trace_id"],
+                "span_id": raw["context"]["span_id"],
+                "parent_id": raw.get("parent_id"),
+                "start": start,
+                "duration_ms": (end - start) * 1000,
+                "attributes": raw.get("attributes") or {},
+                "status": (raw.get("status") or {}).get("status_code", "UNSET"),
+            })
+    return spans
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2) if ordered else 0.0
+
+def descendants(span: dict, children: Dict[str, List[dict]]) -> List[dict]:
+    found, pending = [], list(children.get(span["span_id"], []))
+    while pending:
+        child = pending.pop()
+        found.append(child)
+        pending.extend(children.get(child["span_id"], []))
+    return found
+
+def build_report(spans: List[dict], route: str = "") -> dict:
+    children = defaultdict(list)
+    for span in spans:
+        if span["parent_id"]:
+            children[span["parent_id"]].append(span)
+    roots = [span for span in spans if not span["parent_id"] and (not route or span["name"] == route)]
+
+    report = {}
+    for name in sorted({root["name"] for root in roots}):
+        requests = [root for root in roots if root["name"] == name]
+        total = sum(root["duration_ms"] for root in requests)
+        stages = defaultdict(list)
+        for root in requests:
+            per_request = defaultdict(float)
+            for child in descendants(root, children):
+                per_request[child["name"]] += child["duration_ms"]
+            for stage, duration in per_request.items():
+                stages[stage].append(duration)
+        report[name] = {
+            "requests": len(requests),
+            "errors": sum(1 for root in requests if root["status"] == "ERROR"),
+            "latency_p50_ms": percentile([root["duration_ms"] for root in requests], 0.50),
+            "latency_p95_ms": percentile([root["duration_ms"] for root in requests], 0.95),
+            # Les étapes imbriquées se recouvrent (llm inclut gemini.call) : les parts ne s'additionnent pas
+            "stages": {
+                stage: {
+                    "calls": len(durations),
+                    "p50_ms": percentile(durations, 0.50),
+                    "p95_ms": percentile(durations, 0.95),
+                    "share": round(sum(durations) / total, 3) if total else 0.0,
+                }
+                for stage, durations in sorted(stages.items(), key=lambda item: -sum(item[1]))
+            },
+        }
+    return report
+
+def print_tree(span: dict, children: Dict[str, List[dict]], depth: int = 0):
+    attributes = {key: value for key, value in span["attributes"].items()
+                  if key.startswith(("gen_ai.usage", "gemini.", "cache.", "retrieval.", "http.response"))}
+    print(f"{'  ' * depth}{span['name']:<{40 - 2 * depth}} {span['duration_ms']:9.1f} ms  {attributes or ''}")
+    for child in sorted(children.get(span["span_id"], []), key=lambda child: child["start"]):
+        print_tree(child, children, depth + 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Répartition du temps par étape à partir des traces du backend")
+    parser.add_argument("path", help="Fichier de traces (un span JSON par ligne)")
+    parser.add_argument("--route", default="", help="Span racine à analyser, ex. \"POST /api/v1/legal-search\"")
+    parser.add_argument("--slowest", type=int, default=0, help="Affiche l'arbre des N requêtes les plus lentes")
+    parser.add_argument("--output", help="Écrit le rapport JSON dans ce fichier")
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    report = build_report(spans, args.route)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.slowest:
+        children = defaultdict(list)
+        for span in spans:
+            if span["parent_id"]:
+                children[span["parent_id"]].append(span)
+        roots = [span for span in spans if not span["parent_id"] and (not args.route or span["name"] == args.route)]
+        for root in sorted(roots, key=lambda root: -root["duration_ms"])[:args.slowest]:
+            print()
+            print_tree(root, children)
+
+if __name__ == "__main__":
+    main()
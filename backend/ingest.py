@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Ingestion du corpus juridique hors du serveur : découverte des fichiers (texte,
+PDF, DOCX, HTML, XML Légifrance), extraction et découpage en parallèle, embedding
+par lots, index FAISS et BM25 persistés dans INDEX_DIR. Le serveur n'a plus qu'à
+charger l'index au démarrage.
+
+Une ingestion interrompue (Ctrl-C, arrêt de la machine) reprend au dernier
+point de reprise : relancer simplement la même commande.
+
+Usage (depuis backend/) :
+    python ingest.py data
+    INDEX_DIR=/srv/index python ingest.py /srv/corpus --workers 8 --checkpoint-seconds 30
+"""
+
+import json
+import argparse
+
+from app.core.config import settings
+from app.services.chunking import LegalChunker
+from app.services.embeddings import get_embedder
+from app.services.llm_service import create_index_store
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexe (ou met à jour l'index d') un dossier de documents juridiques")
+    parser.add_argument("data_folder", nargs="?", default="data")
+    parser.add_argument("--workers", type=int, default=settings.INGEST_WORKERS, help="Processus de lecture (0 = processus courant)")
+    parser.add_argument("--checkpoint-seconds", type=float, default=settings.INGEST_CHECKPOINT_SECONDS)
+    parser.add_argument("--progress-seconds", type=float, default=settings.INGEST_PROGRESS_SECONDS)
+    args = parser.parse_args()
+
+    settings.INGEST_WORKERS = args.workers
+    settings.INGEST_CHECKPOINT_SECONDS = args.checkpoint_seconds
+    settings.INGEST_PROGRESS_SECONDS = args.progress_seconds
+
+    store = create_index_store(get_embedder(), LegalChunker(settings.CHUNK_MAX_TOKENS, settings.CHUNK_OVERLAP_TOKENS))
+    try:
+        stats = store.sync(args.data_folder)
+    except KeyboardInterrupt:
+        print("\nInterrompu : relancer la commande pour reprendre au dernier point de reprise")
+        return
+    print(json.dumps({**stats, "index_type": store.manifest["index_type"], "vectors": store.index.ntotal}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,27 @@
 # main.py - Production Legal LLM API with Gemini 2.5 Flash Preview
 import os
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Tuple
 import uvicorn
-import google.generativeai as genai
 from dotenv import load_dotenv
 import asyncio
 import time
+from app.services.gemini_client import configure_gemini
+from app.services.model_router import model_router
+from app.services.resilience import get_resilience_stats, upstream_status
+from app.services.streaming import sse_response, stream_completion
+from app.services.response_cache import response_cache, is_cache_bypassed
+from app.services.conversation_store import conversation_store, SessionNotFound
+from app.services.chat_sessions import RoutedChat
+from app.services.chat_memory import ChatMemory, format_transcript
+from app.services.batch import run_batch, stream_batch
+from app.services.jobs import job_queue, InvalidCallbackURL, JobNotFound
+from app.services.metrics import MetricsMiddleware, render_metrics, set_endpoint, span, timed
+from app.services.tracing import TracedRoute, TracingMiddleware, configure_tracing
+from app.services.rate_limiter import rate_scheduler, set_priority, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from app.core.config import settings
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +33,7 @@ if not api_key:
 else:
     print(f"✅ API key loaded: {api_key[:10]}...")
     
-genai.configure(api_key=api_key)
+configure_gemini(api_key)
 
 # Pydantic models
 class DocumentRequest(BaseModel):
@@ -33,6 +46,22 @@ class DocumentResponse(BaseModel):
     success: bool
     message: str
 
+class BatchDocumentRequest(BaseModel):
+    documents: List[DocumentRequest]
+
+class DocumentJobRequest(DocumentRequest):
+    callback_url: Optional[str] = None  # POSTed the job status when it finishes
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed
+    type_document: Optional[str] = None
+    document_genere: Optional[str] = None
+    erreur: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
 class SearchRequest(BaseModel):
     question: str
 
@@ -50,20 +79,31 @@ class SearchResponse(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    historique: List[dict] = []
+    historique: List[dict] = []  # Full-history mode (no session)
+    session_id: Optional[str] = None  # Session mode: history is kept server-side
 
 class ChatResponse(BaseModel):
     reponse: str
-    historique: List[dict]
+    historique: Optional[List[dict]] = None  # Omitted in session mode
+    session_id: Optional[str] = None
     success: bool
     message: str
 
+class ChatSession(BaseModel):
+    session_id: str
+    historique: List[dict] = []
+    resume: str = ""  # Rolling summary of older turns (CHAT_MEMORY_TOKEN_BUDGET)
+    messages_resumes: int = 0  # Number of messages covered by the summary
+
 # FastAPI Application
 app = FastAPI(
     title="🏛️ Legal LLM API - Gemini 2.5 Flash Preview",
     description="AI Legal Assistant powered by Gemini 2.5 Flash Preview-05-20",
     version="2.0.0"
 )
+# Handler span plus request parsing / response serialization timings (TRACING_EXPORTER)
+app.router.route_class = TracedRoute
+configure_tracing()
 
 # CORS Configuration - Production ready
 origins = [
@@ -86,46 +126,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Gemini model configuration
-model = genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
+# Prometheus metrics: end-to-end latency and in-flight requests per route, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+# Gemini models per task (fast tier for chat/summaries, strong tier for documents/research), with fallback
+model = model_router.for_task("document")
+search_model = model_router.for_task("search")
+summary_model = model_router.for_task("summary")
 
-async def call_gemini(prompt: str) -> str:
-    """Call Gemini API with error handling"""
+# Chat instructions, sent once as system_instruction (context-cached when possible)
+CHAT_SYSTEM_INSTRUCTION = """You are a professional AI legal assistant specializing in contract law, employment law, business law, and general legal guidance.
+
+Provide a helpful, professional response that:
+- Directly addresses their question
+- Uses appropriate legal terminology
+- Offers practical guidance when relevant
+- Includes appropriate disclaimers
+- Maintains a professional yet approachable tone
+- Suggests follow-up questions or related topics when helpful
+
+Always remind users to consult with licensed attorneys for specific legal advice."""
+
+chat = RoutedChat(model_router, CHAT_SYSTEM_INSTRUCTION)
+
+@timed("call_gemini")
+async def call_gemini(prompt: str, cache_query: Optional[str] = None, bypass_cache: bool = False,
+                      historique: Optional[List[dict]] = None, summary: str = "", llm=model) -> str:
+    """Call Gemini API with error handling, behind the exact/semantic response cache.
+
+    `cache_query` is the bare user question, used for semantic matching;
+    leave it empty when the prompt depends on more than the question.
+    With `historique`, the call is a native multi-turn chat turn and `prompt`
+    is the new user message (`summary` covers turns older than `historique`);
+    only opening turns are cached. `llm` is the routed model for the task.
+    Answers from a fallback model are not cached: they would outlive the outage
+    under the primary model's key.
+    """
+    is_chat = historique is not None
+    primary_model = model_router.primary('chat', prompt) if is_chat else llm.model_name
+    cache_model = f"{primary_model}/chat" if is_chat else primary_model
+    use_cache = not bypass_cache and not historique and not summary
+    if bypass_cache:
+        response_cache.record_bypass()
+    elif use_cache:
+        with span("cache_lookup"):
+            cached = await response_cache.get(prompt, cache_model, cache_query)
+        if cached is not None:
+            return cached
+    
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        with span("llm"):
+            if is_chat:
+                response, served_model = await chat.send_with_model(prompt, historique, summary)
+            else:
+                response, served_model = await llm.generate_with_model(prompt)
     except Exception as e:
         print(f"Gemini API Error: {e}")
+        # Local quota shed the call (429), breaker open or still failing after retries (503):
+        # tell the client when to come back
+        status = upstream_status(e)
+        if status is not None:
+            status_code, retry_after = status
+            raise HTTPException(status_code=status_code, detail=f"AI Generation temporarily unavailable: {str(e)}",
+                                headers={"Retry-After": str(int(retry_after))})
         raise HTTPException(status_code=500, detail=f"AI Generation failed: {str(e)}")
-
-# Main endpoints
-@app.get("/")
-async def root():
-    return {
-        "message": "🏛️ Legal LLM API active - Powered by Gemini 2.5 Flash Preview",
-        "version": "2.0.0",
-        "status": "ready",
-        "ai_model": "gemini-2.5-flash-preview-05-20",
-        "deployment": "production",
-        "endpoints": {
-            "docs": "/docs",
-            "health": "/health",
-            "generate": "/api/v1/generate-document",
-            "search": "/api/v1/legal-search",
-            "chat": "/api/v1/chat"
-        }
-    }
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "legal-llm-gemini", "ai_model": "gemini-2.5-flash-preview-05-20"}
-
-# Document generation with real Gemini
-@app.post("/api/v1/generate-document", response_model=DocumentResponse)
-async def generate_document(request: DocumentRequest):
-    """Generates a legal document using Gemini 2.5 Flash Preview"""
     
-    # Build specialized prompt based on document type
+    if use_cache and served_model == primary_model:
+        await response_cache.set(prompt, cache_model, response, cache_query)
+    return response
+
+# Prompt builders shared by the JSON and streaming endpoints
+@timed("prompt_build")
+def build_document_prompt(request: DocumentRequest) -> str:
+    """Build specialized prompt based on document type"""
     if request.type_document == "contrat":
         prompt = f"""
 Generate a professional employment contract in English with the following details:
@@ -174,10 +248,113 @@ Generate a professional legal document of type "{request.type_document}" with th
 Use appropriate legal formatting and professional language.
 """
 
+    return prompt
+
+@timed("prompt_build")
+def build_search_prompt(question: str) -> str:
+    """Build the legal research prompt"""
+    return f"""
+You are a legal research assistant. Answer this legal question comprehensively:
+
+Question: {question}
+
+Provide a detailed response that includes:
+1. Direct answer to the question
+2. Key legal principles involved
+3. Important considerations and exceptions
+4. Professional recommendations
+5. Jurisdictional variations if relevant
+
+Use professional legal terminology and cite general legal principles.
+Format your response clearly with headings and bullet points.
+
+Remember to add appropriate disclaimers about consulting licensed attorneys for specific advice.
+"""
+
+@timed("context_assembly")
+def build_search_sources(question: str) -> List[Source]:
+    """Create mock sources for the interface"""
+    return [
+        Source(
+            contenu="This response is generated from Gemini's comprehensive legal knowledge base, drawing from extensive training on legal texts, case law, and professional legal resources.",
+            nom_fichier="gemini_knowledge_base.txt",
+            score=0.98
+        ),
+        Source(
+            contenu=f"Query processed using advanced AI reasoning on legal concepts related to: {question}",
+            nom_fichier="ai_legal_analysis.txt", 
+            score=0.95
+        )
+    ]
+
+# Main endpoints
+@app.get("/")
+async def root():
+    return {
+        "message": "🏛️ Legal LLM API active - Powered by Gemini 2.5 Flash Preview",
+        "version": "2.0.0",
+        "status": "ready",
+        "ai_model": model_router.primary("document"),
+        "ai_models": model_router.models,
+        "deployment": "production",
+        "endpoints": {
+            "docs": "/docs",
+            "health": "/health",
+            "generate": "/api/v1/generate-document",
+            "search": "/api/v1/legal-search",
+            "chat": "/api/v1/chat",
+            "generate_stream": "/api/v1/generate-document/stream",
+            "search_stream": "/api/v1/legal-search/stream",
+            "chat_stream": "/api/v1/chat/stream"
+        }
+    }
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "service": "legal-llm-gemini", "ai_model": model_router.primary("document")}
+
+@app.get("/api/v1/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss counters"""
+    return response_cache.get_stats()
+
+@app.get("/api/v1/resilience/stats")
+async def resilience_stats():
+    """Retries, hedged requests and circuit breaker state per Gemini model"""
+    return get_resilience_stats()
+
+@app.get("/api/v1/rate-limit/stats")
+async def rate_limit_stats():
+    """Client-side Gemini quota scheduler: admitted, shed and queued calls"""
+    return rate_scheduler.get_stats()
+
+@app.get("/api/v1/models/stats")
+async def model_stats():
+    """Model chosen per task, and per-model latency, fallbacks and estimated cost"""
+    return model_router.get_stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (set PROMETHEUS_MULTIPROC_DIR to aggregate uvicorn workers)"""
+    content, content_type = render_metrics()
+    return Response(content=content, headers={"Content-Type": content_type})
+
+# Document generation with real Gemini
+@app.post("/api/v1/generate-document", response_model=DocumentResponse)
+async def generate_document(
+    request: DocumentRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
+    """Generates a legal document using Gemini 2.5 Flash Preview"""
+    
+    prompt = build_document_prompt(request)
+    bypass_cache = is_cache_bypassed(x_cache_bypass, cache_control)
+
     try:
         # Add timing for user experience
         start_time = time.time()
-        document = await call_gemini(prompt)
+        document = await call_gemini(prompt, bypass_cache=bypass_cache)
         generation_time = round(time.time() - start_time, 2)
         
         return DocumentResponse(
@@ -187,50 +364,89 @@ Use appropriate legal formatting and professional language.
             message=f"Document generated successfully using Gemini AI ({generation_time}s)"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Batch generation: bounded fan-out, results streamed as they complete
+@app.post("/api/v1/generate-documents/batch")
+async def generate_documents_batch(
+    request: BatchDocumentRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
+    """Generates many documents in parallel; identical requests are generated once"""
+    set_priority(PRIORITY_BATCH)
+    if len(request.documents) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: at most {settings.BATCH_MAX_ITEMS} documents")
+    bypass_cache = is_cache_bypassed(x_cache_bypass, cache_control)
+    
+    async def generate(item: dict) -> str:
+        return await call_gemini(build_document_prompt(DocumentRequest(**item)), bypass_cache=bypass_cache)
+    
+    items = [document.model_dump() for document in request.documents]
+    return sse_response(stream_batch(run_batch(items, generate), len(items)))
+
+# Background jobs: long generations run off the request path
+async def generate_document_job(payload: dict) -> str:
+    set_priority(PRIORITY_BATCH)
+    set_endpoint("job:generate_document")
+    return await call_gemini(build_document_prompt(DocumentRequest(**payload)))
+
+job_queue.register("generate_document", generate_document_job)
+
+def job_status(job: dict) -> JobStatus:
+    return JobStatus(
+        job_id=job["id"],
+        status=job["status"],
+        type_document=job["payload"].get("type_document"),
+        document_genere=job["result"],
+        erreur=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"]
+    )
+
+@app.post("/api/v1/jobs/generate-document", response_model=JobStatus, response_model_exclude_none=True, status_code=202)
+async def submit_document_job(request: DocumentJobRequest):
+    """Queues a document generation and returns its job id right away"""
+    try:
+        job = await job_queue.submit(
+            "generate_document",
+            {"type_document": request.type_document, "parametres": request.parametres},
+            callback_url=request.callback_url
+        )
+    except InvalidCallbackURL as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job_status(job)
+
+@app.get("/api/v1/jobs/{job_id}", response_model=JobStatus, response_model_exclude_none=True)
+async def get_job(job_id: str):
+    """Job status, with the document once it has succeeded"""
+    try:
+        return job_status(await job_queue.get(job_id))
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail="Job not found")
+
 # Legal research with direct Gemini query
 @app.post("/api/v1/legal-search", response_model=SearchResponse)
-async def legal_search(request: SearchRequest):
+async def legal_search(
+    request: SearchRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
     """Performs legal research using Gemini's knowledge base"""
     
-    prompt = f"""
-You are a legal research assistant. Answer this legal question comprehensively:
-
-Question: {request.question}
-
-Provide a detailed response that includes:
-1. Direct answer to the question
-2. Key legal principles involved
-3. Important considerations and exceptions
-4. Professional recommendations
-5. Jurisdictional variations if relevant
-
-Use professional legal terminology and cite general legal principles.
-Format your response clearly with headings and bullet points.
-
-Remember to add appropriate disclaimers about consulting licensed attorneys for specific advice.
-"""
+    prompt = build_search_prompt(request.question)
+    bypass_cache = is_cache_bypassed(x_cache_bypass, cache_control)
 
     try:
         start_time = time.time()
-        ai_response = await call_gemini(prompt)
+        ai_response = await call_gemini(prompt, cache_query=request.question, bypass_cache=bypass_cache, llm=search_model)
         search_time = round(time.time() - start_time, 2)
         
-        # Create mock sources for the interface
-        sources = [
-            Source(
-                contenu="This response is generated from Gemini's comprehensive legal knowledge base, drawing from extensive training on legal texts, case law, and professional legal resources.",
-                nom_fichier="gemini_knowledge_base.txt",
-                score=0.98
-            ),
-            Source(
-                contenu=f"Query processed using advanced AI reasoning on legal concepts related to: {request.question}",
-                nom_fichier="ai_legal_analysis.txt", 
-                score=0.95
-            )
-        ]
+        sources = build_search_sources(request.question)
         
         return SearchResponse(
             reponse=ai_response,
@@ -240,65 +456,158 @@ Remember to add appropriate disclaimers about consulting licensed attorneys for
             message=f"Legal research completed using Gemini AI ({search_time}s)"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Chat assistant with real Gemini conversation
-@app.post("/api/v1/chat", response_model=ChatResponse)
-async def chat_interaction(request: ChatRequest):
-    """Interactive legal chat using Gemini 2.5 Flash Preview"""
-    
-    # Build conversation context
-    conversation_context = ""
-    if request.historique:
-        conversation_context = "Previous conversation:\n"
-        for msg in request.historique[-6:]:  # Last 6 messages for context
-            role = "Human" if msg["role"] == "user" else "Assistant"
-            conversation_context += f"{role}: {msg['content']}\n"
-        conversation_context += "\n"
-    
-    prompt = f"""
-You are a professional AI legal assistant specializing in contract law, employment law, business law, and general legal guidance.
+# Server-side conversation sessions
+async def summarize_conversation(summary: str, messages: List[dict]) -> str:
+    """Folds older chat turns into the session's rolling summary"""
+    set_priority(PRIORITY_BATCH)
+    prompt = f"""You are summarizing a conversation between a user and an AI legal assistant.
+Update the existing summary with the new exchanges. Keep the facts of the case, the questions asked,
+the guidance given and any legal references cited. Be concise.
 
-{conversation_context}
+EXISTING SUMMARY:
+{summary or "(none)"}
 
-Current question: {request.message}
+NEW EXCHANGES:
+{format_transcript(messages)}
 
-Provide a helpful, professional response that:
-- Directly addresses their question
-- Uses appropriate legal terminology
-- Offers practical guidance when relevant
-- Includes appropriate disclaimers
-- Maintains a professional yet approachable tone
-- Suggests follow-up questions or related topics when helpful
+UPDATED SUMMARY:"""
+    return await summary_model.generate(prompt)
 
-Always remind users to consult with licensed attorneys for specific legal advice.
-"""
+# Recent turns verbatim, older ones summarized in the background after each reply
+chat_memory = ChatMemory(conversation_store, summarize_conversation)
+# Let in-flight summaries finish so the folded turns are not lost on shutdown
+app.add_event_handler("shutdown", chat_memory.drain)
+
+async def load_chat_history(request: ChatRequest) -> Tuple[str, List[dict]]:
+    """Summary and history from the session store in session mode, history from the request otherwise"""
+    if request.session_id is None:
+        return "", request.historique
+    try:
+        return await chat_memory.context(request.session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+async def save_chat_turn(session_id: str, message: str, ai_response: str):
+    await conversation_store.append_messages(session_id, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": ai_response}
+    ])
+    chat_memory.schedule_update(session_id)
+
+@app.post("/api/v1/chat/sessions", response_model=ChatSession)
+async def create_chat_session():
+    """Opens a session so later messages no longer carry the history"""
+    return ChatSession(session_id=await conversation_store.create_session())
+
+@app.get("/api/v1/chat/sessions/{session_id}", response_model=ChatSession)
+async def get_chat_session(session_id: str):
+    """Full history of a session, e.g. to restore it after a page reload"""
+    try:
+        messages = await conversation_store.get_messages(session_id)
+        state = await conversation_store.get_summary(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return ChatSession(
+        session_id=session_id,
+        historique=messages,
+        resume=state["summary"],
+        messages_resumes=state["summarized_count"]
+    )
+
+@app.delete("/api/v1/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    await conversation_store.delete_session(session_id)
+    return {"success": True}
+
+# Chat assistant with real Gemini conversation
+@app.post("/api/v1/chat", response_model=ChatResponse, response_model_exclude_none=True)
+async def chat_interaction(
+    request: ChatRequest,
+    x_cache_bypass: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None)
+):
+    """Interactive legal chat using Gemini 2.5 Flash Preview"""
+    set_priority(PRIORITY_INTERACTIVE)
+    
+    summary, historique = await load_chat_history(request)
+    bypass_cache = is_cache_bypassed(x_cache_bypass, cache_control)
 
     try:
         start_time = time.time()
-        ai_response = await call_gemini(prompt)
+        ai_response = await call_gemini(
+            request.message,
+            cache_query=request.message,
+            bypass_cache=bypass_cache,
+            historique=historique,
+            summary=summary
+        )
         chat_time = round(time.time() - start_time, 2)
         
-        # Update conversation history
-        new_historique = request.historique.copy()
-        new_historique.append({"role": "user", "content": request.message})
-        new_historique.append({"role": "assistant", "content": ai_response})
+        # Update conversation history (session mode: stored, only the reply is returned)
+        if request.session_id is not None:
+            await save_chat_turn(request.session_id, request.message, ai_response)
+            new_historique = None
+        else:
+            new_historique = historique.copy()
+            new_historique.append({"role": "user", "content": request.message})
+            new_historique.append({"role": "assistant", "content": ai_response})
         
         return ChatResponse(
             reponse=ai_response,
             historique=new_historique,
+            session_id=request.session_id,
             success=True,
             message=f"Response generated using Gemini AI ({chat_time}s)"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streaming variants (Server-Sent Events): sources, then tokens, then timing
+@app.post("/api/v1/generate-document/stream")
+async def generate_document_stream(request: DocumentRequest):
+    """Streams a legal document as Gemini generates it"""
+    prompt = build_document_prompt(request)
+    return sse_response(stream_completion(model.stream(prompt)))
+
+@app.post("/api/v1/legal-search/stream")
+async def legal_search_stream(request: SearchRequest):
+    """Streams a legal research answer, sources first"""
+    prompt = build_search_prompt(request.question)
+    sources = build_search_sources(request.question)
+    return sse_response(stream_completion(
+        search_model.stream(prompt),
+        sources=[source.model_dump() for source in sources]
+    ))
+
+@app.post("/api/v1/chat/stream")
+async def chat_interaction_stream(request: ChatRequest):
+    """Streams a chat reply; the updated history comes with the final event"""
+    set_priority(PRIORITY_INTERACTIVE)
+    summary, historique = await load_chat_history(request)
+    
+    async def on_complete(ai_response: str) -> dict:
+        if request.session_id is not None:
+            await save_chat_turn(request.session_id, request.message, ai_response)
+            return {"session_id": request.session_id}
+        new_historique = historique.copy()
+        new_historique.append({"role": "user", "content": request.message})
+        new_historique.append({"role": "assistant", "content": ai_response})
+        return {"historique": new_historique}
+    
+    return sse_response(stream_completion(chat.stream(request.message, historique, summary), on_complete=on_complete))
+
 # Production server configuration
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     print("🚀 Starting Legal LLM Server with Gemini 2.5 Flash Preview...")
-    print("🤖 AI Model: gemini-2.5-flash-preview-05-20")
+    print(f"🤖 AI Models: {model_router.models['strong']} (documents, research), {model_router.models['fast']} (chat)")
     print(f"🌐 Running on port {port}")
     uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
@@ -76,8 +76,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Gemini model configuration
-model = genai.GenerativeModel('gemini-2.0-flash-exp')
+# Gemini model configuration (same variable as the fast tier of main.py's model router)
+MODEL_NAME = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-exp")
+model = genai.GenerativeModel(MODEL_NAME)
 
 async def call_gemini(prompt: str) -> str:
     """Call Gemini API with error handling"""
@@ -95,7 +96,7 @@ async def root():
         "message": "🏛️ Legal LLM API active - Powered by Gemini 2.5 Flash Preview",
         "version": "2.0.0",
         "status": "ready",
-        "ai_model": "gemini-2.0-flash-exp",
+        "ai_model": MODEL_NAME,
         "endpoints": {
             "docs": "/docs",
             "health": "/health",
@@ -107,7 +108,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "legal-llm-gemini", "ai_model": "gemini-2.0-flash-exp"}
+    return {"status": "healthy", "service": "legal-llm-gemini", "ai_model": MODEL_NAME}
 
 # Document generation with real Gemini
 @app.post("/api/v1/generate-document", response_model=DocumentResponse)
@@ -287,6 +288,6 @@ Always remind users to consult with licensed attorneys for specific legal advice
 # Server startup
 if __name__ == "__main__":
     print("🚀 Starting Legal LLM Server with Gemini 2.5 Flash Preview...")
-    print("🤖 AI Model: gemini-2.0-flash-exp")
+    print(f"🤖 AI Model: {MODEL_NAME}")
     print("📖 Documentation available at http://127.0.0.1:8000/docs")
     uvicorn.run(app, host="127.0.0.1", port=8000) 
\ No newline at end of file
@@ -0,0 +1,8 @@
+# tests/conftest.py
+import os
+import sys
+
+# Les tests importent le paquet `app` depuis backend/, quel que soit le dossier de lancement
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Jamais d'appel réel à Gemini pendant les tests
+os.environ["GEMINI_API_KEY"] = ""
@@ -0,0 +1,75 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.chat_memory import ChatMemory, fit_to_budget, message_tokens
+from app.services.chunking import estimate_tokens
+from app.services.conversation_store import MemoryConversationStore
+
+def exchange(n: int, size: int = 40) -> list:
+    return [{"role": "user", "content": f"question {n} " + "x" * size},
+            {"role": "assistant", "content": f"réponse {n} " + "y" * size}]
+
+def test_fit_keeps_recent_messages_within_budget():
+    messages = exchange(1) + exchange(2) + exchange(3)
+    summary, recent = fit_to_budget(messages, "résumé", 40)
+    assert summary == "résumé"
+    assert recent == exchange(3)
+    assert message_tokens(recent) + estimate_tokens(summary) <= 40
+
+def test_fit_truncates_oversized_summary_instead_of_dropping_last_exchange():
+    messages = exchange(1) + exchange(2)
+    summary, recent = fit_to_budget(messages, "s" * 4000, 60)
+    assert recent == exchange(2)
+    assert summary.startswith("sss") and summary.endswith("…")
+    assert message_tokens(recent) + estimate_tokens(summary) <= 60
+
+def test_fit_keeps_last_exchange_even_if_it_exceeds_budget():
+    messages = exchange(1, size=400)
+    summary, recent = fit_to_budget(messages, "résumé", 10)
+    assert recent == messages and summary == ""
+
+def test_memory_folds_old_turns_into_summary():
+    async def summarize(previous, messages):
+        return previous + f"[{len(messages)}]"
+
+    async def scenario():
+        store = MemoryConversationStore()
+        memory = ChatMemory(store, summarize, token_budget=60)
+        session_id = await store.create_session()
+        for n in range(4):
+            await store.append_messages(session_id, exchange(n))
+        memory.schedule_update(session_id)
+        await memory.drain()
+        state = await store.get_summary(session_id)
+        assert state["summary"] and state["summarized_count"] > 0
+        summary, recent = await memory.context(session_id)
+        assert summary == state["summary"] and recent[-2:] == exchange(3)
+
+    asyncio.run(scenario())
+
+def test_pending_summaries_finish_on_shutdown():
+    done = []
+
+    async def summarize(previous, messages):
+        await asyncio.sleep(0.05)
+        done.append(len(messages))
+        return "résumé"
+
+    store = MemoryConversationStore()
+    memory = ChatMemory(store, summarize, token_budget=30)
+    app = FastAPI()
+    app.add_event_handler("shutdown", memory.drain)
+
+    @app.post("/turn")
+    async def turn():
+        session_id = await store.create_session()
+        for n in range(3):
+            await store.append_messages(session_id, exchange(n))
+        memory.schedule_update(session_id)
+        return {"session_id": session_id}
+
+    with TestClient(app) as client:
+        client.post("/turn")
+    assert done
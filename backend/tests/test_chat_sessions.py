@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.chat_sessions import GeminiChat, context_cache_min_tokens
+
+class FakeClient:
+    model_name = "gemini-2.0-flash"
+
+@pytest.fixture
+def cache_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "GEMINI_CONTEXT_CACHE_ENABLED", True)
+
+def make_chat(monkeypatch, create):
+    chat = GeminiChat(FakeClient(), "Tu es un assistant juridique.")
+    monkeypatch.setattr(chat, "_create_cached_model", create)
+    return chat
+
+def test_min_tokens_by_model_prefix():
+    assert context_cache_min_tokens("gemini-1.5-flash") == 32768
+    assert context_cache_min_tokens("gemini-2.5-flash-preview-05-20") == 1024
+    assert context_cache_min_tokens("unknown-model") == settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS
+
+def test_short_prefix_never_creates_cache(monkeypatch, cache_enabled):
+    calls = []
+    chat = make_chat(monkeypatch, lambda: calls.append(1))
+
+    async def scenario():
+        assert await chat._model() is chat._base_model
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert calls == [] and chat._cache_task is None
+
+def test_cache_created_in_background(monkeypatch, cache_enabled):
+    cached = object()
+    created = []
+
+    def create():
+        created.append(1)
+        chat._cache_expires_at = time.time() + 3600
+        return cached
+
+    chat = make_chat(monkeypatch, create)
+    chat.set_shared_context(["article " * 20000])
+
+    async def scenario():
+        # Premier tour : pas d'attente de la création, modèle de base
+        assert await chat._model() is chat._base_model
+        await chat._cache_task
+        assert await chat._model() is cached
+        assert await chat._model() is cached
+
+    asyncio.run(scenario())
+    assert created == [1]
+
+def test_failed_cache_creation_waits_before_retry(monkeypatch, cache_enabled):
+    attempts = []
+
+    def create():
+        attempts.append(1)
+        raise RuntimeError("quota")
+
+    chat = make_chat(monkeypatch, create)
+    chat.set_shared_context(["article " * 20000])
+
+    async def scenario():
+        await chat._model()
+        await chat._cache_task
+        assert await chat._model() is chat._base_model
+        await chat._cache_task
+
+    asyncio.run(scenario())
+    assert attempts == [1]
+    assert chat._cache_retry_at > time.time()
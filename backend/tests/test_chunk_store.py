@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from app.services import chunk_store
+from app.services.chunk_store import ChunkStore
+
+def chunk(n: int, section=None) -> dict:
+    return {"content": f"Article {n} : texte du morceau é{n}", "filename": f"code-{n % 2}.txt",
+            "section": section, "start": n * 10 if n % 3 else None, "end": n * 10 + 9 if n % 3 else None}
+
+def as_dicts(store) -> dict:
+    return {doc_id: dict(record.to_dict() if hasattr(record, "to_dict") else record) for doc_id, record in store.items()}
+
+def test_save_load_round_trip(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    expected = {n: chunk(n, section="Titre I" if n % 2 else None) for n in range(5)}
+    for doc_id, value in expected.items():
+        store[doc_id] = value
+    # Lisible avant la sauvegarde : le texte est déjà écrit sur disque
+    assert store[3]["content"] == expected[3]["content"]
+
+    state = store.save()
+    loaded = ChunkStore.load(str(tmp_path), state)
+    assert len(loaded) == 5
+    assert as_dicts(loaded) == expected
+    assert loaded.get(4)["section"] is None and loaded[1].get("section") == "Titre I"
+    assert 7 not in loaded
+
+def test_checkpoints_append_to_current_generation(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    for n in range(3):
+        store[n] = chunk(n)
+    first = store.save()
+    for n in range(3, 6):
+        store[n] = chunk(n)
+    del store[1]
+    second = store.save()
+
+    assert second["generation"] == first["generation"]
+    assert second["rows"] == 6 and second["removed"] == 1
+    loaded = ChunkStore.load(str(tmp_path), second)
+    assert sorted(loaded) == [0, 2, 3, 4, 5]
+    assert loaded[5]["content"] == chunk(5)["content"]
+    # L'état précédent reste lisible : rien n'a été réécrit, seulement ajouté
+    previous = ChunkStore.load(str(tmp_path), first)
+    assert sorted(previous) == [0, 1, 2]
+
+def test_unsaved_writes_are_discarded_on_resume(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    store[0] = chunk(0)
+    state = store.save()
+    store[1] = chunk(1)
+    store.save()  # écrit au-delà de `state`, comme un point de reprise interrompu avant le manifeste
+
+    resumed = ChunkStore.load(str(tmp_path), state)
+    assert list(resumed) == [0]
+    resumed[2] = chunk(2)
+    after = ChunkStore.load(str(tmp_path), resumed.save())
+    assert sorted(after) == [0, 2]
+    assert after[2]["content"] == chunk(2)["content"]
+
+def test_reinserted_id_and_majority_removal_write_new_generation(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    for n in range(4):
+        store[n] = chunk(n)
+    first = store.save()
+    store[1] = {"content": "nouveau texte", "filename": "autre.txt"}
+    second = store.save()
+    assert second["generation"] == first["generation"] + 1
+    assert ChunkStore.load(str(tmp_path), second)[1]["content"] == "nouveau texte"
+
+    for n in (0, 2, 3):
+        del store[n]
+    third = store.save()
+    assert third["generation"] == second["generation"] + 1 and third["removed"] == 0
+    ChunkStore.cleanup(str(tmp_path), third)
+    remaining = {name for name in os.listdir(tmp_path) if chunk_store.CHUNK_FILE_PATTERN.match(name)}
+    assert remaining == {third["blob"], *chunk_store._file_names(third["generation"])}
+    assert as_dicts(ChunkStore.load(str(tmp_path), third)) == {
+        1: {"content": "nouveau texte", "filename": "autre.txt", "section": None, "start": None, "end": None}
+    }
+
+def test_blob_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, "COMPACT_MIN_BYTES", 0)
+    store = ChunkStore(str(tmp_path))
+    for n in range(10):
+        store[n] = {"content": "x" * 1000 + str(n), "filename": "f.txt"}
+    first = store.save()
+    for n in range(8):
+        del store[n]
+    state = store.save()
+    assert state["blob"] != first["blob"]
+    assert state["blob_size"] < 2100
+    loaded = ChunkStore.load(str(tmp_path), state)
+    assert [loaded[n]["content"][-1] for n in sorted(loaded)] == ["8", "9"]
+
+def test_legacy_single_table_is_converted(tmp_path):
+    text = "Article 1".encode("utf-8")
+    with open(tmp_path / "chunks-1.bin", "wb") as f:
+        f.write(text + b"a.txt")
+    table = np.asfortranarray(np.array([[7, 0, len(text), len(text), 5, -1, 0, 0, 12]], dtype="int64"))
+    np.save(tmp_path / "chunks-1.npy", table)
+
+    store = ChunkStore.load(str(tmp_path), {"generation": 1, "table": "chunks-1.npy", "blob": "chunks-1.bin"})
+    assert store[7].to_dict() == {"content": "Article 1", "filename": "a.txt", "section": None, "start": 0, "end": 12}
+    state = store.save()
+    assert state["generation"] == 2 and "table" not in state
+    assert ChunkStore.load(str(tmp_path), state)[7]["filename"] == "a.txt"
@@ -0,0 +1,35 @@
+from app.services.chunking import CHARS_PER_TOKEN, LegalChunker, estimate_tokens
+
+CODE = (
+    "TITRE I : DU CONTRAT DE TRAVAIL\n"
+    "Article L1221-1\nLe contrat de travail est soumis aux règles du droit commun.\n"
+    "Article L1221-19\nLe contrat de travail à durée indéterminée peut comporter une période d'essai.\n"
+    "Article L1221-20\nLa période d'essai permet à l'employeur d'évaluer les compétences du salarié.\n"
+)
+
+def test_chunks_follow_articles_and_keep_positions():
+    chunks = LegalChunker(max_tokens=30, overlap_tokens=0).split(CODE)
+    # Le titre et le premier article tiennent ensemble dans le budget
+    assert [chunk["section"] for chunk in chunks] == ["TITRE I : DU CONTRAT DE TRAVAIL", "Article L1221-19", "Article L1221-20"]
+    assert "Article L1221-1\n" in chunks[0]["content"]
+    for chunk in chunks:
+        assert chunk["content"] == CODE[chunk["start"]:chunk["end"]].strip()
+        assert chunk["content"].startswith(chunk["section"])
+
+def test_small_articles_are_grouped_under_the_budget():
+    chunks = LegalChunker(max_tokens=400).split(CODE)
+    assert len(chunks) == 1 and chunks[0]["section"] == "TITRE I : DU CONTRAT DE TRAVAIL"
+
+def test_long_segment_is_cut_with_overlap():
+    text = "Article 1\n" + " ".join(f"Phrase numéro {n} du long article." for n in range(200))
+    chunker = LegalChunker(max_tokens=100, overlap_tokens=20)
+    chunks = chunker.split(text)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk["content"]) <= 100 for chunk in chunks)
+    assert all(chunk["section"] == "Article 1" for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Chaque morceau reprend la fin du précédent, sans dépasser le chevauchement
+        assert chunk["start"] < previous["end"]
+        assert previous["end"] - chunk["start"] <= 20 * CHARS_PER_TOKEN
+        # Coupure sur une fin de phrase ou un espace, jamais au milieu d'un mot
+        assert text[previous["end"] - 1] in ". "
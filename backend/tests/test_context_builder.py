@@ -0,0 +1,37 @@
+from app.models.schemas import SourceDocument
+from app.services.context_builder import ContextBuilder, hamming_distance, simhash
+
+ARTICLE = ("Le salarié licencié pour un motif autre qu'une faute grave a droit à un préavis "
+           "dont la durée dépend de son ancienneté de services continus chez le même employeur.")
+
+def source(contenu: str, score: float, nom_fichier: str = "code.txt", debut=None, fin=None) -> SourceDocument:
+    return SourceDocument(contenu=contenu, nom_fichier=nom_fichier, score=score, debut=debut, fin=fin)
+
+def test_simhash_is_close_for_near_duplicates():
+    variant = ARTICLE.replace("employeur", "employeur.")
+    other = "Le bailleur est tenu de remettre au locataire un logement décent ne laissant pas apparaître de risques."
+    assert simhash(ARTICLE) == simhash(ARTICLE)
+    assert hamming_distance(simhash(ARTICLE), simhash(variant)) <= 3
+    assert hamming_distance(simhash(ARTICLE), simhash(other)) > 10
+
+def test_near_duplicates_are_dropped_and_citations_numbered():
+    builder = ContextBuilder(max_tokens=1000)
+    context, cited = builder.build([
+        source(ARTICLE, 0.9, "a.txt"),
+        source(ARTICLE + " ", 0.8, "b.txt"),
+        source("La période d'essai du cadre est de quatre mois.", 0.5, "c.txt"),
+    ])
+    assert [(src.nom_fichier, src.citation) for src in cited] == [("a.txt", 1), ("c.txt", 2)]
+    assert context.startswith("[1] a.txt\n") and "\n\n[2] c.txt\n" in context
+
+def test_budget_skips_sources_and_truncates_the_best_one():
+    builder = ContextBuilder(max_tokens=20)
+    _, cited = builder.build([source(ARTICLE, 0.9), source("Court.", 0.1, "b.txt")])
+    assert len(cited) == 1 and ARTICLE.startswith(cited[0].contenu)
+
+def test_overlapping_chunks_are_merged_without_repeating_overlap():
+    text = "Article 1. Le contrat est formé par l'échange des consentements. Article 2. Il oblige les parties."
+    first, second = source(text[:66], 0.7, debut=0, fin=66), source(text[45:], 0.9, debut=45, fin=len(text))
+    _, cited = ContextBuilder(max_tokens=1000).build([first, second])
+    assert len(cited) == 1
+    assert cited[0].contenu == text and cited[0].score == 0.9
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from app.services import conversation_store
+from app.services.conversation_store import SessionNotFound, SQLiteConversationStore
+
+def test_concurrent_appends_keep_every_message(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+
+    async def scenario():
+        session_id = await store.create_session()
+        await asyncio.gather(*(
+            store.append_messages(session_id, [{"role": "user", "content": f"q{n}"},
+                                               {"role": "model", "content": f"r{n}"}])
+            for n in range(200)
+        ))
+        return await store.get_messages(session_id)
+
+    messages = asyncio.run(scenario())
+    assert len(messages) == 400
+    # Chaque échange reste contigu, dans l'ordre question puis réponse
+    for question, answer in zip(messages[::2], messages[1::2]):
+        assert answer["content"] == "r" + question["content"][1:]
+
+def test_sessions_expire_and_are_purged(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation_store.time, "time", lambda: now[0])
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"), max_sessions=2, ttl_seconds=60)
+
+    async def scenario():
+        old = await store.create_session()
+        now[0] += 61
+        with pytest.raises(SessionNotFound):
+            await store.get_messages(old)
+
+        first = await store.create_session()
+        now[0] += 1
+        second = await store.create_session()
+        now[0] += 1
+        await store.append_messages(first, [{"role": "user", "content": "bonjour"}])
+        now[0] += 1
+        # Au-delà de max_sessions, la session la moins récemment utilisée est supprimée
+        await store.create_session()
+        with pytest.raises(SessionNotFound):
+            await store.get_messages(second)
+        assert await store.get_messages(first) == [{"role": "user", "content": "bonjour"}]
+
+    asyncio.run(scenario())
+    (count,) = store._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()
+    assert count == 2
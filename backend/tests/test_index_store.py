@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from app.services import ann_index, index_store
+from app.services.chunking import LegalChunker
+from app.services.embeddings import HashingEmbedder
+from app.services.index_store import INDEX_FILE, VECTOR_LOG_FILE, IndexStore
+
+def write_corpus(folder, n_files: int):
+    os.makedirs(folder, exist_ok=True)
+    for n in range(n_files):
+        with open(os.path.join(folder, f"code-{n:02d}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Article L{n}-1\nLe salarié numéro {n} bénéficie d'un préavis de {n} jours.\n")
+
+def make_store(index_dir, index_type: str = "auto") -> IndexStore:
+    # Point de reprise à chaque lot d'un fichier
+    return IndexStore(str(index_dir), HashingEmbedder(64), LegalChunker(), index_type=index_type,
+                      batch_size=1, checkpoint_seconds=0)
+
+def test_checkpoints_do_not_rewrite_faiss_index(tmp_path, monkeypatch):
+    write_corpus(tmp_path / "data", 6)
+    writes = []
+    original = index_store.faiss.write_index
+    monkeypatch.setattr(index_store.faiss, "write_index", lambda index, path: (writes.append(path), original(index, path)))
+
+    result = make_store(tmp_path / "index").sync(str(tmp_path / "data"))
+    assert result["added_or_changed"] == 6
+    # Premier point de reprise (pas encore d'index de base) et fin de synchronisation seulement
+    assert len(writes) == 2
+    assert not os.path.exists(tmp_path / "index" / VECTOR_LOG_FILE)
+
+def test_interrupted_ingestion_resumes_from_log(tmp_path, monkeypatch):
+    data, index_dir = tmp_path / "data", tmp_path / "index"
+    write_corpus(data, 6)
+
+    class Interrupted(Exception):
+        pass
+
+    saves = []
+    original_save = IndexStore.save
+
+    def save_then_crash(self):
+        saves.append(1)
+        if len(saves) > 1:
+            raise Interrupted()
+        original_save(self)
+
+    monkeypatch.setattr(IndexStore, "save", save_then_crash)
+    with pytest.raises(Interrupted):
+        make_store(index_dir).sync(str(data))
+    monkeypatch.setattr(IndexStore, "save", original_save)
+    assert os.path.getsize(index_dir / VECTOR_LOG_FILE) > 0
+
+    store = make_store(index_dir)
+    result = store.sync(str(data))
+    # Tous les fichiers étaient couverts par un point de reprise : aucun n'est relu ni ré-embeddé
+    assert result["added_or_changed"] == 0
+    assert store.index.ntotal == len(store.documents) == len(store.sparse) == 6
+    hits = store.sparse.search("préavis salarié numéro 4", 1)
+    assert store.documents[hits[0][0]]["filename"] == "code-04.txt"
+
+    reopened = make_store(index_dir)
+    assert reopened.sync(str(data)) == {"added_or_changed": 0, "removed": 0}
+    assert reopened.index.ntotal == 6
+
+def test_removed_and_modified_files_after_resume(tmp_path):
+    data, index_dir = tmp_path / "data", tmp_path / "index"
+    write_corpus(data, 4)
+    make_store(index_dir).sync(str(data))
+
+    os.remove(data / "code-00.txt")
+    with open(data / "code-01.txt", "w", encoding="utf-8") as f:
+        f.write("Article L1-1\nTexte modifié sur la période d'essai.\n")
+    store = make_store(index_dir)
+    assert store.sync(str(data))["removed"] == 1
+    filenames = sorted(record["filename"] for record in store.documents.values())
+    assert filenames == ["code-01.txt", "code-02.txt", "code-03.txt"]
+    assert store.index.ntotal == 3
+    assert os.path.exists(index_dir / INDEX_FILE)
+
+def test_hnsw_removals_are_marked_then_rebuilt(tmp_path, monkeypatch):
+    data, index_dir = tmp_path / "data", tmp_path / "index"
+    write_corpus(data, 20)
+    make_store(index_dir, "hnsw").sync(str(data))
+    os.remove(data / "code-00.txt")
+
+    store = make_store(index_dir, "hnsw")
+    store.sync(str(data))
+    # Graphe conservé : le vecteur supprimé est seulement marqué et écarté à la recherche
+    assert store.index.ntotal == 20 and len(store.deleted_ids) == 1
+    params = ann_index.exclusion_params(store.index, store.deleted_ids)
+    query = store.embedder.embed_query("Article L0-1 Le salarié numéro 0 bénéficie d'un préavis de 0 jours.")
+    _, found = store.index.search(query, 20, params=params)
+    assert store.deleted_ids[0] not in found[0] and len(found[0][found[0] >= 0]) == 19
+
+    reopened = make_store(index_dir, "hnsw")
+    assert reopened.sync(str(data)) == {"added_or_changed": 0, "removed": 0}
+    assert reopened.deleted_ids == store.deleted_ids
+
+    # Au-delà de la proportion tolérée, l'index est reconstruit sans les vecteurs supprimés
+    monkeypatch.setattr(index_store, "HNSW_MAX_DELETED_FRACTION", 0.05)
+    os.remove(data / "code-01.txt")
+    store = make_store(index_dir, "hnsw")
+    store.sync(str(data))
+    assert store.index.ntotal == 18 and store.deleted_ids == []
+    assert ann_index.exclusion_params(store.index, store.deleted_ids) is None
+
+def test_ivf_pq_factory_and_training():
+    assert ann_index.index_factory_string("ivf_pq", 384, 5000) == "IVF128,PQ192x7"
+    index = ann_index.create_index("ivf_pq", 64, 2000)
+    assert not index.do_polysemous_training
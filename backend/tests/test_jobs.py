@@ -0,0 +1,185 @@
+import asyncio
+import socket
+import sqlite3
+
+import pytest
+
+from app.core.config import settings
+from app.services import jobs
+from app.services.jobs import (
+    ABANDONED_ERROR, InvalidCallbackURL, JobQueue, MemoryJobStore, SQLiteJobStore,
+    create_job_store, validate_callback_url,
+)
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SQLiteJobStore(str(tmp_path / "jobs.db"), **kwargs)
+        return MemoryJobStore(**kwargs)
+    return make
+
+def test_claim_finish_cycle(make_store):
+    async def scenario():
+        store = make_store()
+        first = await store.create_job("doc", {"n": 1})
+        second = await store.create_job("doc", {"n": 2})
+        await store.create_job("other", {})
+        assert first["status"] == "queued"
+
+        claimed = await store.claim_next(["doc"])
+        assert claimed["status"] == "running" and claimed["attempts"] == 1
+        claimed_ids = {claimed["id"], (await store.claim_next(["doc"]))["id"]}
+        assert claimed_ids == {first["id"], second["id"]}
+        assert await store.claim_next(["doc"]) is None
+
+        await store.finish_job(first["id"], result="ok")
+        await store.finish_job(second["id"], error="boom")
+        done, failed = await store.get_job(first["id"]), await store.get_job(second["id"])
+        assert done["status"] == "succeeded" and done["result"] == "ok" and done["finished_at"] is not None
+        assert failed["status"] == "failed" and failed["error"] == "boom"
+    asyncio.run(scenario())
+
+def test_expired_lease_is_reclaimed_then_abandoned(make_store):
+    async def scenario():
+        store = make_store(lease=0, max_attempts=2)
+        job = await store.create_job("doc", {})
+
+        assert (await store.claim_next(["doc"]))["attempts"] == 1
+        # Le worker s'est arrêté sans terminer : le bail (nul ici) a expiré
+        assert (await store.claim_next(["doc"]))["attempts"] == 2
+        assert await store.claim_next(["doc"]) is None
+        abandoned = await store.get_job(job["id"])
+        assert abandoned["status"] == "failed" and abandoned["error"] == ABANDONED_ERROR
+    asyncio.run(scenario())
+
+def test_running_job_within_lease_is_not_reclaimed(make_store):
+    async def scenario():
+        store = make_store(lease=3600)
+        await store.create_job("doc", {})
+        assert await store.claim_next(["doc"]) is not None
+        assert await store.claim_next(["doc"]) is None
+    asyncio.run(scenario())
+
+def test_queue_runs_job_to_completion():
+    async def scenario():
+        queue = JobQueue(MemoryJobStore(), workers=1, poll_interval=0.01)
+
+        async def handler(payload):
+            return payload["text"].upper()
+
+        queue.register("upper", handler)
+        queue.start()
+        job = await queue.submit("upper", {"text": "bail"})
+        for _ in range(200):
+            done = await queue.get(job["id"])
+            if done["status"] == "succeeded":
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        assert done["status"] == "succeeded" and done["result"] == "BAIL"
+    asyncio.run(scenario())
+
+def test_sqlite_store_migrates_attempts_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL, "
+                 "result TEXT, error TEXT, callback_url TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        store = SQLiteJobStore(path)
+        await store.create_job("doc", {})
+        assert (await store.claim_next(["doc"]))["attempts"] == 1
+    asyncio.run(scenario())
+
+def _resolve_to(address):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port or 0))]
+    return getaddrinfo
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://example.com/x", "http:///path", "gopher://example.com"])
+def test_callback_url_rejects_scheme_and_missing_host(url):
+    with pytest.raises(InvalidCallbackURL):
+        validate_callback_url(url)
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "192.168.1.1", "169.254.169.254", "0.0.0.0"])
+def test_callback_url_rejects_internal_addresses(monkeypatch, address):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", _resolve_to(address))
+    with pytest.raises(InvalidCallbackURL):
+        validate_callback_url("http://callback.example.com/hook")
+
+def test_callback_url_accepts_public_address(monkeypatch):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", _resolve_to("93.184.216.34"))
+    assert validate_callback_url("https://callback.example.com/hook") == "https://callback.example.com/hook"
+
+def test_callback_url_allow_list(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_CALLBACK_ALLOWED_HOSTS", "example.com, hooks.internal")
+    assert validate_callback_url("https://api.example.com/hook")
+    assert validate_callback_url("http://hooks.internal/done")
+    with pytest.raises(InvalidCallbackURL):
+        validate_callback_url("https://example.org/hook")
+    with pytest.raises(InvalidCallbackURL):
+        validate_callback_url("https://evilexample.com/hook")
+
+def test_callback_connects_to_the_validated_address(monkeypatch):
+    import http.server
+    import threading
+
+    received = []
+
+    class Hook(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.headers["Host"], self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Hook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    # DNS rebinding : adresse publique à la vérification, loopback ensuite
+    answers = ["93.184.216.34"]
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        address = answers.pop(0) if answers else "127.0.0.1"
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port or 0))]
+
+    connected = []
+    create_connection = socket.create_connection
+
+    def connect(target, *args):
+        connected.append(target)
+        # L'hôte public est simulé par le serveur local
+        return create_connection(("127.0.0.1", target[1]) if target[0] == "93.184.216.34" else target, *args)
+
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(jobs.socket, "create_connection", connect)
+    try:
+        jobs._post_callback(f"http://callback.example.com:{port}/hook", {"status": "succeeded"}, timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert connected == [("93.184.216.34", port)]
+    assert received == [(f"callback.example.com:{port}", b'{"status": "succeeded"}')]
+
+def test_submit_rejects_invalid_callback():
+    async def scenario():
+        queue = JobQueue(MemoryJobStore(), workers=1)
+
+        async def handler(payload):
+            return ""
+
+        queue.register("doc", handler)
+        with pytest.raises(InvalidCallbackURL):
+            await queue.submit("doc", {}, callback_url="http://localhost:8000/admin")
+    asyncio.run(scenario())
+
+def test_memory_store_without_workers_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_STORE", "memory")
+    monkeypatch.setattr(settings, "JOB_WORKERS", 0)
+    with pytest.raises(ValueError):
+        create_job_store()
@@ -0,0 +1,72 @@
+# tests/test_model_router.py
+import asyncio
+import pytest
+from app.services.model_router import ModelRouter
+from app.services.rate_limiter import RateLimitExceeded
+from app.services.resilience import CircuitOpenError
+
+def make_router() -> ModelRouter:
+    return ModelRouter(fast_model="rapide", strong_model="fort", fallback_models=["secours"])
+
+def test_falls_back_on_terminal_errors():
+    router = make_router()
+    calls = []
+
+    async def call(client):
+        calls.append(client.model_name)
+        if client.model_name == "fort":
+            raise CircuitOpenError("fort", 30.0)
+        return client.model_name
+
+    assert asyncio.run(router.run("document", "rédige un contrat", call)) == "rapide"
+    assert calls == ["fort", "rapide"]
+    assert router.stats["fort"].counts["fallbacks"] == 1
+    # Le modèle qui a répondu est indiqué à l'appelant
+    assert asyncio.run(router.run_with_model("document", "rédige un contrat", call)) == ("rapide", "rapide")
+
+def test_does_not_fall_back_on_request_or_quota_errors():
+    router = make_router()
+    for error in (ValueError("requête invalide"), RateLimitExceeded(5.0)):
+        calls = []
+
+        async def call(client, error=error):
+            calls.append(client.model_name)
+            raise error
+
+        with pytest.raises(type(error)):
+            asyncio.run(router.run("document", "texte", call))
+        assert calls == ["fort"]
+
+def test_slow_generation_is_not_cut_by_the_router():
+    router = make_router()
+
+    async def call(client):
+        await asyncio.sleep(0.2)
+        return client.model_name
+
+    # Seul le délai par tentative de la couche de résilience borne un appel
+    assert asyncio.run(router.run("chat", "bonjour", call)) == "rapide"
+
+def test_fallback_answer_is_not_cached_under_primary_key(monkeypatch):
+    from app.core.config import settings
+    from app.services.llm_service import llm_service
+    from app.services.response_cache import response_cache
+
+    router = make_router()
+    monkeypatch.setattr(type(settings), "is_gemini_configured", property(lambda self: True))
+    monkeypatch.setattr(llm_service, "generation_model", router.for_task("document"))
+    monkeypatch.setattr(response_cache, "enabled", True)
+    served = {"fort": False}
+
+    async def generate(self, prompt):
+        if self.model_name == "fort" and not served["fort"]:
+            raise CircuitOpenError("fort", 30.0)
+        return f"document de {self.model_name}"
+
+    monkeypatch.setattr("app.services.gemini_client.GeminiClient.generate", generate)
+    params = {"employeur": "ACME", "poste": "bascule"}
+    assert asyncio.run(llm_service.generate_document("contrat", params)) == "document de rapide"
+    # Modèle principal rétabli : la réponse de secours n'est pas resservie
+    served["fort"] = True
+    assert asyncio.run(llm_service.generate_document("contrat", params)) == "document de fort"
+    assert asyncio.run(llm_service.generate_document("contrat", params)) == "document de fort"
@@ -0,0 +1,62 @@
+# tests/test_rate_limiter.py
+import asyncio
+import pytest
+from app.services import rate_limiter
+from app.services.rate_limiter import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, BucketBackend, FileBucketBackend, MemoryBucketBackend,
+    RateLimitExceeded, RateScheduler,
+)
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "time", clock.time)
+    return clock
+
+def test_bucket_backend_is_abstract():
+    with pytest.raises(TypeError):
+        BucketBackend(60, 1000)
+
+@pytest.mark.parametrize("make_backend", [
+    lambda tmp_path: MemoryBucketBackend(60, 6000),
+    lambda tmp_path: FileBucketBackend(60, 6000, str(tmp_path / "quota.json")),
+])
+def test_buckets_refill_in_proportion_to_elapsed_time(clock, tmp_path, make_backend):
+    backend = make_backend(tmp_path)
+
+    async def scenario():
+        assert await backend.try_acquire(6000) == 0
+        assert await backend.available() == (59, 0)
+        # Seau de tokens vide : 1000 tokens reviennent en 10 s (6000/min)
+        assert await backend.try_acquire(1000) == pytest.approx(10.0)
+        clock.now += 5
+        # Une requête par seconde (60/min), plafonnée à la capacité du seau
+        assert await backend.available() == (pytest.approx(60), pytest.approx(500))
+        clock.now += 5
+        assert await backend.try_acquire(1000) == 0
+        clock.now += 3600
+        assert await backend.available() == (pytest.approx(60), pytest.approx(6000))
+
+    asyncio.run(scenario())
+
+def test_scheduler_sheds_when_refill_is_too_slow(clock):
+    scheduler = RateScheduler(MemoryBucketBackend(0, 600), max_wait=[5.0, 5.0, 60.0])
+
+    async def scenario():
+        await scheduler.acquire(600, PRIORITY_INTERACTIVE)
+        # 100 tokens reviennent en 10 s : trop long pour un appel interactif
+        with pytest.raises(RateLimitExceeded) as excinfo:
+            await scheduler.acquire(100, PRIORITY_INTERACTIVE)
+        assert excinfo.value.retry_after == pytest.approx(10.0)
+        clock.now += 10
+        await scheduler.acquire(100, PRIORITY_BATCH)
+
+    asyncio.run(scenario())
+    assert scheduler.stats["admitted"] == 2 and scheduler.stats["shed"] == 1
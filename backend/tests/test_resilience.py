@@ -0,0 +1,156 @@
+# tests/test_resilience.py
+import asyncio
+import pytest
+from app.services.resilience import CircuitBreaker, CircuitOpenError, Resilience
+
+def make_resilience(max_attempts: int = 1, reset_timeout: float = 0.0) -> Resilience:
+    resilience = Resilience("test-model", max_attempts=max_attempts, base_delay=0.0, max_delay=0.0,
+                            timeout=5.0, hedge_delay=0.0)
+    resilience.breaker = CircuitBreaker("test-model", failure_threshold=1, reset_timeout=reset_timeout)
+    return resilience
+
+async def fail():
+    raise ConnectionError("réseau")
+
+async def succeed():
+    return "ok"
+
+async def hang():
+    await asyncio.sleep(10)
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("test-model", failure_threshold=2, reset_timeout=60.0)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker("test-model", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.before_call() is True
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test-model", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opens == 2
+
+def test_cancelled_probe_releases_half_open():
+    resilience = make_resilience()
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await resilience.call(fail)
+        assert resilience.breaker.state == "open"
+        # L'appel de test est annulé par un délai englobant
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(resilience.call(hang), 0.05)
+        assert resilience.breaker.state == "half_open"
+        # Le suivant peut tester le modèle et referme le disjoncteur
+        assert await resilience.call(succeed) == "ok"
+        assert resilience.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+def test_cancelled_regular_call_keeps_probe_of_another_call():
+    resilience = make_resilience(reset_timeout=0.0)
+
+    async def scenario():
+        regular = asyncio.ensure_future(resilience.call(hang))
+        await asyncio.sleep(0.01)
+        resilience.breaker.record_failure()
+        probe = asyncio.ensure_future(resilience.call(hang))
+        await asyncio.sleep(0.01)
+        regular.cancel()
+        await asyncio.gather(regular, return_exceptions=True)
+        # L'appel de test en cours garde sa place
+        with pytest.raises(CircuitOpenError):
+            await resilience.call(succeed)
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        assert await resilience.call(succeed) == "ok"
+
+    asyncio.run(scenario())
+
+def test_retries_transient_errors_then_succeeds():
+    resilience = make_resilience(max_attempts=3)
+    resilience.breaker = CircuitBreaker("test-model", failure_threshold=5, reset_timeout=60.0)
+    outcomes = [ConnectionError("1"), ConnectionError("2")]
+
+    async def flaky():
+        if outcomes:
+            raise outcomes.pop(0)
+        return "ok"
+
+    assert asyncio.run(resilience.call(flaky)) == "ok"
+    assert resilience.stats["retries"] == 2
+    assert resilience.breaker.state == "closed"
+
+def test_non_retryable_error_is_raised_immediately():
+    resilience = make_resilience(max_attempts=3)
+
+    async def bad_request():
+        raise ValueError("requête invalide")
+
+    with pytest.raises(ValueError):
+        asyncio.run(resilience.call(bad_request))
+    assert resilience.stats["retries"] == 0
+    assert resilience.breaker.state == "closed"
+
+def test_hedge_goes_through_the_quota():
+    from app.services.rate_limiter import MemoryBucketBackend, RateScheduler
+
+    async def scenario(scheduler):
+        resilience = Resilience("test-model", max_attempts=1, base_delay=0.0, max_delay=0.0,
+                                timeout=5.0, hedge_delay=0.01)
+        sent = []
+
+        async def slow():
+            sent.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        result = await resilience.call(slow, hedge=True, admit=lambda: scheduler.acquire(1),
+                                       admit_hedge=lambda: scheduler.try_acquire(1))
+        return result, len(sent), resilience.stats
+
+    # Quota d'une seule requête : la requête couverte ne part pas
+    scheduler = RateScheduler(MemoryBucketBackend(1, 0), max_wait=[0.0, 0.0, 0.0])
+    result, sent, stats = asyncio.run(scenario(scheduler))
+    assert (result, sent) == ("ok", 1)
+    assert stats["hedges"] == 0 and stats["hedges_skipped"] == 1
+    assert scheduler.stats["admitted"] == 1
+
+    # Quota suffisant : elle part et elle est comptée
+    scheduler = RateScheduler(MemoryBucketBackend(60, 0), max_wait=[0.0, 0.0, 0.0])
+    result, sent, stats = asyncio.run(scenario(scheduler))
+    assert (result, sent) == ("ok", 2) and stats["hedges"] == 1
+    assert scheduler.stats["admitted"] == 2
+
+def test_hedge_without_quota_admission_is_not_sent():
+    resilience = make_resilience()
+    resilience.hedge_delay = 0.01
+    sent = []
+
+    async def slow():
+        sent.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def admit():
+        pass
+
+    assert asyncio.run(resilience.call(slow, hedge=True, admit=admit)) == "ok"
+    assert sent == [1]
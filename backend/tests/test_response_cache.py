@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.services import response_cache as cache_module
+from app.services.embeddings import HashingEmbedder
+from app.services.response_cache import ResponseCache, _LRU, is_cache_bypassed
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock.monotonic)
+    return clock
+
+def test_lru_evicts_least_recently_used(clock):
+    lru = _LRU(max_entries=2, ttl_seconds=60)
+    assert lru.set("a", 1) == [] and lru.set("b", 2) == []
+    assert lru.get("a") == 1  # "a" devient la plus récente
+    assert lru.set("c", 3) == ["b"]
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.get("c") == 3
+
+def test_lru_entries_expire_after_ttl(clock):
+    lru = _LRU(max_entries=10, ttl_seconds=60)
+    lru.set("a", 1)
+    clock.now += 59
+    assert lru.get("a") == 1
+    clock.now += 2
+    assert lru.get("a") is None and "a" not in lru.entries
+
+def test_exact_and_semantic_tiers(clock):
+    cache = ResponseCache(max_entries=1, ttl_seconds=60, semantic_threshold=0.9, embedder=HashingEmbedder(256))
+
+    async def scenario():
+        await cache.set("Quelle est la durée du préavis ?", "flash", "Un mois.", query="durée du préavis")
+        # Clé exacte : casse et espaces normalisés, modèle compris
+        assert await cache.get("quelle est la  durée du préavis ?", "flash") == "Un mois."
+        assert await cache.get("Quelle est la durée du préavis ?", "pro") is None
+        # Niveau sémantique : même question dans un autre prompt
+        assert await cache.get("Autre contexte", "flash", query="durée du préavis") == "Un mois."
+        assert await cache.get("Autre contexte", "flash", query="dépôt de garantie du bail") is None
+
+        await cache.set("Période d'essai ?", "flash", "Deux mois.", query="période d'essai")
+        assert await cache.get("Quelle est la durée du préavis ?", "flash") is None
+        clock.now += 61
+        assert await cache.get("Période d'essai ?", "flash") is None
+        assert await cache.get("Autre contexte", "flash", query="période d'essai") is None
+
+    asyncio.run(scenario())
+    stats = cache.get_stats()
+    assert stats["exact_hits"] == 1 and stats["semantic_hits"] == 1 and stats["evictions"] == 2
+    assert stats["semantic_entries"] == 0
+
+def test_bypass_headers():
+    assert is_cache_bypassed(None, "no-cache")
+    assert is_cache_bypassed("1")
+    assert not is_cache_bypassed(None, "max-age=0")
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.embeddings import HashingEmbedder, hybrid_dense_weight
+from app.services.llm_service import llm_service
+from app.services.sparse_index import SparseIndex, extract_citations, reciprocal_rank_fusion
+
+def test_rrf_scores_and_order():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 3, 4]], k=60)
+    assert [doc_id for doc_id, _ in fused][:2] == [2, 3]
+    assert fused[0][1] < 1.0
+    assert reciprocal_rank_fusion([[7], [7]], k=60) == [(7, 1.0)]
+    assert reciprocal_rank_fusion([]) == []
+
+def test_rrf_weights_favor_heavier_ranking():
+    dense, sparse = [1, 2], [2, 1]
+    assert reciprocal_rank_fusion([dense, sparse], weights=[0.2, 1.0])[0][0] == 2
+    assert reciprocal_rank_fusion([dense, sparse], weights=[1.0, 0.2])[0][0] == 1
+    # Poids nul : le classement est ignoré
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([[5, 6], [6, 5]], weights=[0.0, 1.0])] == [6, 5]
+
+def test_dense_weight_defaults_to_bm25_only_for_hashing_embedder(monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_DENSE_WEIGHT", "")
+    assert hybrid_dense_weight(HashingEmbedder(32)) == 0.0
+
+    class SemanticEmbedder(HashingEmbedder):
+        semantic = True
+
+    assert hybrid_dense_weight(SemanticEmbedder(32)) == 1.0
+    monkeypatch.setattr(settings, "HYBRID_DENSE_WEIGHT", "0.5")
+    assert hybrid_dense_weight(HashingEmbedder(32)) == 0.5
+
+def test_bm25_ranks_exact_terms_and_citations():
+    index = SparseIndex()
+    index.add(1, "Le préavis de licenciement du salarié est fixé par l'article L1234-1.")
+    index.add(2, "Le locataire verse un dépôt de garantie au bailleur.")
+    index.add(3, "La période d'essai du salarié peut être renouvelée une fois.")
+    assert index.search("préavis salarie", 2)[0][0] == 1
+    assert index.citation_search("article L. 1234-1", 3)[0][0] == 1
+    assert extract_citations("art. 1240 et L. 1221-19") == ["l1221-19", "art1240"]
+
+    index.compact()
+    index.remove(1)
+    assert [doc_id for doc_id, _ in index.search("salarié", 3)] == [3]
+    assert index.doc_ids().tolist() == [2, 3]
+
+@pytest.fixture
+def mock_corpus():
+    if not llm_service.documents:
+        llm_service._create_mock_data()
+
+def test_search_skips_faiss_when_dense_weight_is_zero(monkeypatch, mock_corpus):
+    monkeypatch.setattr(settings, "HYBRID_DENSE_WEIGHT", "0")
+    calls = []
+
+    async def dense_search(query, top_k):
+        calls.append(query)
+        return []
+
+    monkeypatch.setattr(llm_service, "_dense_search", dense_search)
+    sources = asyncio.run(llm_service.search_documents("période d'essai des cadres", top_k=2))
+    assert sources and calls == []
+    assert sources[0].score == 1.0
+
+def test_hybrid_search_runs_faiss_in_a_thread(monkeypatch, mock_corpus):
+    monkeypatch.setattr(settings, "HYBRID_DENSE_WEIGHT", "1")
+    threads = []
+    original = asyncio.to_thread
+
+    async def to_thread(func, *args, **kwargs):
+        threads.append(getattr(func, "__self__", None))
+        return await original(func, *args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "to_thread", to_thread)
+    sources = asyncio.run(llm_service.search_documents("préavis de licenciement", top_k=2))
+    assert sources
+    assert any(owner is llm_service.faiss_index for owner in threads)
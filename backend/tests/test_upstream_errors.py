@@ -0,0 +1,60 @@
+# tests/test_upstream_errors.py
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.api_core import exceptions as google_exceptions
+from app.api_v1.router import api_router
+from app.core.config import settings
+from app.services.llm_service import llm_service
+from app.services.rate_limiter import RateLimitExceeded
+from app.services.resilience import CircuitOpenError, upstream_status
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(api_router, prefix="/api/v1")
+    return TestClient(app)
+
+class FailingModel:
+    """Modèle routé dont chaque génération échoue avec `error`"""
+
+    model_name = "gemini-test"
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    async def generate(self, prompt: str) -> str:
+        raise self.error
+
+    async def generate_with_model(self, prompt: str):
+        raise self.error
+
+@pytest.fixture
+def gemini_configured(monkeypatch):
+    monkeypatch.setattr(type(settings), "is_gemini_configured", property(lambda self: True))
+    if not llm_service.documents:
+        llm_service._create_mock_data()
+
+def test_upstream_status():
+    assert upstream_status(RateLimitExceeded(12.4)) == (429, 12.4)
+    assert upstream_status(CircuitOpenError("m", 30.0)) == (503, 30.0)
+    assert upstream_status(google_exceptions.ServiceUnavailable("surcharge"))[0] == 503
+    assert upstream_status(ValueError("requête invalide")) is None
+
+def test_rate_limited_generation_returns_429(client, gemini_configured, monkeypatch):
+    monkeypatch.setattr(llm_service, "generation_model", FailingModel(RateLimitExceeded(7.0)))
+    response = client.post("/api/v1/generate-document", json={"type_document": "contrat", "parametres": {"poste": "x"}},
+                           headers={"X-Cache-Bypass": "1"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+def test_open_circuit_search_returns_503(client, gemini_configured, monkeypatch):
+    monkeypatch.setattr(llm_service, "search_model", FailingModel(CircuitOpenError("gemini-test", 20.0)))
+    response = client.post("/api/v1/legal-search", json={"question": "période d'essai"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "20"
+
+def test_mock_answer_only_without_gemini(client):
+    response = client.post("/api/v1/chat", json={"message": "contrat", "historique": []})
+    assert response.status_code == 200
+    assert "contrat" in response.json()["reponse"]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Worker de tâches asynchrones, à lancer à côté du serveur lorsque JOB_WORKERS=0.
+
+Les tâches sont lues dans le stockage SQLite partagé (JOB_STORE=sqlite) ;
+plusieurs workers peuvent tourner en parallèle.
+
+Usage (depuis backend/) :
+    JOB_STORE=sqlite python worker.py --concurrency 4
+    JOB_STORE=sqlite python worker.py --app app
+"""
+
+import asyncio
+import argparse
+import importlib
+
+from app.core.config import settings
+from app.services.jobs import job_queue
+from app.services.tracing import configure_tracing
+
+# Module enregistrant les handlers de tâches
+APPS = {
+    "main": "main",
+    "app": "app.api_v1.endpoints.jobs",
+}
+
+async def run(concurrency: int):
+    job_queue.start(concurrency)
+    print(f"👷 Worker démarré : {concurrency} tâche(s) simultanée(s), types {', '.join(job_queue.handlers)}")
+    await asyncio.Event().wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Exécute les tâches de génération en file d'attente")
+    parser.add_argument("--app", choices=list(APPS), default="main", help="Application dont les handlers sont utilisés")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if settings.JOB_STORE != "sqlite":
+        parser.error("un worker séparé nécessite JOB_STORE=sqlite (le stockage mémoire n'est pas partagé)")
+
+    importlib.import_module(APPS[args.app])
+    configure_tracing()
+    try:
+        asyncio.run(run(args.concurrency))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()